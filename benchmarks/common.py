@@ -0,0 +1,73 @@
+# benchmarks/common.py
+"""
+Общие утилиты для бенчмарков LOKI.
+
+Корпус для STT-бенчмарков — это каталог с WAV-файлами. Если рядом с
+`command.wav` лежит `command.txt`, его содержимое считается эталонной
+транскрипцией и используется для расчета WER.
+"""
+import os
+import sys
+import statistics
+import time
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+# Бенчмарки запускаются как скрипты из корня проекта: `python benchmarks/<name>.py`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from loki.utils import percentile  # noqa: E402  (реэкспорт для бенчмарков)
+
+
+class Clip(NamedTuple):
+    """Один аудиофрагмент корпуса."""
+
+    name: str
+    audio: "object"  # np.ndarray float32, 16 кГц
+    reference: Optional[str]
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / 16000
+
+
+def load_corpus(directory: str) -> List[Clip]:
+    """Загружает все WAV-файлы каталога (и эталонные .txt, если они есть)."""
+    import whisper
+
+    clips = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.lower().endswith(".wav"):
+            continue
+        path = os.path.join(directory, filename)
+        reference = None
+        txt_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(txt_path):
+            with open(txt_path, encoding="utf-8") as f:
+                reference = f.read().strip()
+        clips.append(Clip(filename, whisper.load_audio(path), reference))
+    if not clips:
+        raise SystemExit(f"No WAV files found in {directory}")
+    return clips
+
+
+def measure(func: Callable, repeats: int):
+    """Вызывает `func` `repeats` раз; возвращает (последний результат, медиана секунд)."""
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def print_table(headers: Sequence[str], rows: Sequence[Sequence]):
+    """Печатает простую выровненную таблицу."""
+    cells = [[str(h) for h in headers]] + [
+        [f"{c:.3f}" if isinstance(c, float) else str(c) for c in row] for row in rows
+    ]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for n, row in enumerate(cells):
+        print("  ".join(c.rjust(w) for c, w in zip(row, widths)))
+        if n == 0:
+            print("  ".join("-" * w for w in widths))
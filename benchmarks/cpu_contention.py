@@ -0,0 +1,186 @@
+# benchmarks/cpu_contention.py
+"""
+Бенчмарк задержки хода под нагрузкой CPU: без бюджета потоков и с ним.
+
+Имитирует машину, на которой рядом с LOKI работает Ollama: фоновые процессы
+нагружают ядра матричными умножениями. Ход — это STT клипа из корпуса и
+синтез ответа через `Piper_Engine.stream` до первого и последнего чанка.
+Параллельно поток "wake word" каждые 32 мс выполняет небольшую работу;
+его опоздания показывают, не голодает ли чтение микрофона.
+
+Конфигурации:
+- default — как раньше: потоки библиотек по умолчанию, общий пул потоков;
+- budget  — `CpuBudget` из config.CPU_THREAD_BUDGET / LOKI_CPU_BUDGET.
+
+Пример:
+    poetry run python benchmarks/cpu_contention.py data/ru_commands \\
+        --voice voices/ru_RU-irina-medium.onnx --stress 6 \\
+        --budget '{"stt": {"threads": 3, "cpus": [0,1,2]}, "tts": {"threads": 1, "cpus": [3]}}'
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from common import load_corpus, percentile, print_table
+
+from loki.cpu_budget import CpuBudget, load_budget
+from loki.stt_handler import WhisperSTT
+from loki.tts_handler import Piper_Engine
+
+RESPONSE = (
+    "Сейчас в Москве плюс двенадцать градусов, облачно. "
+    "Вечером ожидается небольшой дождь, возьмите зонт."
+)
+# Период чтения wake word: 512 кадров при 16 кГц
+WAKE_PERIOD_S = 0.032
+
+
+def _stress_worker(stop):
+    """Фоновая нагрузка, похожая на инференс LLM: матричные умножения."""
+    a = np.random.rand(256, 256).astype(np.float32)
+    while not stop.is_set():
+        a = a @ a
+        a /= np.abs(a).max() or 1.0
+
+
+def _wake_loop(stop: threading.Event, lateness: list):
+    """Имитация потока wake word: работа каждые 32 мс, учитывается опоздание."""
+    frame = np.random.rand(512).astype(np.float32)
+    deadline = time.perf_counter()
+    while not stop.is_set():
+        deadline += WAKE_PERIOD_S
+        np.fft.rfft(frame)  # Порядок работы porcupine.process на кадр
+        sleep = deadline - time.perf_counter()
+        if sleep > 0:
+            time.sleep(sleep)
+        lateness.append(max(0.0, time.perf_counter() - deadline) * 1000)
+
+
+async def _speak(tts) -> float:
+    """Синтезирует ответ потоком; возвращает время до первого чанка."""
+    start = time.perf_counter()
+    first = None
+    async for _ in tts.stream(RESPONSE):
+        if first is None:
+            first = time.perf_counter() - start
+    return first
+
+
+def run_config(name, args, clips, stt_executor, wake_executor, tts):
+    """Прогоняет ходы в одной конфигурации; возвращает строку таблицы."""
+    stt = WhisperSTT(args.model, command_mode=True, profile="command")
+    stt.transcribe_audio(clips[0].audio)  # Прогрев
+
+    stop = threading.Event()
+    lateness = []
+    wake_future = wake_executor.submit(_wake_loop, stop, lateness)
+    stt_s, first_audio_s, turn_s = [], [], []
+    for turn in range(args.turns):
+        clip = clips[turn % len(clips)]
+        start = time.perf_counter()
+        stt_executor.submit(stt.transcribe_audio, clip.audio).result()
+        stt_s.append(time.perf_counter() - start)
+        first = asyncio.run(_speak(tts))
+        first_audio_s.append(stt_s[-1] + first)
+        turn_s.append(time.perf_counter() - start)
+    stop.set()
+    wake_future.result()
+    return [
+        name,
+        percentile(stt_s, 50),
+        percentile(first_audio_s, 50),
+        percentile(first_audio_s, 90),
+        percentile(turn_s, 90),
+        percentile(lateness, 99),
+        max(lateness, default=0.0),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", help="Каталог с WAV-файлами")
+    parser.add_argument("--voice", required=True, help="Модель голоса Piper (.onnx)")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument(
+        "--stress", type=int, default=os.cpu_count() // 2, help="Процессов нагрузки"
+    )
+    parser.add_argument("--budget", help="JSON бюджета (по умолчанию из конфига)")
+    args = parser.parse_args()
+
+    if args.budget:
+        os.environ["LOKI_CPU_BUDGET"] = args.budget
+    clips = load_corpus(args.corpus)
+
+    stop = multiprocessing.Event()
+    stressors = [
+        multiprocessing.Process(target=_stress_worker, args=(stop,), daemon=True)
+        for _ in range(args.stress)
+    ]
+    for process in stressors:
+        process.start()
+
+    rows = []
+    try:
+        # Как было до бюджета: общий пул и потоки библиотек по умолчанию
+        shared = ThreadPoolExecutor()
+        tts = Piper_Engine(args.voice)
+        rows.append(run_config("default", args, clips, shared, shared, tts))
+        tts.close()
+        shared.shutdown()
+
+        budget = CpuBudget(load_budget())
+        budget.log_summary()
+        default_threads = torch.get_num_threads()
+        budget.configure_torch("stt")
+        tts = (
+            budget.executor("tts")
+            .submit(
+                Piper_Engine,
+                args.voice,
+                intra_op_threads=budget.threads("tts"),
+                synthesis_workers=budget.get("tts").workers,
+                executor=budget.executor("tts"),
+            )
+            .result()
+        )
+        rows.append(
+            run_config(
+                "budget",
+                args,
+                clips,
+                budget.executor("stt"),
+                budget.executor("audio"),
+                tts,
+            )
+        )
+        budget.shutdown()
+        torch.set_num_threads(default_threads)
+    finally:
+        stop.set()
+        for process in stressors:
+            process.join()
+
+    print(f"{args.turns} turns, {args.stress} stress processes, {os.cpu_count()} CPUs")
+    print_table(
+        [
+            "config",
+            "stt_p50_s",
+            "first_audio_p50_s",
+            "first_audio_p90_s",
+            "turn_p90_s",
+            "wake_late_p99_ms",
+            "wake_late_max_ms",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/prompt_selection.py
+"""
+Бенчмарк динамической сборки промпта против статического UNIFIED_PROMPT.
+
+Для каждой фразы из набора собирает оба промпта и печатает их длину. С
+флагом --llm отправляет фразы в LLM (провайдер из окружения, как у
+оркестратора) и сравнивает число токенов промпта, время до первого токена и
+точность команд: совпадение инструмента и параметров с ожидаемыми.
+
+Набор — JSONL с полями "text" и "command" (null для фраз без команды);
+без аргумента используется встроенный набор.
+
+Пример:
+    poetry run python benchmarks/prompt_selection.py data/commands.jsonl --llm
+"""
+import argparse
+import asyncio
+import json
+
+from common import percentile, print_table
+
+from loki.command_parser import parse_llm_response
+from loki.llm_providers import GenerationOptions, get_llm_provider
+from loki.prompt_selector import PromptSelector
+from loki.prompts import UNIFIED_PROMPT
+
+DEFAULT_CASES = [
+    {
+        "text": "Какая погода в Казани?",
+        "command": {"tool_name": "get_weather", "parameters": {"city": "Казань"}},
+    },
+    {
+        "text": "Сколько градусов на улице?",
+        "command": {"tool_name": "get_weather", "parameters": {"city": "auto"}},
+    },
+    {
+        "text": "Будет ли завтра дождь в Москве?",
+        "command": {"tool_name": "get_weather", "parameters": {"city": "Москва"}},
+    },
+    {
+        "text": "Переключись в режим прослушивания.",
+        "command": {"tool_name": "set_status", "parameters": {"status": "listening"}},
+    },
+    {
+        "text": "Установи режим ожидания.",
+        "command": {"tool_name": "set_status", "parameters": {"status": "idle"}},
+    },
+    {"text": "Как твое состояние?", "command": None},
+    {"text": "Какой режим работы у библиотеки?", "command": None},
+    {"text": "Сколько спутников у Юпитера?", "command": None},
+    {"text": "Расскажи короткий анекдот.", "command": None},
+]
+
+
+def load_cases(path):
+    if not path:
+        return DEFAULT_CASES
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def command_matches(expected, actual) -> bool:
+    """Совпадают ли инструмент и параметры (без учета регистра значений)."""
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    if expected.get("tool_name") != actual.get("tool_name"):
+        return False
+    return _params(expected) == _params(actual)
+
+
+def _params(command) -> dict:
+    return {k: str(v).strip().lower() for k, v in command.get("parameters", {}).items()}
+
+
+async def run_llm(provider, cases, prompt_for):
+    """Прогоняет набор через LLM; возвращает (токены промпта, первые токены, точность)."""
+    prompt_tokens, first_token_s, correct = [], [], 0
+    for case in cases:
+        response = ""
+        usage = {}
+        async for token in provider.stream_response(
+            case["text"],
+            system_prompt=prompt_for(case["text"]),
+            options=GenerationOptions(max_tokens=128),
+            on_usage=usage.update,
+        ):
+            response += token
+        if usage.get("prompt_tokens"):
+            prompt_tokens.append(usage["prompt_tokens"])
+        if usage.get("first_token_s"):
+            first_token_s.append(usage["first_token_s"])
+        _, command = parse_llm_response(response)
+        correct += command_matches(case.get("command"), command)
+    return prompt_tokens, first_token_s, correct / len(cases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("cases", nargs="?", help="JSONL с фразами и командами")
+    parser.add_argument("--llm", action="store_true", help="Отправлять фразы в LLM")
+    parser.add_argument("--top-k", type=int, help="Примеров с инструментами")
+    args = parser.parse_args()
+
+    cases = load_cases(args.cases)
+    selector = (
+        PromptSelector() if args.top_k is None else PromptSelector(top_k=args.top_k)
+    )
+    configs = [
+        ("static", lambda text: UNIFIED_PROMPT),
+        ("dynamic", selector.build),
+    ]
+
+    # Без LLM: длина промпта и наличие нужного инструмента в динамическом
+    rows = []
+    for name, prompt_for in configs:
+        chars = [len(prompt_for(case["text"])) for case in cases]
+        rows.append([name, percentile(chars, 50), max(chars)])
+    commands = [case for case in cases if case.get("command")]
+    covered = sum(
+        case["command"]["tool_name"] in selector.select(case["text"])[0]
+        for case in commands
+    )
+    print_table(["prompt", "chars_p50", "chars_max"], rows)
+    print(f"Expected tool present in dynamic prompt: {covered}/{len(commands)}")
+
+    if not args.llm:
+        return
+    provider = get_llm_provider()
+    rows = []
+    try:
+        for name, prompt_for in configs:
+            tokens, first, accuracy = asyncio.run(run_llm(provider, cases, prompt_for))
+            rows.append(
+                [
+                    name,
+                    percentile(tokens, 50),
+                    percentile(first, 50),
+                    percentile(first, 90),
+                    accuracy,
+                ]
+            )
+    finally:
+        provider.close()
+    print()
+    print_table(
+        [
+            "prompt",
+            "prompt_tokens_p50",
+            "first_token_p50_s",
+            "first_token_p90_s",
+            "accuracy",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/resampler_cost.py
+"""
+Бенчмарк стоимости ресемплинга захвата в 16 кГц.
+
+Для каждой частоты устройства прогоняет шум порциями по 30 мс (как при
+записи команды) через `StreamingResampler` и печатает процессорное время на
+секунду аудио, время на порцию и долю реального времени. Если установлен
+SciPy, для сравнения приводится `scipy.signal.resample_poly` того же
+сигнала целиком (без потоковой обработки).
+
+Пример:
+    poetry run python benchmarks/resampler_cost.py --seconds 60
+"""
+import argparse
+import time
+
+import numpy as np
+from common import print_table
+
+from loki import config
+from loki.resampler import StreamingResampler, device_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--rates", type=int, nargs="+", default=[44100, 48000, 96000])
+    parser.add_argument("--taps", type=int, default=config.RESAMPLER_TAPS_PER_PHASE)
+    args = parser.parse_args()
+
+    try:
+        from scipy.signal import resample_poly
+    except ImportError:
+        resample_poly = None
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for rate in args.rates:
+        signal = (rng.standard_normal(int(rate * args.seconds)) * 3000).astype(np.int16)
+        chunk = device_frames(config.CHUNK_SIZE, rate)
+        resampler = StreamingResampler(rate, config.AUDIO_RATE, args.taps)
+        chunks = range(0, len(signal), chunk)
+        start = time.process_time()
+        for offset in chunks:
+            resampler.process(signal[offset : offset + chunk])
+        cpu_s = time.process_time() - start
+
+        scipy_ms = "n/a"
+        if resample_poly:
+            start = time.process_time()
+            resample_poly(signal.astype(np.float32), resampler.up, resampler.down)
+            scipy_ms = (time.process_time() - start) / args.seconds * 1000
+
+        rows.append(
+            [
+                rate,
+                f"{resampler.up}/{resampler.down}",
+                cpu_s / args.seconds * 1000,
+                cpu_s / len(chunks) * 1e6,
+                cpu_s / args.seconds * 100,
+                scipy_ms,
+            ]
+        )
+    print(f"{args.seconds:.0f} s of audio, {args.taps} taps per phase")
+    print_table(
+        [
+            "device_hz",
+            "up/down",
+            "cpu_ms_per_audio_s",
+            "us_per_30ms_chunk",
+            "realtime_%",
+            "scipy_ms_per_audio_s",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# benchmarks/shared_weights.py
+"""
+Бенчмарк памяти и времени запуска нескольких воркеров с общими весами и без.
+
+Запускает N процессов (spawn, как `WhisperSTTProcess`), каждый загружает
+Whisper и, если задан --voice, голос Piper, один раз прогоняет модели (чтобы
+веса действительно были прочитаны) и сообщает время загрузки и память. Пока
+все воркеры живы, память снимается одновременно:
+
+- RSS — резидентная память процесса; общие страницы учитываются в каждом;
+- PSS — общие страницы делятся между процессами, которые их используют.
+  Сумма PSS воркеров показывает, сколько памяти занимают они вместе.
+  PSS читается из /proc/self/smaps_rollup (только Linux).
+
+Режимы: private — каждый процесс загружает свою копию (как раньше),
+shared — LOKI_SHARED_WEIGHTS: общий файл готовит родитель, воркеры
+отображают его в память. Время подготовки общего файла печатается отдельно:
+оно тратится один раз.
+
+Пример:
+    poetry run python benchmarks/shared_weights.py --model base \\
+        --voice voices/ru_RU-irina-medium.onnx --workers 4
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+from common import percentile, print_table
+
+MODES = ("private", "shared")
+
+
+def memory_mb():
+    """RSS и PSS текущего процесса в МБ (PSS — None вне Linux)."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            # Первая строка — диапазон адресов, дальше "Поле: значение kB"
+            fields = {
+                parts[0]: int(parts[1])
+                for parts in map(str.split, f)
+                if parts[-1] == "kB"
+            }
+        return fields["Rss:"] / 1024, fields["Pss:"] / 1024
+    except OSError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, None
+
+
+def _worker(args, shared, barrier, results):
+    from loki.stt_handler import WhisperSTT
+
+    start = time.perf_counter()
+    stt = WhisperSTT(args.model, command_mode=True, shared_weights=shared)
+    tts = None
+    if args.voice:
+        from loki.tts_handler import Piper_Engine
+
+        tts = Piper_Engine(args.voice, synthesis_workers=1, shared_weights=shared)
+    load_s = time.perf_counter() - start
+
+    stt.transcribe_audio(np.zeros(16000, dtype=np.float32))
+    if tts:
+        tts.synthesize("Проверка памяти.")
+    # Все воркеры загружены: снимаем память одновременно
+    barrier.wait()
+    rss, pss = memory_mb()
+    results.put((load_s, rss, pss))
+    barrier.wait()
+
+
+def run_mode(args, mode: str):
+    """Запускает воркеры в режиме `mode`; возвращает (подготовка, результаты)."""
+    shared = mode == "shared"
+    prepare_s = 0.0
+    if shared:
+        from loki.stt_handler import prepare_shared_model
+
+        start = time.perf_counter()
+        prepare_shared_model(args.model)
+        if args.voice:
+            from loki.tts_handler import prepare_shared_voice
+
+            prepare_shared_voice(args.voice)
+        prepare_s = time.perf_counter() - start
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=_worker, args=(args, shared, barrier, results))
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    rows = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return prepare_s, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", default="base", help="Модель Whisper")
+    parser.add_argument("--voice", help="Голос Piper (.onnx)")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    table = []
+    for mode in args.modes:
+        prepare_s, rows = run_mode(args, mode)
+        load = [r[0] for r in rows]
+        rss = [r[1] for r in rows]
+        pss = [r[2] for r in rows if r[2] is not None]
+        table.append(
+            [
+                mode,
+                args.workers,
+                prepare_s,
+                percentile(load, 50),
+                max(load),
+                sum(rss) / len(rss),
+                sum(pss) / len(pss) if pss else "n/a",
+                sum(pss) if pss else "n/a",
+            ]
+        )
+    print_table(
+        [
+            "mode",
+            "workers",
+            "prepare_s",
+            "load_p50_s",
+            "load_max_s",
+            "rss_mb",
+            "pss_mb",
+            "pss_total_mb",
+        ],
+        table,
+    )
+
+
+if __name__ == "__main__":
+    main()
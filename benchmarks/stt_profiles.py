@@ -0,0 +1,70 @@
+# benchmarks/stt_profiles.py
+"""
+Бенчмарк профилей декодирования Whisper.
+
+Прогоняет одни и те же клипы через каждый профиль из
+`config.WHISPER_DECODING_PROFILES` и печатает задержку (медиана, p90) и WER
+относительно эталонных транскрипций.
+
+Пример:
+    poetry run python benchmarks/stt_profiles.py data/ru_commands --short
+"""
+import argparse
+
+from common import load_corpus, measure, percentile, print_table
+
+from loki import config
+from loki.stt_handler import WhisperSTT
+from loki.utils import word_error_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", help="Каталог с WAV-файлами (и эталонными .txt)")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(config.WHISPER_DECODING_PROFILES),
+        help="Профили для сравнения (по умолчанию все)",
+    )
+    parser.add_argument(
+        "--short",
+        action="store_true",
+        help="Использовать быстрый путь для коротких фраз (command mode)",
+    )
+    args = parser.parse_args()
+
+    clips = load_corpus(args.corpus)
+    stt = WhisperSTT(model_name=args.model, command_mode=args.short)
+    stt.transcribe_audio(clips[0].audio)  # Прогрев
+
+    rows = []
+    for profile in args.profiles:
+        latencies, wers = [], []
+        for clip in clips:
+            text, seconds = measure(
+                lambda: stt.transcribe_audio(clip.audio, profile=profile),
+                args.repeats,
+            )
+            latencies.append(seconds)
+            if clip.reference is not None:
+                wers.append(word_error_rate(clip.reference, text))
+        total_audio = sum(clip.duration for clip in clips)
+        rows.append(
+            [
+                profile,
+                percentile(latencies, 50),
+                percentile(latencies, 90),
+                sum(latencies) / total_audio,
+                sum(wers) / len(wers) if wers else "-",
+            ]
+        )
+
+    print(f"{len(clips)} clips, short path: {args.short}")
+    print_table(["profile", "p50_s", "p90_s", "rtf", "wer"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/stt_quantization.py
+"""
+Бенчмарк int8-квантованного Whisper против fp32.
+
+Прогоняет один и тот же набор русских команд через fp32 и int8 модели и
+печатает время загрузки, размер весов, задержку (медиана, p90), RTF и WER
+относительно эталонных транскрипций, а также число клипов, где тексты двух
+моделей расходятся.
+
+Кэш квантованной модели не удаляется: первая строка "load_s" для int8
+показывает либо квантование, либо чтение из кэша (см. лог).
+
+Пример:
+    poetry run python benchmarks/stt_quantization.py data/ru_commands --profile command
+"""
+import argparse
+import io
+import time
+
+import torch
+from common import load_corpus, measure, percentile, print_table
+
+from loki import config
+from loki.stt_handler import WhisperSTT
+from loki.utils import normalize_transcript, word_error_rate
+
+
+def model_size_mb(model) -> float:
+    """Размер сериализованных весов модели в МБ."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", help="Каталог с WAV-файлами (и эталонными .txt)")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--profile", default=config.DEFAULT_WHISPER_PROFILE)
+    parser.add_argument(
+        "--short",
+        action="store_true",
+        help="Использовать быстрый путь для коротких фраз (command mode)",
+    )
+    parser.add_argument(
+        "--threads", type=int, help="torch.set_num_threads (по умолчанию — все ядра)"
+    )
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    clips = load_corpus(args.corpus)
+    total_audio = sum(clip.duration for clip in clips)
+
+    rows, texts = [], {}
+    for quantize in (False, True):
+        start = time.perf_counter()
+        stt = WhisperSTT(
+            model_name=args.model,
+            command_mode=args.short,
+            profile=args.profile,
+            quantize=quantize,
+        )
+        load_s = time.perf_counter() - start
+        stt.transcribe_audio(clips[0].audio)  # Прогрев
+
+        latencies, wers, texts[quantize] = [], [], []
+        for clip in clips:
+            text, seconds = measure(
+                lambda: stt.transcribe_audio(clip.audio), args.repeats
+            )
+            latencies.append(seconds)
+            texts[quantize].append(text)
+            if clip.reference is not None:
+                wers.append(word_error_rate(clip.reference, text))
+        rows.append(
+            [
+                "int8" if quantize else "fp32",
+                load_s,
+                model_size_mb(stt.model),
+                percentile(latencies, 50),
+                percentile(latencies, 90),
+                sum(latencies) / total_audio,
+                sum(wers) / len(wers) if wers else "-",
+            ]
+        )
+        del stt
+
+    changed = sum(
+        normalize_transcript(a) != normalize_transcript(b)
+        for a, b in zip(texts[False], texts[True])
+    )
+    print(
+        f"{len(clips)} clips, profile: {args.profile}, short path: {args.short}, "
+        f"threads: {torch.get_num_threads()}"
+    )
+    print_table(["model", "load_s", "size_mb", "p50_s", "p90_s", "rtf", "wer"], rows)
+    print(f"Transcripts differing between fp32 and int8: {changed}/{len(clips)}")
+
+
+if __name__ == "__main__":
+    main()
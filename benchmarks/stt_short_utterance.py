@@ -0,0 +1,84 @@
+# benchmarks/stt_short_utterance.py
+"""
+Бенчмарк быстрого пути Whisper для коротких команд (command mode).
+
+Для каждого клипа корпуса сравнивает полное 30-секундное окно и укороченный
+аудиоконтекст: задержку, WER относительно эталона (если есть .txt) и
+расхождение между двумя путями. В конце печатает зависимость задержки от
+длины фразы.
+
+Пример:
+    poetry run python benchmarks/stt_short_utterance.py data/ru_commands --model base
+"""
+import argparse
+import collections
+import math
+
+from common import load_corpus, measure, print_table
+
+from loki.stt_handler import WhisperSTT
+from loki.utils import word_error_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", help="Каталог с WAV-файлами (и эталонными .txt)")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    clips = load_corpus(args.corpus)
+    stt = WhisperSTT(model_name=args.model, command_mode=True)
+    # Прогрев, чтобы первый клип не учитывал ленивую инициализацию torch
+    stt.transcribe_audio(clips[0].audio, short=True)
+
+    rows = []
+    by_length = collections.defaultdict(lambda: [[], []])
+    wer_full, wer_short, disagreement = [], [], []
+    for clip in clips:
+        full_text, full_s = measure(
+            lambda: stt.transcribe_audio(clip.audio, short=False), args.repeats
+        )
+        short_text, short_s = measure(
+            lambda: stt.transcribe_audio(clip.audio, short=True), args.repeats
+        )
+        disagreement.append(word_error_rate(full_text, short_text))
+        row = [clip.name, clip.duration, stt.audio_ctx_for(len(clip.audio))]
+        row += [full_s, short_s, full_s / short_s, disagreement[-1]]
+        if clip.reference is not None:
+            wer_full.append(word_error_rate(clip.reference, full_text))
+            wer_short.append(word_error_rate(clip.reference, short_text))
+            row += [wer_full[-1], wer_short[-1]]
+        else:
+            row += ["-", "-"]
+        rows.append(row)
+        bucket = by_length[math.ceil(clip.duration)]
+        bucket[0].append(full_s)
+        bucket[1].append(short_s)
+
+    print_table(
+        ["clip", "dur_s", "ctx", "full_s", "short_s", "speedup", "diff_wer"]
+        + ["wer_full", "wer_short"],
+        rows,
+    )
+
+    print("\nLatency vs utterance length:")
+    length_rows = []
+    for seconds in sorted(by_length):
+        full, short = by_length[seconds]
+        mean_full, mean_short = sum(full) / len(full), sum(short) / len(short)
+        length_rows.append(
+            [f"<= {seconds}s", len(full), mean_full, mean_short, mean_full / mean_short]
+        )
+    print_table(["length", "clips", "full_s", "short_s", "speedup"], length_rows)
+
+    print(f"\nMean full/short disagreement WER: {sum(disagreement) / len(clips):.3f}")
+    if wer_full:
+        print(
+            f"Mean WER vs reference: full={sum(wer_full) / len(wer_full):.3f}, "
+            f"short={sum(wer_short) / len(wer_short):.3f} ({len(wer_full)} clips)"
+        )
+
+
+if __name__ == "__main__":
+    main()
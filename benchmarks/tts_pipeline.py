@@ -0,0 +1,87 @@
+# benchmarks/tts_pipeline.py
+"""
+Бенчмарк конвейерного синтеза Piper.
+
+Для каждого размера пула синтеза имитирует воспроизведение в реальном
+времени (потребитель "проигрывает" каждую порцию ровно столько, сколько она
+звучит) и измеряет задержку до первого звука и паузы между порциями.
+Отдельно печатает real-time factor (RTF) синтеза каждого предложения.
+
+Пример:
+    poetry run python benchmarks/tts_pipeline.py voices/ru_RU-irina-medium.onnx \\
+        --workers 1 2 3 --intra-op 2
+"""
+import argparse
+import asyncio
+import time
+
+from common import print_table
+
+from loki.tts_handler import Piper_Engine, split_sentences
+
+DEFAULT_TEXT = (
+    "Сегодня в Москве переменная облачность, температура около пятнадцати градусов. "
+    "Во второй половине дня возможен небольшой дождь, ветер северо-западный. "
+    "Вечером прояснится, ночью похолодает до восьми градусов. "
+    "Завтра ожидается солнечная погода без осадков. "
+    "Если планируете прогулку, лучше выбрать утро."
+)
+
+
+async def simulate_playback(engine: Piper_Engine, text: str):
+    """Возвращает (время до первого звука, паузы между порциями, общее время)."""
+    start = time.perf_counter()
+    first_audio = None
+    playback_end = None
+    gaps = []
+    async for chunk in engine.stream(text):
+        now = time.perf_counter()
+        if first_audio is None:
+            first_audio = now - start
+        else:
+            gaps.append(max(0.0, now - playback_end))
+        await asyncio.sleep(len(chunk) / 2 / engine.sample_rate)
+        playback_end = time.perf_counter()
+    return first_audio, gaps, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("voice", help="Путь к голосовой модели Piper (.onnx)")
+    parser.add_argument("--text", default=DEFAULT_TEXT)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--intra-op", type=int, default=0)
+    parser.add_argument("--inter-op", type=int, default=0)
+    parser.add_argument("--graph-optimization", default="all")
+    args = parser.parse_args()
+
+    session = dict(
+        intra_op_threads=args.intra_op,
+        inter_op_threads=args.inter_op,
+        graph_optimization=args.graph_optimization,
+    )
+    engine = Piper_Engine(args.voice, synthesis_workers=1, **session)
+    engine.synthesize("Прогрев.")
+
+    rows = []
+    for sentence in split_sentences(args.text):
+        start = time.perf_counter()
+        audio = engine.synthesize(sentence)
+        elapsed = time.perf_counter() - start
+        duration = len(audio) / 2 / engine.sample_rate
+        rows.append([sentence[:40], duration, elapsed, elapsed / duration])
+    print("Per-sentence synthesis:")
+    print_table(["sentence", "audio_s", "synth_s", "rtf"], rows)
+
+    rows = []
+    for workers in args.workers:
+        engine = Piper_Engine(args.voice, synthesis_workers=workers, **session)
+        engine.synthesize("Прогрев.")
+        first_audio, gaps, total = asyncio.run(simulate_playback(engine, args.text))
+        rows.append([workers, first_audio, sum(gaps), max(gaps, default=0.0), total])
+    print("\nSimulated real-time playback:")
+    print_table(["workers", "first_audio_s", "gaps_s", "max_gap_s", "total_s"], rows)
+
+
+if __name__ == "__main__":
+    main()
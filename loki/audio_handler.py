@@ -11,14 +11,81 @@ import logging
 import webrtcvad
 import collections
 import tempfile
+import os
+import numpy as np
+from typing import Callable, Optional
 
 from loki import config
+from loki.capture_monitor import CaptureMonitor
+from loki.resampler import FrameResampler, device_frames
 
 # Преобразуем строковый формат из конфига в константу PyAudio
 FORMAT = getattr(pyaudio, f"pa{config.AUDIO_FORMAT.capitalize()}")
 
 
-def record_command_vad() -> str:
+def detect_capture_rate(
+    pa: "pyaudio.PyAudio", device_index: Optional[int] = None
+) -> int:
+    """
+    Выбирает частоту захвата для устройства ввода и проверяет, что оно ее поддерживает.
+
+    По умолчанию это родная частота устройства (defaultSampleRate), чтобы не
+    зависеть от ресемплинга в драйвере; LOKI_CAPTURE_RATE или
+    `config.AUDIO_CAPTURE_RATE` задают ее явно. Если выбранная частота не
+    поддерживается, пробуется `config.AUDIO_RATE`.
+
+    Args:
+        pa (pyaudio.PyAudio): Экземпляр PyAudio.
+        device_index (Optional[int]): Устройство ввода (None — по умолчанию).
+
+    Returns:
+        int: Частота захвата в Гц.
+
+    Raises:
+        ValueError: Если устройство не поддерживает ни одну из частот.
+    """
+    info = (
+        pa.get_default_input_device_info()
+        if device_index is None
+        else pa.get_device_info_by_index(device_index)
+    )
+    native = int(info["defaultSampleRate"])
+    requested = os.getenv("LOKI_CAPTURE_RATE") or config.AUDIO_CAPTURE_RATE
+    candidates = [int(requested) if requested else native, config.AUDIO_RATE]
+    for rate in dict.fromkeys(candidates):
+        try:
+            pa.is_format_supported(
+                rate,
+                input_device=info["index"],
+                input_channels=config.AUDIO_CHANNELS,
+                input_format=FORMAT,
+            )
+        except ValueError as e:
+            logging.warning(
+                f"Input device '{info['name']}' does not support {rate} Hz: {e}"
+            )
+            continue
+        if rate != native:
+            logging.warning(
+                f"Capturing at {rate} Hz, but the native rate of '{info['name']}' "
+                f"is {native} Hz: the driver will resample."
+            )
+        elif rate != config.AUDIO_RATE:
+            logging.info(
+                f"Capturing at native {rate} Hz from '{info['name']}', "
+                f"resampling to {config.AUDIO_RATE} Hz."
+            )
+        return rate
+    raise ValueError(
+        f"Input device '{info['name']}' supports neither {candidates[0]} Hz "
+        f"nor {config.AUDIO_RATE} Hz."
+    )
+
+
+def record_command_vad(
+    on_pause: Optional[Callable[[bytes], None]] = None,
+    capture_rate: Optional[int] = None,
+) -> str:
     """
     Записывает аудио с микрофона до тех пор, пока не будет обнаружена тишина.
 
@@ -26,19 +93,36 @@ def record_command_vad() -> str:
     Запись начинается после первого обнаружения голоса и заканчивается после
     некоторого периода тишины.
 
+    Args:
+        on_pause (Optional[Callable[[bytes], None]]): Вызывается (в потоке записи)
+            с уже записанным аудио (int16), когда пауза в речи достигает
+            `VAD_PARTIAL_PAUSE_CHUNKS` чанков. Используется для спекулятивной
+            обработки частичной фразы.
+        capture_rate (Optional[int]): Частота захвата (см. `detect_capture_rate`);
+            звук приводится к `config.AUDIO_RATE`. None — определить заново.
+
     Returns:
         str: Путь к временному WAV-файлу с записанной командой.
     """
     vad = webrtcvad.Vad(config.VAD_AGGRESSIVENESS)
     p = pyaudio.PyAudio()
+    rate = capture_rate or detect_capture_rate(p)
+    chunk_frames = device_frames(config.CHUNK_SIZE, rate)
     stream = p.open(
         format=FORMAT,
         channels=config.AUDIO_CHANNELS,
-        rate=config.AUDIO_RATE,
+        rate=rate,
         input=True,
-        frames_per_buffer=config.CHUNK_SIZE,
+        frames_per_buffer=chunk_frames,
     )
     logging.info(">>> Recording started. Speak your command.")
+    # Переполнение буфера не прерывает запись посреди команды: потери
+    # учитываются монитором и видны в METRICS
+    monitor = CaptureMonitor("command", rate, chunk_frames)
+    # Чанки для VAD и Whisper всегда на config.AUDIO_RATE
+    reader = FrameResampler(
+        lambda: monitor.read(stream), rate, config.AUDIO_RATE, config.CHUNK_SIZE
+    )
 
     # Кольцевой буфер для хранения аудио перед началом речи, чтобы не обрезать начало фразы
     ring_buffer = collections.deque(maxlen=10)
@@ -47,7 +131,7 @@ def record_command_vad() -> str:
     silent_chunks = 0
 
     while True:
-        chunk = stream.read(config.CHUNK_SIZE)
+        chunk = reader.read()
         is_speech = vad.is_speech(chunk, config.AUDIO_RATE)
 
         if not triggered:
@@ -64,6 +148,9 @@ def record_command_vad() -> str:
             if not is_speech:
                 # Если наступила тишина, начинаем считать "тихие" чанки
                 silent_chunks += 1
+                if on_pause and silent_chunks == config.VAD_PARTIAL_PAUSE_CHUNKS:
+                    # Пауза в речи: фраза, возможно, уже закончена
+                    on_pause(b"".join(frames))
                 if silent_chunks > config.VAD_SILENCE_PADDING_CHUNKS:
                     # Если тишина длится достаточно долго, прекращаем запись
                     break
@@ -71,7 +158,10 @@ def record_command_vad() -> str:
                 # Если речь возобновилась, сбрасываем счетчик тишины
                 silent_chunks = 0
 
-    logging.info(">>> Recording finished.")
+    logging.info(
+        f">>> Recording finished. Dropped frames: {monitor.dropped_frames} "
+        f"({monitor.overflows} overflows)."
+    )
     stream.stop_stream()
     stream.close()
     p.terminate()
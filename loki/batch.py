@@ -0,0 +1,366 @@
+# loki/batch.py
+"""
+Пакетный (headless) режим LOKI.
+
+Прогоняет каталог WAV-записей через полный конвейер без микрофона:
+STT -> LLM -> `parse_llm_response` -> (опционально) TTS. Этапы работают
+конвейером: пока LLM обрабатывает одну запись, STT уже распознает следующую.
+Каждый этап обслуживается собственным пулом воркеров.
+
+Результат — JSONL-файл, по одной строке на запись: транскрипт, ответ LLM,
+распарсенная команда и время каждого этапа. Используется для офлайн-оценки
+качества и планирования мощностей.
+
+Пример:
+    poetry run python -m loki.batch recordings/ -o results.jsonl --llm-workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from loki import config
+from loki.command_parser import parse_llm_response, parse_structured_response
+from loki.llm_providers import default_generation_options, get_llm_provider
+from loki.prompts import STRUCTURED_OUTPUT_PROMPT, UNIFIED_PROMPT
+from loki.prompt_selector import PromptSelector
+from loki.stt_handler import WhisperSTT
+from loki.utils import percentile
+from loki.wav import load_wav
+
+# Маркер конца очереди для воркеров этапа
+_DONE = object()
+
+
+def _load_audio(path: str):
+    """Читает запись: WAV 16 кГц напрямую, остальные форматы — через ffmpeg."""
+    try:
+        return load_wav(path)
+    except (ValueError, EOFError):
+        import whisper
+
+        return whisper.load_audio(path)
+
+
+class BatchPipeline:
+    """
+    Конвейер пакетной обработки записей.
+
+    Этапы связаны очередями `asyncio.Queue`. STT и TTS выполняются в
+    отдельных пулах потоков; у каждого STT-воркера собственный движок,
+    так как модель Whisper не рассчитана на параллельные вызовы.
+    """
+
+    def __init__(self, stt_engines: list, llm_provider, tts_engine=None, **options):
+        """
+        Args:
+            stt_engines (list): Движки STT, по одному на STT-воркер.
+            llm_provider: Экземпляр `LLMProvider`.
+            tts_engine: Экземпляр `Piper_Engine` или None, если TTS не нужен.
+            **options: llm_workers, tts_workers, tts_dir, dynamic_prompt.
+        """
+        self.stt_engines = stt_engines
+        self.llm_provider = llm_provider
+        self.tts_engine = tts_engine
+        self.llm_workers = options.get("llm_workers", 1)
+        self.tts_workers = options.get("tts_workers", 1)
+        self.tts_dir = options.get("tts_dir")
+        # Те же параметры генерации, что и у оркестратора
+        self.generation_options = default_generation_options()
+        self.structured = self.generation_options.json_schema is not None
+        self.system_prompt = UNIFIED_PROMPT
+        if self.structured:
+            self.system_prompt += STRUCTURED_OUTPUT_PROMPT
+        self.prompt_selector = (
+            PromptSelector() if options.get("dynamic_prompt") else None
+        )
+        self.stt_executor = ThreadPoolExecutor(
+            max_workers=len(stt_engines), thread_name_prefix="loki-batch-stt"
+        )
+        self.tts_executor = ThreadPoolExecutor(
+            max_workers=self.tts_workers, thread_name_prefix="loki-batch-tts"
+        )
+
+    @staticmethod
+    async def _next(inbox: asyncio.Queue):
+        """
+        Берет следующий элемент очереди этапа.
+
+        Маркер конца возвращается обратно в очередь, чтобы его получили
+        и остальные воркеры того же этапа.
+        """
+        item = await inbox.get()
+        if item is _DONE:
+            await inbox.put(_DONE)
+        return item
+
+    async def _stt_worker(self, engine, inbox, outbox):
+        loop = asyncio.get_running_loop()
+        while (path := await self._next(inbox)) is not _DONE:
+            start = time.perf_counter()
+            # _started убирается из записи перед выводом (см. run)
+            record = {"file": os.path.basename(path), "timings": {}, "_started": start}
+            try:
+                audio = await loop.run_in_executor(self.stt_executor, _load_audio, path)
+                record["audio_s"] = round(len(audio) / config.AUDIO_RATE, 3)
+                record["transcript"] = await loop.run_in_executor(
+                    self.stt_executor, engine.transcribe_audio, audio
+                )
+            except Exception as e:
+                logging.error(f"STT failed for {path}: {e}")
+                record["error"] = f"stt: {e}"
+            record["timings"]["stt_s"] = time.perf_counter() - start
+            await outbox.put(record)
+
+    def _system_prompt_for(self, transcript: str) -> str:
+        """Системный промпт для транскрипта, как у оркестратора."""
+        if self.prompt_selector is None:
+            return self.system_prompt
+        prompt = self.prompt_selector.build(transcript)
+        return prompt + STRUCTURED_OUTPUT_PROMPT if self.structured else prompt
+
+    async def _llm_worker(self, inbox, outbox):
+        while (record := await self._next(inbox)) is not _DONE:
+            if record.get("transcript"):
+                system_prompt = self._system_prompt_for(record["transcript"])
+                record["prompt_chars"] = len(system_prompt)
+                start = time.perf_counter()
+                first_token_s = None
+                response = ""
+                usage = {}
+                try:
+                    async for token in self.llm_provider.stream_response(
+                        record["transcript"],
+                        system_prompt=system_prompt,
+                        options=self.generation_options,
+                        on_usage=usage.update,
+                    ):
+                        if first_token_s is None:
+                            first_token_s = time.perf_counter() - start
+                        response += token
+                except Exception as e:
+                    logging.error(f"LLM failed for {record['file']}: {e}")
+                    record["error"] = f"llm: {e}"
+                record["timings"]["llm_s"] = time.perf_counter() - start
+                record["timings"]["llm_first_token_s"] = first_token_s
+                record["response"] = response
+                record["usage"] = usage
+
+                start = time.perf_counter()
+                parse = (
+                    parse_structured_response if self.structured else parse_llm_response
+                )
+                record["text_to_speak"], record["command"] = parse(response)
+                record["timings"]["parse_s"] = time.perf_counter() - start
+            await outbox.put(record)
+
+    def _synthesize_to_file(self, text: str, path: str):
+        audio = self.tts_engine.synthesize(text)
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.tts_engine.sample_rate)
+            wf.writeframes(audio)
+
+    async def _tts_worker(self, inbox, outbox):
+        loop = asyncio.get_running_loop()
+        while (record := await self._next(inbox)) is not _DONE:
+            if self.tts_engine and record.get("text_to_speak"):
+                output = os.path.join(
+                    self.tts_dir, os.path.splitext(record["file"])[0] + ".wav"
+                )
+                start = time.perf_counter()
+                try:
+                    await loop.run_in_executor(
+                        self.tts_executor,
+                        self._synthesize_to_file,
+                        record["text_to_speak"],
+                        output,
+                    )
+                    record["tts_file"] = output
+                except Exception as e:
+                    logging.error(f"TTS failed for {record['file']}: {e}")
+                    record["error"] = f"tts: {e}"
+                record["timings"]["tts_s"] = time.perf_counter() - start
+            await outbox.put(record)
+
+    async def _run_stage(self, workers: list, outbox: asyncio.Queue):
+        """Дожидается всех воркеров этапа и передает маркер конца следующему."""
+        await asyncio.gather(*workers)
+        await outbox.put(_DONE)
+
+    async def run(self, paths: List[str], output_path: str) -> List[Dict[str, Any]]:
+        """
+        Обрабатывает записи и построчно пишет результаты в JSONL-файл.
+
+        Returns:
+            List[Dict[str, Any]]: Записи результатов в порядке завершения.
+        """
+        # Ограниченные очереди не дают быстрому этапу уйти далеко вперед медленного
+        depth = 2 * max(len(self.stt_engines), self.llm_workers, self.tts_workers)
+        paths_q, stt_q, llm_q, done_q = (asyncio.Queue(depth) for _ in range(4))
+        stages = [
+            (
+                [self._stt_worker(e, paths_q, stt_q) for e in self.stt_engines],
+                stt_q,
+            ),
+            ([self._llm_worker(stt_q, llm_q) for _ in range(self.llm_workers)], llm_q),
+            (
+                [self._tts_worker(llm_q, done_q) for _ in range(self.tts_workers)],
+                done_q,
+            ),
+        ]
+        tasks = [asyncio.create_task(self._run_stage(w, q)) for w, q in stages]
+
+        async def feed():
+            for path in paths:
+                await paths_q.put(path)
+            await paths_q.put(_DONE)
+
+        tasks.append(asyncio.create_task(feed()))
+
+        results = []
+        with open(output_path, "w", encoding="utf-8") as out:
+            while (record := await done_q.get()) is not _DONE:
+                # Задержка записи от начала ее STT, включая ожидание в очередях этапов
+                record["timings"]["total_s"] = time.perf_counter() - record.pop(
+                    "_started"
+                )
+                record["timings"] = {
+                    k: round(v, 4) if v is not None else None
+                    for k, v in record["timings"].items()
+                }
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                results.append(record)
+                logging.info(f"[{len(results)}/{len(paths)}] {record['file']} done.")
+        await asyncio.gather(*tasks)
+        self.stt_executor.shutdown()
+        self.tts_executor.shutdown()
+        return results
+
+
+def summarize(results: List[Dict[str, Any]], wall_s: float):
+    """Печатает сводку по этапам: p50/p90 и пропускную способность."""
+    print(f"\nProcessed {len(results)} recordings in {wall_s:.1f} s")
+    audio_s = sum(r.get("audio_s", 0) for r in results)
+    if wall_s > 0:
+        print(
+            f"Throughput: {len(results) / wall_s:.2f} rec/s, {audio_s / wall_s:.2f}x real time"
+        )
+    for stage in (
+        "stt_s",
+        "llm_first_token_s",
+        "llm_s",
+        "parse_s",
+        "tts_s",
+        "total_s",
+    ):
+        values = [r["timings"][stage] for r in results if r["timings"].get(stage)]
+        if values:
+            print(
+                f"{stage:>18}: p50={percentile(values, 50):.3f}  "
+                f"p90={percentile(values, 90):.3f}  n={len(values)}"
+            )
+    prompt_chars = [r["prompt_chars"] for r in results if r.get("prompt_chars")]
+    if prompt_chars:
+        print(f"{'prompt_chars':>18}: p50={percentile(prompt_chars, 50)}")
+    errors = sum(1 for r in results if "error" in r)
+    if errors:
+        print(f"Errors: {errors}")
+
+
+async def main_async(args):
+    paths = sorted(
+        os.path.join(args.directory, name)
+        for name in os.listdir(args.directory)
+        if name.lower().endswith(".wav")
+    )
+    if not paths:
+        raise SystemExit(f"No WAV files found in {args.directory}")
+
+    if args.stt_processes:
+        from loki.stt_worker import WhisperSTTProcess as engine_cls
+    else:
+        engine_cls = WhisperSTT
+    stt_engines = [
+        engine_cls(args.model, command_mode=args.command_mode, profile=args.profile)
+        for _ in range(args.stt_workers)
+    ]
+    tts_engine = None
+    if args.tts_dir:
+        from loki.tts_handler import Piper_Engine
+
+        os.makedirs(args.tts_dir, exist_ok=True)
+        tts_engine = Piper_Engine(model_path=os.getenv("LOKI_PIPER_VOICE_PATH"))
+    llm_provider = get_llm_provider()
+
+    pipeline = BatchPipeline(
+        stt_engines,
+        llm_provider,
+        tts_engine,
+        llm_workers=args.llm_workers,
+        tts_workers=args.tts_workers,
+        tts_dir=args.tts_dir,
+        dynamic_prompt=args.dynamic_prompt,
+    )
+    start = time.perf_counter()
+    try:
+        results = await pipeline.run(paths, args.output)
+    finally:
+        for engine in stt_engines:
+            if hasattr(engine, "close"):
+                engine.close()
+        llm_provider.close()
+    summarize(results, time.perf_counter() - start)
+    print(f"Results written to {args.output}")
+
+
+def main(argv: Optional[List[str]] = None):
+    """Точка входа командной строки пакетного режима."""
+    parser = argparse.ArgumentParser(
+        description="Process a directory of recordings through the LOKI pipeline."
+    )
+    parser.add_argument("directory", help="Каталог с WAV-записями")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl")
+    parser.add_argument("--model", default="base", help="Модель Whisper")
+    parser.add_argument("--profile", default=config.DEFAULT_WHISPER_PROFILE)
+    parser.add_argument("--command-mode", action="store_true")
+    parser.add_argument("--stt-workers", type=int, default=1)
+    parser.add_argument(
+        "--stt-processes",
+        action="store_true",
+        help="Запускать каждый STT-воркер в отдельном процессе",
+    )
+    parser.add_argument("--llm-workers", type=int, default=2)
+    parser.add_argument(
+        "--tts-dir", help="Каталог для синтезированных ответов (включает TTS)"
+    )
+    parser.add_argument("--tts-workers", type=int, default=1)
+    parser.add_argument(
+        "--dynamic-prompt",
+        action="store_true",
+        help="Собирать промпт под каждый запрос (см. loki/prompt_selector.py)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=os.getenv("LOKI_LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
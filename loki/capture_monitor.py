@@ -0,0 +1,140 @@
+# loki/capture_monitor.py
+"""
+Мониторинг здоровья захвата аудио.
+
+PyAudio при `exception_on_overflow=False` молча отбрасывает переполнения
+входного буфера, а сам поток не сообщает, насколько читатель отстает от
+реального времени. `CaptureMonitor` оборачивает чтение из потока и
+восстанавливает эти данные по часам:
+
+- время, проведенное в `stream.read` (read latency);
+- заполненность буфера — сколько аудио уже ждет чтения (отставание);
+- потерянные кадры: за время с начала наблюдения микрофон выдал
+  `elapsed * rate` кадров; все, что не прочитано и не лежит в буфере,
+  было отброшено при переполнении.
+
+Метрики публикуются в `METRICS` с префиксом `audio.<имя потока>.`. Если доля
+потерь за скользящее окно превышает порог, пишется предупреждение: для
+детектора wake word это означает пропущенные активации.
+"""
+import collections
+import logging
+import time
+from typing import Callable
+
+from loki import config
+from .metrics import METRICS
+
+# Часы звуковой карты и time.monotonic расходятся на десятки ppm, поэтому
+# точка отсчета периодически сдвигается, чтобы дрейф не выглядел как потери.
+_REBASE_INTERVAL_S = 60.0
+
+
+class CaptureMonitor:
+    """Считает потери, задержку чтения и заполненность буфера одного потока."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: int,
+        frames_per_read: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            name (str): Имя потока в метриках и логах (например, "wake_word").
+            rate (int): Частота дискретизации потока.
+            frames_per_read (int): Сколько кадров читается за один вызов.
+            clock (Callable[[], float]): Источник времени (для тестов).
+        """
+        self.name = name
+        self.rate = rate
+        self.frames_per_read = frames_per_read
+        self._clock = clock
+        self._prefix = f"audio.{name}"
+        self.dropped_frames = 0
+        self.overflows = 0
+        self._losses = collections.deque()
+        self._last_warning = None
+        self.reset()
+
+    def reset(self):
+        """
+        Начинает наблюдение заново.
+
+        Вызывается, когда поток не читался какое-то время намеренно
+        (например, пока записывалась команда), чтобы пауза не засчитывалась
+        как потери.
+        """
+        self._origin = None
+        self._origin_available = 0
+        self._delivered = 0
+        self._lost_since_origin = 0
+
+    def read(self, stream) -> bytes:
+        """
+        Читает `frames_per_read` кадров из потока PyAudio и учитывает метрики.
+
+        Переполнение не вызывает исключение: потери считаются по часам.
+        """
+        started = self._clock()
+        data = stream.read(self.frames_per_read, exception_on_overflow=False)
+        finished = self._clock()
+        available = (
+            stream.get_read_available() if hasattr(stream, "get_read_available") else 0
+        )
+        self.record(started, finished, available)
+        return data
+
+    def record(self, started: float, finished: float, available: int = 0):
+        """
+        Учитывает одно чтение.
+
+        Args:
+            started (float): Время начала `stream.read`.
+            finished (float): Время возврата из `stream.read`.
+            available (int): Кадров в буфере сразу после чтения.
+        """
+        METRICS.observe(f"{self._prefix}.read_latency_ms", (finished - started) * 1000)
+        fill_ms = available / self.rate * 1000
+        METRICS.set_gauge(f"{self._prefix}.buffer_fill_ms", fill_ms)
+        METRICS.observe(f"{self._prefix}.buffer_fill_ms", fill_ms)
+
+        if self._origin is None or finished - self._origin > _REBASE_INTERVAL_S:
+            self._origin = finished
+            self._origin_available = available
+            self._delivered = 0
+            self._lost_since_origin = 0
+            return
+
+        self._delivered += self.frames_per_read
+        captured = (finished - self._origin) * self.rate
+        lost = int(self._origin_available + captured - self._delivered - available)
+        new_loss = lost - self._lost_since_origin
+        # Запас в одно чтение покрывает неточность момента возврата из read
+        if new_loss > self.frames_per_read:
+            self._lost_since_origin = lost
+            self.dropped_frames += new_loss
+            self.overflows += 1
+            METRICS.increment(f"{self._prefix}.dropped_frames", new_loss)
+            METRICS.increment(f"{self._prefix}.overflows")
+            self._losses.append((finished, new_loss))
+        self._check_sustained_loss(finished)
+
+    def _check_sustained_loss(self, now: float):
+        """Предупреждает, если доля потерь за окно превышает порог."""
+        window_s = config.CAPTURE_LOSS_WINDOW_S
+        while self._losses and now - self._losses[0][0] > window_s:
+            self._losses.popleft()
+        ratio = sum(frames for _, frames in self._losses) / (window_s * self.rate)
+        METRICS.set_gauge(f"{self._prefix}.loss_ratio", ratio)
+        if ratio < config.CAPTURE_LOSS_WARN_RATIO:
+            return
+        if self._last_warning is not None and now - self._last_warning < window_s:
+            return
+        self._last_warning = now
+        logging.warning(
+            f"Sustained audio loss on '{self.name}' capture: {ratio:.1%} of frames "
+            f"dropped in the last {window_s:.0f} s ({self.overflows} overflows in total). "
+            f"Wake-word detection and transcription may degrade."
+        )
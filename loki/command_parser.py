@@ -70,3 +70,80 @@ def parse_llm_response(text: str) -> Tuple[str, Optional[Dict[str, Any]]]:
     text_to_speak = COMMAND_JSON_PATTERN.sub("", text).strip()
 
     return text_to_speak, command_json
+
+
+# Маркер конца блока команды. Как только он сгенерирован, ответ для
+# оркестратора завершен: текст после [/CMD] не нужен.
+COMMAND_END_MARKER = "[/CMD]"
+
+
+class CommandEndDetector:
+    """
+    Отслеживает поток токенов LLM и обнаруживает конец первого блока [CMD].
+
+    Маркер может прийти разбитым на несколько токенов, поэтому поиск ведется
+    по накопленному тексту. После обнаружения маркера `feed` возвращает
+    только часть токена до конца маркера включительно.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.done = False
+
+    def feed(self, token: str) -> str:
+        """
+        Добавляет токен в накопленный текст.
+
+        Args:
+            token: Очередной фрагмент ответа LLM.
+
+        Returns:
+            Часть токена, которую следует передать дальше. После обнаружения
+            маркера возвращается пустая строка.
+        """
+        if self.done:
+            return ""
+        # Маркер мог начаться в предыдущих токенах: ищем с небольшим запасом назад
+        search_from = max(0, len(self.text) - len(COMMAND_END_MARKER) + 1)
+        self.text += token
+        index = self.text.find(COMMAND_END_MARKER, search_from)
+        if index < 0:
+            return token
+        self.done = True
+        overflow = len(self.text) - (index + len(COMMAND_END_MARKER))
+        self.text = self.text[: len(self.text) - overflow]
+        return token[: len(token) - overflow]
+
+
+def parse_structured_response(text: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Разбирает ответ LLM в режиме структурированного вывода (JSON-схема).
+
+    В этом режиме модель возвращает JSON-объект вида
+    `{"speech": "...", "command": {"tool_name": "...", "parameters": {...}}}`
+    (см. `prompts.TOOL_CALL_SCHEMA`) вместо текста с блоком [CMD].
+
+    Args:
+        text: Сырой строковый вывод от LLM.
+
+    Returns:
+        Тот же кортеж, что и `parse_llm_response`: текст для озвучки и команда
+        (или None, если команды нет или JSON невалиден).
+    """
+    if not isinstance(text, str):
+        logging.warning(f"Некорректный тип данных на входе парсера: {type(text)}")
+        return "", None
+    try:
+        payload = json.loads(text)
+    except json.JSONDecodeError:
+        logging.error(f"Сбой десериализации структурированного ответа: {text}")
+        return "", None
+    if not isinstance(payload, dict):
+        return "", None
+
+    speech = payload.get("speech")
+    speech = speech.strip() if isinstance(speech, str) else ""
+    command = payload.get("command")
+    if not isinstance(command, dict) or not command.get("tool_name"):
+        command = None
+    return speech, command
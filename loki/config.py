@@ -23,6 +23,12 @@ CHUNK_DURATION_MS = (
 )
 # Размер чанка в семплах: 16000 Гц * 30 мс / 1000 = 480 семплов
 CHUNK_SIZE = int(AUDIO_RATE * CHUNK_DURATION_MS / 1000)
+# Частота захвата с микрофона. None — родная частота устройства по умолчанию
+# (defaultSampleRate): драйвер не ресемплирует, звук приводится к AUDIO_RATE
+# в loki/resampler.py. Переопределяется LOKI_CAPTURE_RATE (например, 16000).
+AUDIO_CAPTURE_RATE = None
+# Длина фильтра ресемплера на фазу: больше — круче спад АЧХ и дороже по CPU
+RESAMPLER_TAPS_PER_PHASE = 32
 # Уровень агрессивности VAD (от 0 до 3). 3 - самый "агрессивный",
 # требует наименьшей громкости для срабатывания детектора речи.
 VAD_AGGRESSIVENESS = 3
@@ -30,11 +36,182 @@ VAD_AGGRESSIVENESS = 3
 # Количество "тихих" чанков, после которых запись останавливается
 VAD_SILENCE_PADDING_CHUNKS = 35
 
+# Количество "тихих" чанков (пауза в речи), после которых уже записанная часть
+# фразы передается для спекулятивного распознавания и запроса к LLM.
+# Должно быть меньше VAD_SILENCE_PADDING_CHUNKS.
+VAD_PARTIAL_PAUSE_CHUNKS = 10
+
+# Мониторинг захвата аудио (см. loki/capture_monitor.py): предупреждение, если
+# за скользящее окно (в секундах) потеряна заметная доля кадров.
+CAPTURE_LOSS_WINDOW_S = 10.0
+CAPTURE_LOSS_WARN_RATIO = 0.01
+
+
+# --- STT Handler Configuration ---
+# Быстрый путь для коротких голосовых команд (command mode). Вместо стандартного
+# 30-секундного окна энкодер Whisper обрабатывает только аудиоконтекст,
+# пропорциональный фактической длине фразы, плюс запас.
+
+# Фразы длиннее этого значения (в секундах) всегда идут через полное окно
+WHISPER_SHORT_AUDIO_MAX_S = 10.0
+# Запас (в секундах) поверх длины фразы, чтобы не обрезать последнее слово
+WHISPER_AUDIO_CTX_MARGIN_S = 1.0
+# Язык распознавания для быстрого пути. Автоопределение языка в Whisper
+# рассчитано только на полное окно, поэтому здесь язык задается явно.
+WHISPER_LANGUAGE = "ru"
+
+# Именованные профили декодирования Whisper. Значения передаются как именованные
+# аргументы в `whisper.transcribe` (и в `DecodingOptions` для быстрого пути).
+# Профиль выбирается переменной окружения LOKI_STT_PROFILE.
+WHISPER_DECODING_PROFILES = {
+    # Настройки библиотеки по умолчанию: автоопределение языка, каскад температур
+    "default": {},
+    # Короткие команды: фиксированный язык, жадное декодирование, без таймстемпов
+    # и без повторных попыток с более высокой температурой.
+    "command": {
+        "language": WHISPER_LANGUAGE,
+        "temperature": 0.0,
+        "beam_size": None,
+        "best_of": None,
+        "without_timestamps": True,
+        "condition_on_previous_text": False,
+        "compression_ratio_threshold": None,
+        "logprob_threshold": None,
+    },
+    # Диктовка: beam search и каскад температур ради точности
+    "accurate": {
+        "language": WHISPER_LANGUAGE,
+        "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        "beam_size": 5,
+        "best_of": 5,
+    },
+}
+DEFAULT_WHISPER_PROFILE = "default"
+
+# Int8-квантование линейных слоев Whisper для CPU (включается LOKI_STT_QUANTIZE).
+# Квантованная модель сохраняется в этот каталог, чтобы при следующих запусках
+# не квантовать ее заново. Переопределяется LOKI_STT_QUANTIZED_CACHE_DIR.
+WHISPER_QUANTIZED_CACHE_DIR = "~/.cache/loki/whisper"
+
+# Общие веса для нескольких процессов LOKI (включаются LOKI_SHARED_WEIGHTS):
+# Whisper (fp32) и голос Piper сохраняются в этот каталог один раз, а процессы
+# отображают их в память вместо загрузки собственной копии.
+# Переопределяется LOKI_SHARED_WEIGHTS_DIR.
+SHARED_WEIGHTS_DIR = "~/.cache/loki/shared"
+
+
+# --- TTS Handler Configuration ---
+# Длинные ответы делятся на предложения: пока воспроизводится предложение N,
+# следующие синтезируются в небольшом пуле потоков (порядок строго сохраняется).
+PIPER_SYNTHESIS_WORKERS = 2
+# Размер порции аудио, отдаваемой плееру (в мс). Небольшие порции позволяют
+# быстро прервать озвучку по wake word.
+PIPER_PLAYBACK_CHUNK_MS = 200
+# Параметры сессии onnxruntime для Piper. 0 потоков — значение onnxruntime
+# по умолчанию. Уровень оптимизации графа: "disable", "basic", "extended", "all".
+PIPER_INTRA_OP_THREADS = 0
+PIPER_INTER_OP_THREADS = 0
+PIPER_GRAPH_OPTIMIZATION = "all"
+
+# Звуковые подтверждения (см. loki/earcons.py), включаются LOKI_EARCONS.
+# Для каждого звука: источник ("tones" + "duration_ms", "file" — WAV моно 16 бит,
+# или "phrase" — синтезируется Piper при старте), переход "on" ("wake" — wake word
+# распознан, "endpoint" — фраза закончена) и задержка "delay_ms" от перехода.
+# "volume" — множитель амплитуды (для тонов — пиковая амплитуда).
+# Если ответ начался раньше задержки, звук не проигрывается.
+EARCONS = {
+    "wake": {"tones": (660, 880), "duration_ms": 60, "on": "wake", "volume": 0.6},
+    "endpoint": {"tones": (880,), "duration_ms": 60, "on": "endpoint", "volume": 0.6},
+    "thinking": {"phrase": "Секунду.", "on": "endpoint", "delay_ms": 1500},
+}
+
+
+# --- CPU Budget Configuration ---
+# Распределение CPU между движками (см. loki/cpu_budget.py). Для каждого движка:
+# "threads" — потоки внутри библиотеки (torch для STT, onnxruntime для TTS;
+# 0 — по умолчанию), "workers" — размер именованного пула потоков,
+# "cpus" — список ядер для привязки (только Linux).
+# Переопределяется JSON в переменной окружения LOKI_CPU_BUDGET.
+CPU_THREAD_BUDGET = {
+    # Чтение wake word и запись команды: отдельный пул, который не занимают STT/TTS
+    "audio": {"workers": 2},
+    # Вызовы Whisper все равно сериализуются, параллелизм — внутри torch
+    "stt": {"threads": 0, "workers": 1},
+    # Предложения синтезируются параллельно с воспроизведением
+    "tts": {"threads": 0, "workers": PIPER_SYNTHESIS_WORKERS},
+    # Короткие блокирующие вызовы (пул по умолчанию для run_in_executor(None, ...))
+    "io": {"workers": 4},
+}
+
+# --- Resource Manager Configuration ---
+# Через сколько секунд простоя выгружать Whisper и Piper (0 — никогда).
+# Переопределяется переменной окружения LOKI_IDLE_UNLOAD_S.
+RESOURCE_IDLE_UNLOAD_S = 0
+# Бюджет резидентной памяти процесса в МБ: при превышении выгружаются давно
+# неиспользуемые движки (0 — без бюджета). Переменная окружения LOKI_RSS_BUDGET_MB.
+RESOURCE_RSS_BUDGET_MB = 0
+# Период проверки простоя и бюджета памяти (в секундах)
+RESOURCE_CHECK_INTERVAL_S = 30
+
+
+# --- Event Loop Monitor Configuration ---
+# Монитор задержки event loop (см. loki/loop_monitor.py), включается LOKI_LOOP_MONITOR.
+# Период пульса (в секундах) и задержка (в мс), после которой снимается стек
+# блокирующего кода.
+LOOP_MONITOR_INTERVAL_S = 0.05
+LOOP_LAG_THRESHOLD_MS = 100
+
+# --- Metrics Export Configuration ---
+# Период (в секундах), с которым сводка METRICS пишется в лог
+# (переопределяется LOKI_METRICS_LOG_S); 0 — не писать.
+METRICS_LOG_INTERVAL_S = 0
+
+# --- Turn Profiling Configuration ---
+# Профилирование ходов по запросу (см. loki/turn_profiler.py): каталог для
+# файлов .prof и .trace.json (переопределяется LOKI_PROFILE_DIR) и сколько
+# ходов профилировать по сигналу SIGUSR1.
+PROFILE_OUTPUT_DIR = "profiles"
+PROFILE_SIGNAL_TURNS = 1
+
+# --- Turn Journal Configuration ---
+# Журнал ходов для анализа мощностей (см. loki/journal.py), включается
+# указанием каталога в LOKI_JOURNAL_DIR. Размер сегмента (в МБ), сколько
+# последних сегментов хранить и как долго копить записи перед записью на диск.
+JOURNAL_SEGMENT_MB = 16
+JOURNAL_MAX_SEGMENTS = 64
+JOURNAL_FLUSH_INTERVAL_S = 1.0
+
+# --- Prompt Assembly Configuration ---
+# Динамическая сборка системного промпта под запрос (см. loki/prompt_selector.py),
+# включается LOKI_DYNAMIC_PROMPT. Число примеров с инструментами в промпте
+# (ограничители добавляются всегда) и порог сходства ключевого слова инструмента
+# с транскриптом (доля совпавших символьных триграмм).
+PROMPT_TOP_K_EXAMPLES = 2
+PROMPT_TOOL_MIN_SCORE = 0.6
+
+# --- Conversation Memory Configuration ---
+# История разговора для уточняющих вопросов (см. loki/conversation.py),
+# включается LOKI_CONVERSATION. Бюджет истории в запросе (оценка в токенах,
+# переопределяется LOKI_CONVERSATION_TOKENS), число последних ходов, которые
+# хранятся дословно, время простоя до сброса сессии (в секундах), лимит
+# токенов краткого содержания и число символов на токен для оценки без
+# токенизатора (для русского текста у Llama 3 около 3).
+CONVERSATION_TOKEN_BUDGET = 600
+CONVERSATION_KEEP_TURNS = 3
+CONVERSATION_IDLE_EXPIRY_S = 300
+CONVERSATION_SUMMARY_MAX_TOKENS = 120
+CONVERSATION_CHARS_PER_TOKEN = 3
 
 # --- LLM Client Configuration ---
 # Значения по умолчанию для подключения к локальному серверу Ollama
 DEFAULT_OLLAMA_BASE_URL = "http://localhost:11434"
 DEFAULT_OLLAMA_MODEL = "llama3:8b-instruct-q4_k_m"
+# Google AI: сколько моделей и кэшей контекста (по одному на системный промпт)
+# хранить одновременно; давно не использованные удаляются. При сборке промпта
+# под запрос (LOKI_DYNAMIC_PROMPT) промпты разные, и без лимита их число растет.
+GOOGLE_MODEL_CACHE_SIZE = 8
+# Через сколько секунд повторить создание кэша контекста после ошибки
+GOOGLE_CONTEXT_CACHE_RETRY_S = 300
 
 # --- Visual Controller Configuration ---
 # Путь по умолчанию к исполняемому файлу Wallpaper Engine.
@@ -0,0 +1,185 @@
+# loki/conversation.py
+"""
+Ограниченная память разговора для уточняющих вопросов.
+
+Без истории каждая реплика отправляется в LLM отдельно, и вопрос вроде
+"А завтра?" после вопроса о погоде не понятен. Наивная история растет без
+ограничений, а вместе с ней и время prefill. `ConversationMemory` держит
+контекст в строгом бюджете токенов:
+
+- последние `keep_turns` ходов хранятся дословно;
+- более старые ходы в фоне между ходами сжимаются в краткое содержание
+  (отдельным запросом к той же LLM). Сжатие отменяется, как только
+  начинается новый ход, чтобы не занимать GPU во время ответа;
+- если сжатие не успело, самые старые дословные ходы отбрасываются, и
+  контекст все равно не превышает бюджет;
+- после `idle_expiry_s` без реплик сессия начинается заново.
+
+История передается провайдерам как список сообщений
+`{"role": "user" | "assistant", "content": ...}`; краткое содержание идет
+первой парой сообщений, так что системный промпт (и его кэш) не меняется.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loki import config
+from loki.llm_providers import GenerationOptions, LLMProvider
+from loki.metrics import METRICS
+from loki.prompts import CONVERSATION_SUMMARY_PROMPT
+
+
+# Краткое содержание передается первой парой сообщений
+SUMMARY_PREFIX = "Кратко о нашем разговоре ранее: "
+SUMMARY_REPLY = "Понял."
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов текста без токенизатора модели."""
+    return len(text) // config.CONVERSATION_CHARS_PER_TOKEN + 1
+
+
+def _pair(user: str, assistant: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "user", "content": user},
+        {"role": "assistant", "content": assistant},
+    ]
+
+
+class ConversationMemory:
+    """История разговора с дословными последними ходами и кратким содержанием."""
+
+    def __init__(
+        self,
+        token_budget: int = config.CONVERSATION_TOKEN_BUDGET,
+        keep_turns: int = config.CONVERSATION_KEEP_TURNS,
+        idle_expiry_s: float = config.CONVERSATION_IDLE_EXPIRY_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            token_budget (int): Максимальный размер истории в запросе (оценка в токенах).
+            keep_turns (int): Сколько последних ходов хранить дословно.
+            idle_expiry_s (float): Время без реплик, после которого сессия сбрасывается.
+            clock (Callable): Источник времени (для тестов).
+        """
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.idle_expiry_s = idle_expiry_s
+        self._clock = clock
+        self.turns: List[Tuple[str, str]] = []
+        self.summary = ""
+        self._last_activity = clock()
+        self._compaction: Optional[asyncio.Task] = None
+
+    def reset(self):
+        """Начинает новую сессию."""
+        self.cancel_compaction()
+        self.turns = []
+        self.summary = ""
+
+    def _expire_if_idle(self):
+        if (
+            self.idle_expiry_s
+            and self._clock() - self._last_activity > self.idle_expiry_s
+        ):
+            if self.turns or self.summary:
+                logging.info(
+                    "Conversation expired after inactivity, starting a new one."
+                )
+            self.reset()
+
+    def messages(self) -> List[Dict[str, str]]:
+        """
+        История для следующего запроса в пределах бюджета токенов.
+
+        Сначала краткое содержание, затем как можно больше последних ходов.
+        """
+        self._expire_if_idle()
+        budget = self.token_budget
+        messages = []
+        if self.summary:
+            messages = _pair(SUMMARY_PREFIX, SUMMARY_REPLY)
+            room = budget - sum(estimate_tokens(m["content"]) for m in messages)
+            if room > 1:
+                # -1: округление оценки при склейке строк
+                summary = self.summary[
+                    : (room - 1) * config.CONVERSATION_CHARS_PER_TOKEN
+                ]
+                messages[0]["content"] += summary
+                budget -= sum(estimate_tokens(m["content"]) for m in messages)
+            else:
+                messages = []
+        recent = []
+        for user, assistant in reversed(self.turns):
+            cost = estimate_tokens(user) + estimate_tokens(assistant)
+            if cost > budget:
+                break
+            budget -= cost
+            recent = _pair(user, assistant) + recent
+        return messages + recent
+
+    def add_turn(self, user: str, assistant: str):
+        """Запоминает завершенный ход."""
+        self._expire_if_idle()
+        self.turns.append((user, assistant))
+        self._last_activity = self._clock()
+
+    @property
+    def needs_compaction(self) -> bool:
+        """Есть ли ходы старше `keep_turns`, которые пора сжать."""
+        return len(self.turns) > self.keep_turns
+
+    def schedule_compaction(self, provider: LLMProvider):
+        """Запускает фоновое сжатие старых ходов, если оно нужно."""
+        if not self.needs_compaction:
+            return
+        if self._compaction and not self._compaction.done():
+            return
+        self._compaction = asyncio.create_task(self.compact(provider))
+
+    def cancel_compaction(self):
+        """Отменяет идущее сжатие (например, когда начался новый ход)."""
+        if self._compaction and not self._compaction.done():
+            self._compaction.cancel()
+        self._compaction = None
+
+    async def compact(self, provider: LLMProvider):
+        """
+        Сжимает все ходы, кроме последних `keep_turns`, в краткое содержание.
+
+        При ошибке или отмене история не меняется: сжатие повторится после
+        следующего хода.
+        """
+        old = self.turns[: len(self.turns) - self.keep_turns]
+        if not old:
+            return
+        parts = [f"Краткое содержание до этого: {self.summary}"] if self.summary else []
+        parts.append(
+            "Новые реплики:\n"
+            + "\n".join(f"Пользователь: {u}\nАссистент: {a}" for u, a in old)
+        )
+        start = time.perf_counter()
+        summary = ""
+        usage = {}
+        async for token in provider.stream_response(
+            "\n\n".join(parts),
+            system_prompt=CONVERSATION_SUMMARY_PROMPT,
+            options=GenerationOptions(
+                max_tokens=config.CONVERSATION_SUMMARY_MAX_TOKENS
+            ),
+            on_usage=usage.update,
+        ):
+            summary += token
+        if usage.get("error") or not summary.strip():
+            logging.warning("Conversation compaction failed, keeping turns verbatim.")
+            return
+        # За время сжатия ходы только добавлялись в конец, сжатые — первые len(old)
+        self.turns = self.turns[len(old) :]
+        self.summary = summary.strip()
+        METRICS.observe("conversation.compaction_s", time.perf_counter() - start)
+        logging.info(
+            f"Compacted {len(old)} conversation turn(s) into a summary of "
+            f"~{estimate_tokens(self.summary)} tokens."
+        )
@@ -0,0 +1,137 @@
+# loki/cpu_budget.py
+"""
+Единый бюджет потоков CPU для движков LOKI.
+
+Whisper (torch), Piper (onnxruntime), Porcupine и пул потоков по умолчанию
+для `run_in_executor(None, ...)` по отдельности подбирают число потоков под
+все ядра. Вместе с Ollama на той же машине это приводит к переподписке CPU
+и всплескам задержки.
+
+Здесь одно место задает для каждого движка число потоков и, при желании,
+привязку к ядрам (`config.CPU_THREAD_BUDGET`, переопределяется JSON в
+LOKI_CPU_BUDGET). `CpuBudget` создает именованные пулы потоков вместо общего:
+поток чтения wake word живет в собственном пуле "audio" и не может остаться
+без потока из-за STT или TTS.
+
+Привязка к ядрам ставится на потоки пула при их создании. Потоки, которые
+библиотеки создают изнутри этих потоков (OpenMP в torch, пул onnxruntime),
+наследуют ту же маску. Поддерживается только на Linux.
+"""
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from loki import config
+
+
+@dataclass
+class EngineBudget:
+    """
+    Бюджет одного движка.
+
+    Attributes:
+        threads: Потоки внутри библиотеки движка (torch, onnxruntime);
+            0 — значение библиотеки по умолчанию.
+        workers: Размер именованного пула потоков движка.
+        cpus: Номера ядер для привязки (None — без привязки).
+    """
+
+    threads: int = 0
+    workers: int = 1
+    cpus: Optional[List[int]] = None
+
+
+def load_budget() -> Dict[str, EngineBudget]:
+    """
+    Собирает бюджет из `config.CPU_THREAD_BUDGET` и переменной LOKI_CPU_BUDGET.
+
+    LOKI_CPU_BUDGET — JSON того же вида, что и в конфиге, например
+    '{"stt": {"threads": 4, "cpus": [0, 1, 2, 3]}}'; заданные в нем поля
+    заменяют значения из конфига.
+
+    Raises:
+        ValueError: Если LOKI_CPU_BUDGET не является корректным JSON-объектом.
+    """
+    specs = {name: dict(spec) for name, spec in config.CPU_THREAD_BUDGET.items()}
+    override = os.getenv("LOKI_CPU_BUDGET")
+    if override:
+        try:
+            overrides = json.loads(override)
+            for name, spec in overrides.items():
+                specs.setdefault(name, {}).update(spec)
+        except (json.JSONDecodeError, AttributeError) as e:
+            raise ValueError(f"Некорректное значение LOKI_CPU_BUDGET: {e}") from None
+    return {name: EngineBudget(**spec) for name, spec in specs.items()}
+
+
+def pin_current_thread(cpus: Optional[List[int]]):
+    """Привязывает текущий поток к ядрам `cpus` (на Linux; иначе ничего не делает)."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        # Для pid 0 Linux меняет маску вызывающего потока, а не всего процесса
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        logging.warning(f"Failed to pin thread to CPUs {cpus}: {e}")
+
+
+class CpuBudget:
+    """Раздает движкам именованные пулы потоков и настраивает torch."""
+
+    def __init__(self, budget: Optional[Dict[str, EngineBudget]] = None):
+        self.budget = load_budget() if budget is None else budget
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+
+    def get(self, name: str) -> EngineBudget:
+        """Бюджет движка `name` (пустой, если он не задан)."""
+        return self.budget.get(name, EngineBudget())
+
+    def threads(self, name: str) -> Optional[int]:
+        """Число потоков движка или None, если оставлено значение по умолчанию."""
+        return self.get(name).threads or None
+
+    def executor(self, name: str) -> ThreadPoolExecutor:
+        """
+        Возвращает именованный пул потоков движка, создавая его при первом вызове.
+
+        Потоки пула называются `loki-<name>` и привязаны к ядрам из бюджета.
+        """
+        executor = self._executors.get(name)
+        if executor is None:
+            budget = self.get(name)
+            executor = ThreadPoolExecutor(
+                max_workers=max(1, budget.workers),
+                thread_name_prefix=f"loki-{name}",
+                initializer=pin_current_thread,
+                initargs=(budget.cpus,),
+            )
+            self._executors[name] = executor
+        return executor
+
+    def configure_torch(self, name: str = "stt"):
+        """Ограничивает пул потоков torch бюджетом движка `name`."""
+        threads = self.threads(name)
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+
+    def log_summary(self):
+        """Пишет в лог итоговое распределение потоков."""
+        parts = [
+            f"{name}: threads={b.threads or 'default'}, workers={b.workers}"
+            + (f", cpus={b.cpus}" if b.cpus else "")
+            for name, b in self.budget.items()
+        ]
+        logging.info(
+            f"CPU budget ({os.cpu_count()} cores available): {'; '.join(parts)}"
+        )
+
+    def shutdown(self):
+        """Останавливает все созданные пулы."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
@@ -0,0 +1,223 @@
+# loki/earcons.py
+"""
+Звуковые подтверждения (earcons), маскирующие задержку ответа.
+
+Между концом фразы и первым звуком ответа проходят секунды: сначала STT,
+затем полный ответ LLM. Чтобы пользователь не оставался в тишине, на
+переходах состояний (wake word, конец фразы) проигрываются короткие звуки
+или заранее синтезированные фразы.
+
+Все звуки готовятся при старте и хранятся в памяти. Воспроизведение идет
+через заранее открытый поток вывода, поэтому звук начинается почти сразу.
+Задержка задается отдельно для каждого перехода: если настоящий ответ
+начался раньше, подтверждение не звучит вовсе, а уже звучащее плавно
+затухает за несколько миллисекунд, не мешая ответу.
+"""
+import asyncio
+import logging
+import os
+import threading
+import wave
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from loki import config
+
+# Длительность плавного нарастания и затухания звука (в мс): убирает щелчки
+_FADE_MS = 5
+
+
+def render_tones(
+    frequencies, duration_ms: int, sample_rate: int, volume: float = 0.3
+) -> np.ndarray:
+    """
+    Генерирует последовательность тонов (например, двухнотный сигнал).
+
+    Args:
+        frequencies: Частоты нот в Гц, проигрываемых друг за другом.
+        duration_ms (int): Длительность каждой ноты.
+        sample_rate (int): Частота дискретизации.
+        volume (float): Амплитуда от 0 до 1.
+
+    Returns:
+        np.ndarray: Сигнал float32 с плавными краями у каждой ноты.
+    """
+    n = int(sample_rate * duration_ms / 1000)
+    t = np.arange(n) / sample_rate
+    fade = min(n // 2, int(sample_rate * _FADE_MS / 1000))
+    envelope = np.ones(n, dtype=np.float32)
+    envelope[:fade] = np.linspace(0.0, 1.0, fade)
+    envelope[n - fade :] = np.linspace(1.0, 0.0, fade)
+    notes = [np.sin(2 * np.pi * f * t) * envelope * volume for f in frequencies]
+    return np.concatenate(notes).astype(np.float32)
+
+
+def load_sound(path: str, sample_rate: int) -> np.ndarray:
+    """
+    Читает WAV-файл (моно, 16 бит) и приводит его к частоте `sample_rate`.
+
+    Raises:
+        ValueError: Если формат файла не поддерживается.
+    """
+    with wave.open(path, "rb") as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError(f"Earcon {path} must be mono 16-bit WAV.")
+        source_rate = wf.getframerate()
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    audio = audio.astype(np.float32) / 32768.0
+    if source_rate != sample_rate:
+        # Линейной интерполяции достаточно для коротких служебных звуков
+        n = int(len(audio) * sample_rate / source_rate)
+        audio = np.interp(
+            np.arange(n) * source_rate / sample_rate, np.arange(len(audio)), audio
+        ).astype(np.float32)
+    return audio
+
+
+class EarconPlayer:
+    """
+    Проигрывает заранее подготовленные звуки на переходах состояний.
+
+    Звуки описываются в `config.EARCONS`: для каждого звука задается
+    источник (`tones`, `file` или `phrase`), переход `on`, на котором он
+    звучит, и задержка `delay_ms` от момента перехода.
+    """
+
+    def __init__(self, earcons: Dict[str, dict], sample_rate: int):
+        """
+        Args:
+            earcons (Dict[str, dict]): Имя звука -> {"sound", "on", "delay_ms"}.
+            sample_rate (int): Частота дискретизации всех звуков.
+        """
+        self.earcons = earcons
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._buffer = None
+        self._position = 0
+        self._fade_left = None
+        self._fade_len = int(sample_rate * _FADE_MS / 1000)
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._stream = None
+
+    @classmethod
+    def from_config(cls, tts_engine, specs: Optional[dict] = None):
+        """
+        Подготавливает все звуки.
+
+        Args:
+            tts_engine: Движок Piper для заранее синтезируемых фраз; его частота
+                дискретизации используется для всех звуков.
+            specs (Optional[dict]): Описание звуков (по умолчанию `config.EARCONS`).
+        """
+        specs = config.EARCONS if specs is None else specs
+        sample_rate = tts_engine.sample_rate
+        earcons = {}
+        for name, spec in specs.items():
+            try:
+                if "phrase" in spec:
+                    pcm = tts_engine.synthesize(spec["phrase"])
+                    sound = np.frombuffer(pcm, dtype=np.int16) / 32768.0
+                elif "file" in spec:
+                    sound = load_sound(os.path.expanduser(spec["file"]), sample_rate)
+                else:
+                    sound = render_tones(
+                        spec.get("tones", (880,)),
+                        spec.get("duration_ms", 80),
+                        sample_rate,
+                        # Громкость из описания применяется ниже ко всем видам звуков
+                        volume=1.0,
+                    )
+            except Exception as e:
+                logging.warning(f"Earcon '{name}' is unavailable: {e}")
+                continue
+            earcons[name] = {
+                "sound": (sound * spec.get("volume", 1.0)).astype(np.float32),
+                "on": spec["on"],
+                "delay_ms": spec.get("delay_ms", 0),
+            }
+            logging.info(
+                f"Earcon '{name}' ready: {len(sound) / sample_rate * 1000:.0f} ms, "
+                f"on '{spec['on']}' after {earcons[name]['delay_ms']} ms."
+            )
+        return cls(earcons, sample_rate)
+
+    def open(self):
+        """Открывает поток вывода заранее, чтобы звук начинался без задержки."""
+        import sounddevice as sd
+
+        self._stream = sd.OutputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype="float32",
+            callback=self._callback,
+        )
+        self._stream.start()
+
+    def _callback(self, outdata, frames, time_info, status):
+        """Заполняет буфер вывода (вызывается в аудиопотоке sounddevice)."""
+        out = outdata[:, 0]
+        out.fill(0.0)
+        with self._lock:
+            if self._buffer is None:
+                return
+            chunk = self._buffer[self._position : self._position + frames]
+            if self._fade_left is not None:
+                # Плавное затухание при прерывании настоящим ответом
+                chunk = chunk[: self._fade_left]
+                ramp = np.arange(self._fade_left, self._fade_left - len(chunk), -1)
+                chunk = chunk * (ramp / self._fade_len)
+                self._fade_left -= len(chunk)
+            out[: len(chunk)] = chunk
+            self._position += len(chunk)
+            if self._position >= len(self._buffer) or self._fade_left == 0:
+                self._buffer = None
+
+    def trigger(self, transition: str, on_start: Optional[Callable[[], None]] = None):
+        """
+        Планирует звуки перехода `transition` с настроенными задержками.
+
+        Вызывается из event loop. Ранее запланированные звуки отменяются.
+
+        Args:
+            transition (str): Переход состояния ("wake" или "endpoint").
+            on_start (Optional[Callable[[], None]]): Вызывается в момент начала
+                каждого звука.
+        """
+        self.cancel()
+        for name, earcon in self.earcons.items():
+            if earcon["on"] == transition:
+                self._pending[name] = asyncio.create_task(
+                    self._play_after(earcon, on_start)
+                )
+
+    async def _play_after(self, earcon: dict, on_start):
+        await asyncio.sleep(earcon["delay_ms"] / 1000)
+        with self._lock:
+            # Новый звук заменяет текущий: подтверждения короткие и не накладываются
+            self._buffer = earcon["sound"]
+            self._position = 0
+            self._fade_left = None
+        if on_start:
+            on_start()
+
+    def cancel(self):
+        """
+        Отменяет запланированный звук, а звучащий плавно заглушает.
+
+        Вызывается, когда начинается настоящий ответ.
+        """
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+        with self._lock:
+            if self._buffer is not None and self._fade_left is None:
+                self._fade_left = self._fade_len
+
+    def close(self):
+        """Закрывает поток вывода."""
+        self.cancel()
+        if self._stream:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
@@ -0,0 +1,301 @@
+# loki/journal.py
+"""
+Журнал ходов для анализа мощностей.
+
+Лог содержит только свободный текст, и по нему нельзя посчитать, например,
+перцентили задержки по часам. `TurnJournal` пишет по одной компактной
+записи на ход: время этапов, транскрипт, ответ, команду, провайдера и модель,
+число токенов.
+
+Формат — сегменты `turns-<мс от эпохи>.lkj` с ротацией по размеру и
+ограничением числа сегментов. Сегмент начинается с `SEGMENT_MAGIC`, дальше
+идут записи: заголовок фиксированного размера (`RECORD_HEADER`: длина и CRC32
+тела, время начала хода, длительности этапов `STAGES`, токены промпта и
+ответа) и тело — компактный JSON со всеми полями. Числовые поля продублированы
+в заголовке, поэтому агрегаты считаются без разбора JSON.
+
+Запись асинхронная: `record()` только кладет словарь в очередь, отдельный
+поток копит записи до `flush_interval_s` и пишет их одной операцией.
+
+`JournalReader` отображает сегменты в память (mmap) и идет по заголовкам, не
+загружая журнал в RAM; обрезанная запись в конце сегмента (например, после
+аварийного завершения) просто завершает его чтение.
+
+Пример:
+    poetry run python -m loki.journal ~/.local/share/loki/journal --stage total_s
+"""
+import argparse
+import json
+import logging
+import math
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from loki import config
+from loki.utils import percentile
+
+SEGMENT_MAGIC = b"LKJ1"
+SEGMENT_SUFFIX = ".lkj"
+# Этапы хода, длительности которых (в секундах от начала хода) есть в заголовке
+STAGES = ("stt_s", "llm_first_token_s", "llm_s", "tts_first_audio_s", "total_s")
+# Длина тела, CRC32 тела, время начала хода, этапы (NaN — не было), токены
+RECORD_HEADER = struct.Struct(f"<IId{len(STAGES)}fII")
+_NO_TOKENS = 0xFFFFFFFF
+_STOP = object()
+
+
+class TurnTimer:
+    """Отметки этапов одного хода относительно его начала."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def mark(self, stage: str):
+        """Фиксирует момент окончания этапа (повторные отметки игнорируются)."""
+        self.stages.setdefault(stage, time.perf_counter() - self._start)
+
+
+def encode_record(entry: Dict[str, Any]) -> bytes:
+    """Кодирует запись журнала: заголовок и компактный JSON."""
+    payload = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode()
+    stages = entry.get("stages") or {}
+    tokens = [entry.get("prompt_tokens"), entry.get("completion_tokens")]
+    header = RECORD_HEADER.pack(
+        len(payload),
+        zlib.crc32(payload),
+        entry.get("ts", time.time()),
+        *(math.nan if stages.get(stage) is None else stages[stage] for stage in STAGES),
+        *(_NO_TOKENS if t is None else min(int(t), _NO_TOKENS - 1) for t in tokens),
+    )
+    return header + payload
+
+
+class TurnJournal:
+    """Асинхронная пакетная запись ходов в сегменты с ротацией."""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = config.JOURNAL_SEGMENT_MB * 1024 * 1024,
+        max_segments: int = config.JOURNAL_MAX_SEGMENTS,
+        flush_interval_s: float = config.JOURNAL_FLUSH_INTERVAL_S,
+    ):
+        """
+        Args:
+            directory (str): Каталог сегментов.
+            segment_bytes (int): Размер, после которого начинается новый сегмент.
+            max_segments (int): Сколько последних сегментов хранить.
+            flush_interval_s (float): Сколько копить записи перед записью на диск.
+        """
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.flush_interval_s = flush_interval_s
+        self.written = 0
+        self._file = None
+        self._size = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="loki-journal", daemon=True
+        )
+        self._thread.start()
+        logging.info(f"Turn journal: {self.directory}")
+
+    def record(self, entry: Dict[str, Any]):
+        """Ставит запись в очередь; не блокирует и не обращается к диску."""
+        self._queue.put(entry)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval_s
+            while item is not _STOP:
+                batch.append(item)
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            if item is _STOP:
+                break
+        if self._file:
+            self._file.close()
+
+    def _write(self, entries: List[Dict[str, Any]]):
+        try:
+            data = b"".join(encode_record(entry) for entry in entries)
+            if self._file is None or self._size + len(data) > self.segment_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            self.written += len(entries)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Failed to write {len(entries)} journal record(s): {e}")
+
+    def _rotate(self):
+        """Закрывает текущий сегмент, открывает новый и удаляет самые старые."""
+        if self._file:
+            self._file.close()
+        path = os.path.join(
+            self.directory, f"turns-{time.time_ns() // 1_000_000:015d}{SEGMENT_SUFFIX}"
+        )
+        self._file = open(path, "ab")
+        self._file.write(SEGMENT_MAGIC)
+        self._size = len(SEGMENT_MAGIC)
+        for old in list_segments(self.directory)[: -self.max_segments]:
+            try:
+                os.remove(old)
+            except OSError as e:
+                logging.warning(f"Failed to remove journal segment {old}: {e}")
+
+    def close(self):
+        """Дописывает очередь на диск и останавливает поток записи."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+
+def list_segments(directory: str) -> List[str]:
+    """Сегменты журнала в хронологическом порядке."""
+    directory = os.path.expanduser(directory)
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith("turns-") and name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+class JournalEntry(NamedTuple):
+    """Запись, прочитанная из журнала."""
+
+    timestamp: float
+    stages: Dict[str, float]
+    prompt_tokens: Optional[int]
+    completion_tokens: Optional[int]
+    # Полная запись (JSON); None, если чтение шло без payload
+    data: Optional[Dict[str, Any]]
+
+
+class JournalReader:
+    """Чтение сегментов журнала через mmap."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def scan(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        payload: bool = False,
+    ) -> Iterator[JournalEntry]:
+        """
+        Перебирает записи журнала по порядку.
+
+        Args:
+            since (Optional[float]): Пропускать ходы, начавшиеся раньше (время эпохи).
+            until (Optional[float]): Пропускать ходы, начавшиеся позже.
+            payload (bool): Разбирать ли JSON-тело (иначе только заголовки).
+        """
+        for path in list_segments(self.directory):
+            yield from self._scan_segment(path, since, until, payload)
+
+    @staticmethod
+    def _scan_segment(path, since, until, payload) -> Iterator[JournalEntry]:
+        with open(path, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return  # Пустой файл: сегмент только что создан
+        with mm:
+            if mm[: len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                logging.warning(f"Skipping {path}: not a journal segment.")
+                return
+            offset = len(SEGMENT_MAGIC)
+            while offset + RECORD_HEADER.size <= len(mm):
+                length, crc, ts, *rest = RECORD_HEADER.unpack_from(mm, offset)
+                body = offset + RECORD_HEADER.size
+                if body + length > len(mm):
+                    break  # Запись обрезана (сегмент дописывается или сбой)
+                offset = body + length
+                if (since is not None and ts < since) or (
+                    until is not None and ts > until
+                ):
+                    continue
+                data = None
+                if payload:
+                    raw = mm[body : body + length]
+                    if zlib.crc32(raw) != crc:
+                        logging.warning(f"Corrupted journal record in {path}.")
+                        continue
+                    data = json.loads(raw)
+                stages = {
+                    stage: value
+                    for stage, value in zip(STAGES, rest[: len(STAGES)])
+                    if not math.isnan(value)
+                }
+                prompt, completion = (
+                    None if t == _NO_TOKENS else t for t in rest[len(STAGES) :]
+                )
+                yield JournalEntry(ts, stages, prompt, completion, data)
+
+
+def aggregate_by_hour(
+    entries: Iterable[JournalEntry], stage: str = "total_s"
+) -> Dict[str, Dict[str, float]]:
+    """
+    Перцентили длительности этапа по часам (местное время).
+
+    Returns:
+        Dict[str, Dict[str, float]]: "ГГГГ-ММ-ДД ЧЧ:00" -> count, p50, p90, p99.
+    """
+    hours: Dict[str, List[float]] = {}
+    for entry in entries:
+        value = entry.stages.get(stage)
+        if value is not None:
+            hour = time.strftime("%Y-%m-%d %H:00", time.localtime(entry.timestamp))
+            hours.setdefault(hour, []).append(value)
+    return {
+        hour: {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+        }
+        for hour, values in sorted(hours.items())
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    """Печатает перцентили этапа по часам за последние N часов."""
+    parser = argparse.ArgumentParser(description="Summarize the LOKI turn journal.")
+    parser.add_argument("directory", help="Каталог журнала (LOKI_JOURNAL_DIR)")
+    parser.add_argument("--stage", default="total_s", choices=STAGES)
+    parser.add_argument("--hours", type=float, default=24.0)
+    args = parser.parse_args(argv)
+
+    since = time.time() - args.hours * 3600
+    rows = aggregate_by_hour(JournalReader(args.directory).scan(since), args.stage)
+    print(f"{'hour':<16}  {'count':>5}  {'p50':>7}  {'p90':>7}  {'p99':>7}")
+    for hour, row in rows.items():
+        print(
+            f"{hour:<16}  {row['count']:>5}  {row['p50']:>7.3f}  "
+            f"{row['p90']:>7.3f}  {row['p99']:>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
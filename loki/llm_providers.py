@@ -1,23 +1,133 @@
 # loki/llm_providers.py
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator, Dict, Any
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Callable, Dict, Any, List, Optional
+import asyncio
+import datetime
 import httpx
 import logging
 import os
 import json
+import time
 import google.generativeai as genai
 
+from loki import config
+from loki.command_parser import CommandEndDetector
+from loki.metrics import METRICS
+from loki.prompts import TOOL_CALL_SCHEMA
+from loki.utils import env_flag
+
+
+@dataclass
+class GenerationOptions:
+    """
+    Параметры генерации для одного запроса к LLM.
+
+    Attributes:
+        max_tokens: Максимальное число генерируемых токенов (None — по умолчанию
+            провайдера).
+        stop: Стоп-последовательности; сами они в ответ не попадают.
+        json_schema: JSON-схема, которой ограничивается вывод модели.
+        stop_on_command_end: Прекратить генерацию сразу после первого [/CMD].
+    """
+
+    max_tokens: Optional[int] = None
+    stop: List[str] = field(default_factory=list)
+    json_schema: Optional[Dict[str, Any]] = None
+    stop_on_command_end: bool = False
+
+
+def default_generation_options() -> GenerationOptions:
+    """
+    Собирает параметры генерации для голосовых команд из переменных окружения.
+
+    LOKI_LLM_MAX_TOKENS задает лимит токенов (без нее действует лимит,
+    настроенный у провайдера, например GOOGLE_MAX_TOKENS), LOKI_LLM_JSON_MODE
+    включает структурированный вывод по `prompts.TOOL_CALL_SCHEMA`.
+    """
+    json_mode = env_flag("LOKI_LLM_JSON_MODE")
+    max_tokens = os.getenv("LOKI_LLM_MAX_TOKENS")
+    return GenerationOptions(
+        max_tokens=int(max_tokens) if max_tokens else None,
+        json_schema=TOOL_CALL_SCHEMA if json_mode else None,
+        stop_on_command_end=not json_mode,
+    )
+
+
+# Получатель статистики одного запроса: словарь с prompt_tokens,
+# completion_tokens, stopped_early, first_token_s, cached_tokens
+# (или с error, если запрос завершился ошибкой)
+UsageCallback = Callable[[Dict[str, Any]], None]
+
 
 class LLMProvider(ABC):
     """Абстрактный базовый класс для всех провайдеров языковых моделей."""
 
     @abstractmethod
     async def stream_response(
-        self, user_prompt: str, system_prompt: str
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        options: Optional[GenerationOptions] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        on_usage: Optional[UsageCallback] = None,
     ) -> AsyncGenerator[str, None]:
-        """Отправляет запрос к LLM и асинхронно возвращает ответ в виде потока токенов."""
+        """
+        Отправляет запрос к LLM и асинхронно возвращает ответ в виде потока токенов.
+
+        `history` — предыдущие сообщения разговора
+        (`{"role": "user" | "assistant", "content": ...}`, см. loki/conversation.py).
+        `on_usage` получает статистику именно этого запроса по его завершении:
+        на одном провайдере одновременно может идти несколько запросов.
+        """
         pass
 
+    @staticmethod
+    def _report_error(error: Exception, on_usage: Optional[UsageCallback]):
+        """Сообщает получателю статистики об ошибке запроса."""
+        METRICS.increment("llm.errors")
+        if on_usage:
+            on_usage({"error": str(error)})
+
+    def _record_usage(
+        self,
+        prompt_tokens: Optional[int],
+        completion_tokens: Optional[int],
+        stopped_early: bool,
+        first_token_s: Optional[float] = None,
+        cached_tokens: Optional[int] = None,
+        on_usage: Optional[UsageCallback] = None,
+    ):
+        """Передает статистику запроса получателю и публикует ее в реестре метрик."""
+        if on_usage:
+            on_usage(
+                {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "stopped_early": stopped_early,
+                    "first_token_s": first_token_s,
+                    "cached_tokens": cached_tokens,
+                }
+            )
+        if prompt_tokens is not None:
+            METRICS.observe("llm.prompt_tokens", prompt_tokens)
+        if cached_tokens is not None:
+            METRICS.observe("llm.cached_prompt_tokens", cached_tokens)
+        if first_token_s is not None:
+            METRICS.observe("llm.first_token_s", first_token_s)
+        if completion_tokens is not None:
+            METRICS.observe("llm.completion_tokens", completion_tokens)
+            METRICS.increment("llm.completion_tokens_total", completion_tokens)
+        if stopped_early:
+            METRICS.increment("llm.early_stops")
+        first_token = "n/a" if first_token_s is None else f"{first_token_s:.2f} s"
+        logging.info(
+            f"LLM usage: prompt={prompt_tokens} tokens (cached: {cached_tokens}), "
+            f"completion={completion_tokens} tokens, first token: {first_token}, "
+            f"stopped early: {stopped_early}"
+        )
+
     def close(self):
         """Закрывает соединения, если это необходимо. Может быть переопределен."""
         pass
@@ -37,37 +147,111 @@ class OllamaProvider(LLMProvider):
             f"Ollama Provider initialized with model: {self.model} at {self.base_url}"
         )
 
+    @staticmethod
+    def _build_payload(
+        user_prompt: str,
+        system_prompt: str,
+        options: GenerationOptions,
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Формирует тело запроса с учетом параметров генерации.
+
+        Без истории используется /api/generate, с историей — /api/chat
+        (тело с полем "messages").
+        """
+        if history:
+            payload = {
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    *history,
+                    {"role": "user", "content": user_prompt},
+                ],
+                "stream": True,
+            }
+        else:
+            payload = {
+                "system": system_prompt,
+                "prompt": user_prompt,
+                "stream": True,
+            }
+        model_options = {}
+        if options.max_tokens is not None:
+            model_options["num_predict"] = options.max_tokens
+        if options.stop:
+            model_options["stop"] = list(options.stop)
+        if model_options:
+            payload["options"] = model_options
+        if options.json_schema is not None:
+            payload["format"] = options.json_schema
+        return payload
+
     async def stream_response(
-        self, user_prompt: str, system_prompt: str
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        options: Optional[GenerationOptions] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        on_usage: Optional[UsageCallback] = None,
     ) -> AsyncGenerator[str, None]:
         """
         Отправляет запрос к LLM и асинхронно возвращает ответ в виде потока токенов.
+
+        При `stop_on_command_end` поток закрывается сразу после первого [/CMD]:
+        закрытие HTTP-соединения прерывает генерацию на стороне Ollama.
         """
+        options = options or GenerationOptions()
+        detector = CommandEndDetector() if options.stop_on_command_end else None
+        prompt_tokens = None
+        completion_tokens = 0
+        first_token_s = None
+        start = time.perf_counter()
+        payload = self._build_payload(user_prompt, system_prompt, options, history)
+        endpoint = "chat" if "messages" in payload else "generate"
         try:
             async with self.async_client.stream(
                 "POST",
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "system": system_prompt,
-                    "prompt": user_prompt,
-                    "stream": True,
-                },
+                f"{self.base_url}/api/{endpoint}",
+                json={"model": self.model, **payload},
             ) as response:
                 response.raise_for_status()
                 async for line in response.aiter_lines():
                     if line:
                         try:
                             data = json.loads(line)
-                            token = data.get("response", "")
+                            # /api/generate отдает "response", /api/chat — "message"
+                            token = data.get("response") or data.get("message", {}).get(
+                                "content", ""
+                            )
                             if token:
-                                yield token
+                                # В потоке Ollama один чанк соответствует одному токену
+                                completion_tokens += 1
+                                if first_token_s is None:
+                                    first_token_s = time.perf_counter() - start
+                                if detector:
+                                    token = detector.feed(token)
+                                if token:
+                                    yield token
                             if data.get("done"):
+                                prompt_tokens = data.get("prompt_eval_count")
+                                completion_tokens = data.get(
+                                    "eval_count", completion_tokens
+                                )
+                                break
+                            if detector and detector.done:
                                 break
                         except json.JSONDecodeError:
                             pass
+            self._record_usage(
+                prompt_tokens,
+                completion_tokens,
+                bool(detector and detector.done),
+                first_token_s=first_token_s,
+                on_usage=on_usage,
+            )
         except Exception as e:
             logging.error(f"LLM stream error: {e}")
+            self._report_error(e, on_usage)
             yield "Произошла ошибка при работе с локальным сервисом."
 
     def close(self):
@@ -120,32 +304,180 @@ class GoogleAIProvider(LLMProvider):
             "max_output_tokens": max_output_tokens,
         }
 
-        # 4. Инициализируем модель с именем, загруженным из .env
-        self.model = genai.GenerativeModel(self.model_name)
+        # 4. Модели создаются по одной на системный промпт: он задается через
+        # system_instruction один раз, а не пересылается в тексте каждого запроса.
+        # Хранятся последние GOOGLE_MODEL_CACHE_SIZE промптов (LRU).
+        self.model_cache_size = int(
+            os.getenv("GOOGLE_MODEL_CACHE_SIZE", config.GOOGLE_MODEL_CACHE_SIZE)
+        )
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+
+        # 5. Кэширование контекста: статический префикс (системный промпт)
+        # хранится на стороне API и не обрабатывается заново в каждом запросе.
+        self.use_context_cache = env_flag("GOOGLE_CONTEXT_CACHE")
+        self.context_cache_ttl_s = int(os.getenv("GOOGLE_CONTEXT_CACHE_TTL_S", 3600))
+        self.context_cache_retry_s = float(
+            os.getenv(
+                "GOOGLE_CONTEXT_CACHE_RETRY_S", config.GOOGLE_CONTEXT_CACHE_RETRY_S
+            )
+        )
+        # До этого момента после ошибки кэш не создается (monotonic)
+        self._cache_retry_at = 0.0
+        # system_prompt -> (кэш, модель поверх кэша, момент обновления), LRU
+        self._caches: "OrderedDict[str, Any]" = OrderedDict()
 
         logging.info(f"Google AI Provider initialized with model: {self.model_name}")
         logging.info(f"Generation config: {self.generation_config}")
+        logging.info(f"Context caching: {self.use_context_cache}")
+
+    async def _model_for(self, system_prompt: str):
+        """
+        Возвращает модель для системного промпта.
+
+        При включенном кэшировании используется модель поверх кэшированного
+        контекста; если API его не поддерживает (например, промпт короче
+        минимального размера кэша), используется system_instruction.
+        """
+        if self.use_context_cache:
+            model = await self._cached_model_for(system_prompt)
+            if model is not None:
+                return model
+        model = self._models.get(system_prompt)
+        if model is None:
+            model = genai.GenerativeModel(
+                self.model_name, system_instruction=system_prompt
+            )
+            self._models[system_prompt] = model
+            while len(self._models) > self.model_cache_size:
+                self._models.popitem(last=False)
+        self._models.move_to_end(system_prompt)
+        return model
+
+    async def _cached_model_for(self, system_prompt: str):
+        """
+        Создает (или обновляет по истечении TTL) кэш контекста для промпта.
+
+        Замененный и вытесненный кэши удаляются на стороне API. После ошибки
+        создания кэш не запрашивается GOOGLE_CONTEXT_CACHE_RETRY_S секунд,
+        запросы в это время идут через system_instruction.
+        """
+        now = time.monotonic()
+        entry = self._caches.get(system_prompt)
+        if entry and entry[2] > now:
+            self._caches.move_to_end(system_prompt)
+            return entry[1]
+        if now < self._cache_retry_at:
+            return None
+        try:
+            # Создание кэша — синхронный сетевой вызов, не блокируем event loop
+            cache = await asyncio.to_thread(
+                genai.caching.CachedContent.create,
+                model=self.model_name,
+                system_instruction=system_prompt,
+                ttl=datetime.timedelta(seconds=self.context_cache_ttl_s),
+            )
+        except Exception as e:
+            logging.warning(
+                f"Context caching is unavailable, using system instruction for "
+                f"{self.context_cache_retry_s:.0f} s: {e}"
+            )
+            self._cache_retry_at = now + self.context_cache_retry_s
+            return None
+        model = genai.GenerativeModel.from_cached_content(cache)
+        # Обновляем кэш немного раньше, чем он истечет на стороне API
+        refresh_at = time.monotonic() + self.context_cache_ttl_s * 0.9
+        stale = [entry[0]] if entry else []
+        self._caches[system_prompt] = (cache, model, refresh_at)
+        self._caches.move_to_end(system_prompt)
+        while len(self._caches) > self.model_cache_size:
+            stale.append(self._caches.popitem(last=False)[1][0])
+        logging.info(f"Created context cache {cache.name} for the system prompt.")
+        for old in stale:
+            # Удаление — тоже синхронный сетевой вызов
+            await asyncio.to_thread(self._delete_cache, old)
+        return model
+
+    @staticmethod
+    def _delete_cache(cache):
+        """Удаляет кэш контекста на стороне API, чтобы не платить за хранение."""
+        try:
+            cache.delete()
+        except Exception as e:
+            logging.warning(f"Failed to delete context cache {cache.name}: {e}")
+
+    def _request_config(self, options: GenerationOptions) -> Dict[str, Any]:
+        """Дополняет базовую конфигурацию генерации параметрами запроса."""
+        generation_config = dict(self.generation_config)
+        if options.max_tokens is not None:
+            generation_config["max_output_tokens"] = options.max_tokens
+        if options.stop:
+            generation_config["stop_sequences"] = list(options.stop)
+        if options.json_schema is not None:
+            generation_config["response_mime_type"] = "application/json"
+            generation_config["response_schema"] = options.json_schema
+        return generation_config
 
     async def stream_response(
-        self, user_prompt: str, system_prompt: str
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        options: Optional[GenerationOptions] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        on_usage: Optional[UsageCallback] = None,
     ) -> AsyncGenerator[str, None]:
         """Отправляет запрос к Gemini API и возвращает потоковый ответ."""
+        options = options or GenerationOptions()
+        detector = CommandEndDetector() if options.stop_on_command_end else None
+        usage = None
+        first_token_s = None
+        start = time.perf_counter()
         try:
-            # Для Gemini системный промпт лучше передавать отдельно, если API это поддерживает,
-            # но для универсальности объединяем его с пользовательским.
-            full_prompt = f"{system_prompt}\n\n---ЗАПРОС ПОЛЬЗОВАТЕЛЯ---\n{user_prompt}"
-
-            # Передаем заранее собранную конфигурацию в каждый запрос
-            response = await self.model.generate_content_async(
-                full_prompt, stream=True, generation_config=self.generation_config
+            model = await self._model_for(system_prompt)
+            # Системный промпт уже задан в модели, отправляются история и запрос
+            contents = user_prompt
+            if history:
+                contents = [
+                    {
+                        "role": "model" if m["role"] == "assistant" else "user",
+                        "parts": [m["content"]],
+                    }
+                    for m in history
+                ] + [{"role": "user", "parts": [user_prompt]}]
+            response = await model.generate_content_async(
+                contents,
+                stream=True,
+                generation_config=self._request_config(options),
             )
             async for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = chunk.text
+                if first_token_s is None:
+                    first_token_s = time.perf_counter() - start
+                if detector:
+                    text = detector.feed(text)
+                if text:
+                    yield text
+                if detector and detector.done:
+                    break
+            self._record_usage(
+                getattr(usage, "prompt_token_count", None),
+                getattr(usage, "candidates_token_count", None),
+                bool(detector and detector.done),
+                first_token_s=first_token_s,
+                cached_tokens=getattr(usage, "cached_content_token_count", None),
+                on_usage=on_usage,
+            )
         except Exception as e:
             logging.error(f"Ошибка при работе с Google AI API: {e}")
+            self._report_error(e, on_usage)
             yield "Произошла ошибка при обращении к облачному сервису."
 
+    def close(self):
+        """Удаляет созданные кэши контекста, чтобы не платить за их хранение."""
+        for cache, _, _ in self._caches.values():
+            self._delete_cache(cache)
+        self._caches.clear()
+
 
 def get_llm_provider() -> LLMProvider:
     """
@@ -13,6 +13,7 @@
 import sys
 import os
 import re
+import time
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import logging
@@ -20,6 +21,7 @@ import struct
 import pvporcupine
 import pyaudio
 import asyncio
+import numpy as np
 from dotenv import load_dotenv
 import sounddevice as sd
 
@@ -27,19 +29,68 @@ import sounddevice as sd
 load_dotenv()
 
 # Импорт локальных модулей проекта
-from loki.audio_handler import record_command_vad
-from loki.stt_handler import WhisperSTT
+from loki import config
+from loki.audio_handler import detect_capture_rate, record_command_vad
+from loki.capture_monitor import CaptureMonitor
+from loki.conversation import ConversationMemory, estimate_tokens
+from loki.cpu_budget import CpuBudget
+from loki.earcons import EarconPlayer
+from loki.stt_handler import get_stt_engine
 from loki.tts_handler import Piper_Engine
-from loki.llm_providers import get_llm_provider
-from loki.command_parser import parse_llm_response
+from loki.llm_providers import (
+    GenerationOptions,
+    default_generation_options,
+    get_llm_provider,
+)
+from loki.command_parser import parse_llm_response, parse_structured_response
 from loki.visual_controller import handle_visual_command
-from loki.prompts import UNIFIED_PROMPT
+from loki.prompts import STRUCTURED_OUTPUT_PROMPT, UNIFIED_PROMPT
+from loki.prompt_selector import PromptSelector
+from loki.journal import TurnJournal, TurnTimer
+from loki.loop_monitor import LoopLagMonitor
+from loki.metrics import METRICS
+from loki.resampler import FrameResampler, device_frames
+from loki.resources import ResourceManager
+from loki.speculation import (
+    PartialTranscriber,
+    SpeculationStats,
+    SpeculativeRequest,
+)
+from loki.turn_profiler import PROFILER
+from loki.utils import env_flag
 
 # Конфигурация на основе переменных окружения
 LOG_LEVEL = os.getenv("LOKI_LOG_LEVEL", "INFO").upper()
 PICOVOICE_ACCESS_KEY = os.getenv("PICOVOICE_ACCESS_KEY")
 WAKE_WORD = os.getenv("LOKI_WAKE_WORD", "jarvis")
 PIPER_VOICE_PATH = os.getenv("LOKI_PIPER_VOICE_PATH")
+# Быстрый путь Whisper для коротких команд (см. WhisperSTT, command_mode)
+STT_COMMAND_MODE = env_flag("LOKI_STT_COMMAND_MODE")
+# Профиль декодирования Whisper (см. config.WHISPER_DECODING_PROFILES)
+STT_PROFILE = os.getenv("LOKI_STT_PROFILE", config.DEFAULT_WHISPER_PROFILE)
+# Спекулятивный запрос к LLM по частичному транскрипту (см. loki/speculation.py)
+LLM_SPECULATIVE = env_flag("LOKI_LLM_SPECULATIVE")
+# Сборка промпта только из нужных запросу инструментов и примеров (см. loki/prompt_selector.py)
+DYNAMIC_PROMPT = env_flag("LOKI_DYNAMIC_PROMPT")
+# История разговора для уточняющих вопросов (см. loki/conversation.py)
+CONVERSATION_ENABLED = env_flag("LOKI_CONVERSATION")
+CONVERSATION_TOKENS = int(
+    os.getenv("LOKI_CONVERSATION_TOKENS", config.CONVERSATION_TOKEN_BUDGET)
+)
+# Выгрузка простаивающих Whisper и Piper (см. loki/resources.py)
+IDLE_UNLOAD_S = float(os.getenv("LOKI_IDLE_UNLOAD_S", config.RESOURCE_IDLE_UNLOAD_S))
+RSS_BUDGET_MB = float(os.getenv("LOKI_RSS_BUDGET_MB", config.RESOURCE_RSS_BUDGET_MB))
+# Звуковые подтверждения на wake word и конце фразы (см. loki/earcons.py)
+EARCONS_ENABLED = env_flag("LOKI_EARCONS")
+# Монитор блокировок event loop (см. loki/loop_monitor.py)
+LOOP_MONITOR_ENABLED = env_flag("LOKI_LOOP_MONITOR")
+# Профилирование первых N ходов и порт управления профайлером (см. loki/turn_profiler.py)
+PROFILE_TURNS = int(os.getenv("LOKI_PROFILE_TURNS", 0))
+PROFILE_PORT = int(os.getenv("LOKI_PROFILE_PORT", 0))
+# Период записи сводки метрик в лог (см. loki/metrics.py)
+METRICS_LOG_S = float(os.getenv("LOKI_METRICS_LOG_S", config.METRICS_LOG_INTERVAL_S))
+# Каталог журнала ходов; журнал ведется, только если он задан (см. loki/journal.py)
+JOURNAL_DIR = os.getenv("LOKI_JOURNAL_DIR")
 
 # Настройка логирования
 logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -56,15 +107,77 @@ class LokiOrchestrator:
 
     def __init__(self):
         """Инициализирует экземпляры всех необходимых сервисов."""
-        self.stt_engine = WhisperSTT(model_name="base")
-        self.tts_engine = Piper_Engine(model_path=PIPER_VOICE_PATH)
+        # Потоки CPU распределяются между движками заранее: у каждого свой
+        # именованный пул, поток wake word не делит пул с STT и TTS.
+        self.cpu = CpuBudget()
+        self.cpu.log_summary()
+        self.cpu.configure_torch("stt")
+        # Тяжелые движки STT и TTS живут в менеджере ресурсов: при простое или
+        # нехватке памяти они выгружаются и загружаются снова по требованию.
+        self.resources = ResourceManager(
+            idle_timeout_s=IDLE_UNLOAD_S, rss_budget_mb=RSS_BUDGET_MB
+        )
+        self.resources.register(
+            "stt",
+            lambda: get_stt_engine(
+                model_name="base", command_mode=STT_COMMAND_MODE, profile=STT_PROFILE
+            ),
+        )
+        # Сессия onnxruntime создается в потоке пула TTS: ее потоки наследуют
+        # привязку к ядрам из бюджета.
+        self.resources.register(
+            "tts",
+            lambda: self.cpu.executor("tts")
+            .submit(
+                Piper_Engine,
+                model_path=PIPER_VOICE_PATH,
+                intra_op_threads=self.cpu.threads("tts"),
+                synthesis_workers=self.cpu.get("tts").workers,
+                executor=self.cpu.executor("tts"),
+            )
+            .result(),
+        )
+        self.resources_task = None
+        self.metrics_task = None
+        # Звуки подтверждения готовятся заранее, пока модель Piper загружена
+        self.earcons = None
+        if EARCONS_ENABLED:
+            self.earcons = EarconPlayer.from_config(self.resources.get("tts"))
+        # Момент окончания речи в текущей команде и был ли уже первый звук после него
+        self.speech_ended_at = None
+        self.first_sound_played = False
         self.llm_provider = get_llm_provider()
+        # Лимит токенов, ранняя остановка на [/CMD] или вывод по JSON-схеме
+        self.generation_options = default_generation_options()
+        self.structured_output = self.generation_options.json_schema is not None
+        self.system_prompt = UNIFIED_PROMPT
+        if self.structured_output:
+            self.system_prompt += STRUCTURED_OUTPUT_PROMPT
+        self.prompt_selector = PromptSelector() if DYNAMIC_PROMPT else None
+        self.conversation = (
+            ConversationMemory(token_budget=CONVERSATION_TOKENS)
+            if CONVERSATION_ENABLED
+            else None
+        )
+        self.journal = TurnJournal(JOURNAL_DIR) if JOURNAL_DIR else None
+        # Отметки этапов текущего хода
+        self.turn_timer = None
+        # Спекулятивный запрос по частичному транскрипту и задача, которая его готовит
+        self.speculation = None
+        self.speculation_task = None
+        self.speculation_stats = SpeculationStats()
+        # Частичные фразы распознаются в том же пуле "stt", что и финальная
+        self.partial_stt = PartialTranscriber(self.cpu.executor("stt"))
         self.porcupine = None
         self.pa = None
         self.audio_stream = None
+        self.capture_monitor = None
+        self.capture_rate = config.AUDIO_RATE
+        self.wake_reader = None
         # Событие для прерывания длительных операций (например, TTS) при активации wake word
         self.interrupt_event = asyncio.Event()
         self.current_command_task = None
+        self.loop_monitor = LoopLagMonitor() if LOOP_MONITOR_ENABLED else None
 
     async def initialize_resources_async(self):
         """
@@ -72,6 +185,8 @@ class LokiOrchestrator:
         Эти операции могут быть блокирующими, поэтому выполняются асинхронно.
         Также запускает фоновую задачу для "разогрева" LLM.
         """
+        # Все прочие run_in_executor(None, ...) идут в ограниченный пул "io"
+        asyncio.get_running_loop().set_default_executor(self.cpu.executor("io"))
         if not PICOVOICE_ACCESS_KEY:
             raise ValueError("PICOVOICE_ACCESS_KEY не найден.")
         if not PIPER_VOICE_PATH or not os.path.exists(PIPER_VOICE_PATH):
@@ -92,16 +207,23 @@ class LokiOrchestrator:
                 keyword_paths=keyword_paths,
             )
             self.pa = pyaudio.PyAudio()
+            # Захват на родной частоте микрофона, Porcupine получает кадры 16 кГц
+            self.capture_rate = detect_capture_rate(self.pa)
+            wake_frames = device_frames(
+                self.porcupine.frame_length,
+                self.capture_rate,
+                self.porcupine.sample_rate,
+            )
 
             # Попытка открыть аудиопоток с повторами в случае ошибки
             while True:
                 try:
                     self.audio_stream = self.pa.open(
-                        rate=self.porcupine.sample_rate,
+                        rate=self.capture_rate,
                         channels=1,
                         format=pyaudio.paInt16,
                         input=True,
-                        frames_per_buffer=self.porcupine.frame_length,
+                        frames_per_buffer=wake_frames,
                     )
                     break
                 except IOError:
@@ -110,8 +232,34 @@ class LokiOrchestrator:
                     )
                     await asyncio.sleep(5)
 
+            if self.earcons:
+                self.earcons.open()
+            if self.loop_monitor:
+                self.loop_monitor.start()
+            PROFILER.install_signal_handler(asyncio.get_running_loop())
+            if PROFILE_PORT:
+                await PROFILER.start_control_server(PROFILE_PORT)
+            if PROFILE_TURNS:
+                PROFILER.arm(PROFILE_TURNS)
+            self.capture_monitor = CaptureMonitor(
+                "wake_word", self.capture_rate, wake_frames
+            )
+            self.wake_reader = FrameResampler(
+                lambda: self.capture_monitor.read(self.audio_stream),
+                self.capture_rate,
+                self.porcupine.sample_rate,
+                self.porcupine.frame_length,
+            )
             logging.info("LOKI initialized.")
 
+            if IDLE_UNLOAD_S > 0 or RSS_BUDGET_MB > 0:
+                self.resources_task = asyncio.create_task(
+                    self.resources.watch(config.RESOURCE_CHECK_INTERVAL_S)
+                )
+
+            if METRICS_LOG_S > 0:
+                self.metrics_task = asyncio.create_task(METRICS.report(METRICS_LOG_S))
+
             # Запускаем "разогрев" LLM в фоновой задаче, не блокируя старт
             logging.info("Warming up LLM engine...")
             asyncio.create_task(self._warm_up_llm())
@@ -130,7 +278,10 @@ class LokiOrchestrator:
             # Мы полностью "прочитываем" потоковый ответ, чтобы убедиться,
             # что генерация действительно произошла, но игнорируем сами токены.
             async for _ in self.llm_provider.stream_response(
-                "Привет", system_prompt=UNIFIED_PROMPT
+                "Привет",
+                # Тот же промпт, что в ходах: прогревается и кэш контекста
+                system_prompt=self.system_prompt,
+                options=GenerationOptions(max_tokens=1),
             ):
                 pass
             logging.info("LLM engine is warm and ready.")
@@ -141,17 +292,19 @@ class LokiOrchestrator:
         """Асинхронная обертка для блокирующего метода прослушивания."""
         loop = asyncio.get_running_loop()
         # Запускаем блокирующий код в отдельном потоке, чтобы не заморозить event loop
-        await loop.run_in_executor(None, self._blocking_listen)
+        await loop.run_in_executor(self.cpu.executor("audio"), self._blocking_listen)
 
     def _blocking_listen(self):
         """
         Блокирующий метод, который непрерывно слушает аудиопоток в поиске wake word.
         Работает в отдельном потоке.
         """
+        # Пока записывалась и обрабатывалась команда, поток не читался:
+        # накопившееся переполнение не считается потерями
+        self.capture_monitor.reset()
+        self.wake_reader.reset()
         while True:
-            pcm = self.audio_stream.read(
-                self.porcupine.frame_length, exception_on_overflow=False
-            )
+            pcm = self.wake_reader.read()
             pcm = struct.unpack_from("h" * self.porcupine.frame_length, pcm)
             # porcupine.process возвращает индекс ключевого слова (0 в нашем случае), если оно найдено
             if self.porcupine.process(pcm) >= 0:
@@ -178,12 +331,50 @@ class LokiOrchestrator:
                         pass  # Ожидаемое исключение при отмене
 
                 self.interrupt_event.clear()  # Сбрасываем событие прерывания
+                if self.earcons:
+                    self.earcons.trigger("wake")
+
+                # Если движки были выгружены, загружаем их, пока пользователь говорит
+                asyncio.create_task(self.resources.prefetch("stt"))
+                asyncio.create_task(self.resources.prefetch("tts"))
 
                 # 2. Переключаемся в режим прослушивания и записываем команду
                 handle_visual_command(
                     {"tool_name": "set_status", "parameters": {"status": "listening"}}
                 )
-                command_audio_path = record_command_vad()
+                self._cancel_speculation()
+                if self.conversation:
+                    # Фоновое сжатие истории не должно занимать LLM во время нового хода
+                    self.conversation.cancel_compaction()
+                # Запись идет в отдельном потоке, чтобы event loop мог параллельно
+                # обрабатывать частичные фразы для спекулятивного запроса.
+                loop = asyncio.get_running_loop()
+                on_pause = None
+                if LLM_SPECULATIVE:
+                    self.partial_stt.start()
+                    on_pause = lambda audio: loop.call_soon_threadsafe(
+                        self._start_speculation, audio
+                    )
+                try:
+                    command_audio_path = await loop.run_in_executor(
+                        self.cpu.executor("audio"),
+                        record_command_vad,
+                        on_pause,
+                        self.capture_rate,
+                    )
+                finally:
+                    # Финальное распознавание не должно ждать частичных в очереди
+                    self.partial_stt.stop()
+                # Запись заканчивается после VAD_SILENCE_PADDING_CHUNKS тихих чанков,
+                # поэтому речь закончилась на это время раньше
+                self.speech_ended_at = time.perf_counter() - (
+                    (config.VAD_SILENCE_PADDING_CHUNKS + 1)
+                    * config.CHUNK_DURATION_MS
+                    / 1000
+                )
+                self.first_sound_played = False
+                if self.earcons:
+                    self.earcons.trigger("endpoint", on_start=self._mark_first_sound)
 
                 # 3. Создаем асинхронную задачу для обработки записанной команды
                 self.current_command_task = asyncio.create_task(
@@ -197,6 +388,128 @@ class LokiOrchestrator:
                 logging.error(f"Критическая ошибка в основном цикле: {e}")
                 await asyncio.sleep(1)
 
+    def _start_speculation(self, pcm: bytes):
+        """Запускает подготовку спекулятивного запроса по частичной фразе."""
+        if self.speculation_task and not self.speculation_task.done():
+            self.speculation_task.cancel()
+        self.speculation_task = asyncio.create_task(self._speculate(pcm))
+
+    async def _speculate(self, pcm: bytes):
+        """
+        Распознает частичную фразу и, если она изменилась, отправляет ее в LLM.
+
+        Если частичный транскрипт совпадает с уже отправленным, текущий
+        спекулятивный запрос продолжает работать.
+        """
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        try:
+            async with self.resources.use_async("stt") as stt_engine:
+                transcript = await self.partial_stt.transcribe(
+                    stt_engine.transcribe_audio, audio
+                )
+        except Exception as e:
+            logging.warning(f"Partial transcription failed: {e}")
+            return
+        if not transcript:
+            return
+        if self.speculation and self.speculation.matches(transcript):
+            return
+        if self.speculation:
+            self.speculation.cancel()
+        logging.info(f"Starting speculative LLM request for: '{transcript}'")
+        self.speculation = SpeculativeRequest(
+            self.llm_provider,
+            transcript,
+            self._system_prompt_for(transcript),
+            self.generation_options,
+            history=self._history(),
+        )
+
+    def _cancel_speculation(self):
+        """Отменяет подготовку и выполнение спекулятивного запроса."""
+        if self.speculation_task and not self.speculation_task.done():
+            self.speculation_task.cancel()
+        self.speculation_task = None
+        if self.speculation:
+            self.speculation.cancel()
+            self.speculation = None
+
+    def _system_prompt_for(self, transcript: str) -> str:
+        """Системный промпт для транскрипта: статический или собранный под запрос."""
+        if self.prompt_selector is None:
+            return self.system_prompt
+        prompt = self.prompt_selector.build(transcript)
+        if self.structured_output:
+            prompt += STRUCTURED_OUTPUT_PROMPT
+        METRICS.observe("llm.system_prompt_chars", len(prompt))
+        return prompt
+
+    def _history(self):
+        """История разговора для запроса или None, если память выключена."""
+        return self.conversation.messages() if self.conversation else None
+
+    def _report_prompt_size(self, system_prompt: str, history, user_prompt: str):
+        """Пишет в лог и метрики оценку размера промпта хода по частям."""
+        history_tokens = sum(estimate_tokens(m["content"]) for m in history or ())
+        system_tokens = estimate_tokens(system_prompt)
+        user_tokens = estimate_tokens(user_prompt)
+        METRICS.observe("llm.history_tokens_estimate", history_tokens)
+        METRICS.observe(
+            "llm.prompt_tokens_estimate", system_tokens + history_tokens + user_tokens
+        )
+        logging.info(
+            f"Prompt size (estimate): system ~{system_tokens}, "
+            f"history ~{history_tokens} ({len(history or ())} messages), "
+            f"user ~{user_tokens} tokens."
+        )
+
+    def _response_stream(self, user_command_text: str):
+        """
+        Возвращает поток ответа LLM для финального транскрипта.
+
+        Использует спекулятивный запрос, если его транскрипт совпал с финальным,
+        иначе отменяет его и отправляет новый запрос.
+
+        Returns:
+            Поток токенов и словарь статистики запроса, который заполняется
+            к концу потока.
+        """
+        system_prompt = self._system_prompt_for(user_command_text)
+        history = self._history()
+        self._report_prompt_size(system_prompt, history, user_command_text)
+        speculation = self.speculation
+        self.speculation = None
+        if self.speculation_task and not self.speculation_task.done():
+            # Частичная фраза еще распознается: ждать ее уже бессмысленно
+            self.speculation_task.cancel()
+        if speculation:
+            if speculation.matches(user_command_text):
+                self.speculation_stats.record_hit(speculation)
+                return speculation.stream(), speculation.usage
+            speculation.cancel()
+            self.speculation_stats.record_miss(speculation, user_command_text)
+        usage = {}
+        stream = self.llm_provider.stream_response(
+            user_command_text,
+            system_prompt=system_prompt,
+            options=self.generation_options,
+            history=history,
+            on_usage=usage.update,
+        )
+        return stream, usage
+
+    def _mark_first_sound(self, source: str = "earcon"):
+        """Фиксирует время от конца речи до первого звука в ответ."""
+        if self.speech_ended_at is None:
+            return
+        elapsed = time.perf_counter() - self.speech_ended_at
+        if source == "response":
+            METRICS.observe("latency.speech_end_to_response_s", elapsed)
+        if not self.first_sound_played:
+            self.first_sound_played = True
+            METRICS.observe("latency.speech_end_to_first_sound_s", elapsed)
+            logging.info(f"First sound ({source}) {elapsed:.2f} s after end of speech.")
+
     async def _speak_text(self, text: str):
         """
         Озвучивает переданный текст с помощью TTS движка.
@@ -204,19 +517,36 @@ class LokiOrchestrator:
         Args:
             text (str): Текст для озвучки.
         """
-        audio_playback_stream = sd.RawOutputStream(
-            samplerate=self.tts_engine.sample_rate, channels=1, dtype="int16"
-        )
-        audio_playback_stream.start()
-        try:
-            async for audio_chunk in self.tts_engine.stream(text):
-                if self.interrupt_event.is_set():
-                    break  # Прерываем озвучку, если снова услышали wake word
-                if not audio_playback_stream.closed:
-                    audio_playback_stream.write(audio_chunk)
-        finally:
-            audio_playback_stream.stop()
-            audio_playback_stream.close()
+        loop = asyncio.get_running_loop()
+        async with self.resources.use_async("tts") as tts_engine:
+            audio_playback_stream = sd.RawOutputStream(
+                samplerate=tts_engine.sample_rate, channels=1, dtype="int16"
+            )
+            audio_playback_stream.start()
+            try:
+                first_chunk = True
+                async for audio_chunk in tts_engine.stream(text):
+                    if self.interrupt_event.is_set():
+                        break  # Прерываем озвучку, если снова услышали wake word
+                    if first_chunk:
+                        first_chunk = False
+                        # Настоящий ответ заглушает подтверждение
+                        if self.earcons:
+                            self.earcons.cancel()
+                        self._mark_first_sound("response")
+                        if self.turn_timer:
+                            self.turn_timer.mark("tts_first_audio_s")
+                    if not audio_playback_stream.closed:
+                        # write() блокируется, пока устройство не примет порцию
+                        # (до PIPER_PLAYBACK_CHUNK_MS), поэтому выполняется вне event loop
+                        await loop.run_in_executor(
+                            None,
+                            PROFILER.wrap("audio.write", audio_playback_stream.write),
+                            audio_chunk,
+                        )
+            finally:
+                audio_playback_stream.stop()
+                audio_playback_stream.close()
 
     async def handle_command_async(self, audio_path: str):
         """
@@ -226,28 +556,44 @@ class LokiOrchestrator:
         Args:
             audio_path (str): Путь к временному аудиофайлу с записанной командой.
         """
+        # Вне включенного профилирования turn() — пустой контекст
+        with PROFILER.turn("handle_command"):
+            await self._handle_command(audio_path)
+
+    async def _handle_command(self, audio_path: str):
         command_executed = False
+        timer = self.turn_timer = TurnTimer()
+        status = "empty"
+        user_command_text = full_response = command_json = None
+        usage = {}
         try:
             # Шаг 1: Преобразование речи в текст
             loop = asyncio.get_running_loop()
-            user_command_text = await loop.run_in_executor(
-                None, self.stt_engine.transcribe, audio_path
-            )
+            async with self.resources.use_async("stt") as stt_engine:
+                user_command_text = await loop.run_in_executor(
+                    self.cpu.executor("stt"),
+                    PROFILER.wrap("stt.transcribe", stt_engine.transcribe),
+                    audio_path,
+                )
+            timer.mark("stt_s")
             if not user_command_text or self.interrupt_event.is_set():
                 return
 
             # Шаг 2: Получение ПОЛНОГО ответа от LLM с использованием единого промпта.
-            # Мы больше не выбираем промпт, а всегда используем UNIFIED_PROMPT.
+            # Если спекулятивный запрос по частичному транскрипту совпал с
+            # финальным, используется уже идущий поток его ответа.
             logging.info(
                 f"Sending request to LLM with unified prompt for text: '{user_command_text}'"
             )
             full_response = ""
-            async for token in self.llm_provider.stream_response(
-                user_command_text, system_prompt=UNIFIED_PROMPT
-            ):
-                if self.interrupt_event.is_set():
-                    break
-                full_response += token
+            stream, usage = self._response_stream(user_command_text)
+            with PROFILER.span("llm.response"):
+                async for token in stream:
+                    if self.interrupt_event.is_set():
+                        break
+                    timer.mark("llm_first_token_s")
+                    full_response += token
+            timer.mark("llm_s")
 
             if self.interrupt_event.is_set() or not full_response:
                 return
@@ -255,7 +601,14 @@ class LokiOrchestrator:
             logging.info(f"Full LLM response received: '{full_response}'")
 
             # Шаг 4: Парсинг ответа. Извлекаем текст для озвучки и JSON для выполнения.
-            text_to_speak, command_json = parse_llm_response(full_response)
+            parse = (
+                parse_structured_response
+                if self.structured_output
+                else parse_llm_response
+            )
+            text_to_speak, command_json = parse(full_response)
+            if self.conversation:
+                self.conversation.add_turn(user_command_text, full_response)
 
             # Шаг 5: Выполнение команды, если она была найдена
             if command_json:
@@ -269,35 +622,94 @@ class LokiOrchestrator:
                 handle_visual_command(
                     {"tool_name": "set_status", "parameters": {"status": "speaking"}}
                 )
-                await self._speak_text(text_to_speak)
+                with PROFILER.span("tts.speak"):
+                    await self._speak_text(text_to_speak)
+
+            status = "ok"
+            # Между ходами есть время сжать старую часть истории
+            if self.conversation:
+                self.conversation.schedule_compaction(self.llm_provider)
 
         except asyncio.CancelledError:
+            status = "cancelled"
             logging.info("Задача обработки команды была отменена.")
+            # Отмена asyncio не останавливает STT в executor; движок в отдельном
+            # процессе умеет прервать транскрибацию сам.
+            stt_engine = self.resources.peek("stt")
+            if hasattr(stt_engine, "cancel"):
+                stt_engine.cancel()
             raise
         finally:
+            # Ответ готов или команда выполнена: ожидающие подтверждения не нужны
+            if self.earcons:
+                self.earcons.cancel()
             # Шаг 7: Возврат в состояние ожидания, но только если не была выполнена
             # команда, которая устанавливает постоянный статус (например, "processing").
             if not self.interrupt_event.is_set() and not command_executed:
                 handle_visual_command(
                     {"tool_name": "set_status", "parameters": {"status": "idle"}}
                 )
+            if status != "ok" and self.interrupt_event.is_set():
+                status = "interrupted"
+            self._journal_turn(
+                timer, status, user_command_text, full_response, command_json, usage
+            )
+
+    def _journal_turn(self, timer, status, transcript, response, command, usage):
+        """Ставит запись о ходе в журнал (если он включен)."""
+        if not self.journal:
+            return
+        timer.mark("total_s")
+        self.journal.record(
+            {
+                "ts": timer.started_at,
+                "status": status,
+                "stages": timer.stages,
+                "transcript": transcript,
+                "response": response,
+                "command": command,
+                "provider": type(self.llm_provider).__name__,
+                "model": getattr(self.llm_provider, "model", None)
+                or getattr(self.llm_provider, "model_name", None),
+                "prompt_tokens": usage.get("prompt_tokens"),
+                "completion_tokens": usage.get("completion_tokens"),
+                "cached_tokens": usage.get("cached_tokens"),
+            }
+        )
 
     async def cleanup(self):
         """Корректно освобождает все занятые ресурсы."""
         logging.info("Освобождение ресурсов...")
         if self.current_command_task:
             self.current_command_task.cancel()
+        self._cancel_speculation()
+        if self.conversation:
+            self.conversation.cancel_compaction()
         if self.audio_stream:
             self.audio_stream.close()
         if self.pa:
             self.pa.terminate()
         if self.porcupine:
             self.porcupine.delete()
+        if self.resources_task:
+            self.resources_task.cancel()
+        if self.metrics_task:
+            self.metrics_task.cancel()
+            logging.info(f"Metrics: {METRICS.summary()}")
+        if self.earcons:
+            self.earcons.close()
+        if self.loop_monitor:
+            self.loop_monitor.stop()
+        PROFILER.close()
+        if self.journal:
+            self.journal.close()
+        self.resources.close()
         if self.llm_provider:
             if hasattr(self.llm_provider, "close") and callable(
                 getattr(self.llm_provider, "close")
             ):
                 self.llm_provider.close()
+        self.cpu.shutdown()
         logging.info("Ресурсы освобождены.")
 
 
@@ -0,0 +1,124 @@
+# loki/loop_monitor.py
+"""
+Монитор задержки event loop оркестратора.
+
+Любой блокирующий вызов внутри корутины (синхронная запись в аудиопоток,
+тяжелые вычисления, забытый `run_in_executor`) останавливает весь event
+loop: прерывание по wake word и стриминг ответа начинают запаздывать.
+
+`LoopLagMonitor` состоит из двух частей:
+
+- корутина-пульс засыпает на `interval_s` и измеряет, насколько позже
+  она проснулась; задержка (lag) попадает в METRICS как распределение
+  `loop.lag_ms`;
+- сторожевой поток проверяет, давно ли был пульс. Если loop завис дольше
+  порога, поток снимает стек потока event loop через `sys._current_frames()`
+  прямо во время блокировки — так видно, какая корутина или callback виноваты.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional, Tuple
+
+from loki import config
+from .metrics import METRICS
+
+
+class LoopLagMonitor:
+    """Измеряет задержку event loop и ловит стек блокирующего кода."""
+
+    def __init__(
+        self,
+        interval_s: float = config.LOOP_MONITOR_INTERVAL_S,
+        threshold_ms: float = config.LOOP_LAG_THRESHOLD_MS,
+    ):
+        """
+        Args:
+            interval_s (float): Период пульса.
+            threshold_ms (float): Задержка, после которой loop считается заблокированным.
+        """
+        self.interval_s = interval_s
+        self.threshold_s = threshold_ms / 1000
+        self.stalls = 0
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = time.perf_counter()
+        # (момент снятия, стек) последней замеченной сторожем блокировки
+        self._captured: Optional[Tuple[float, str]] = None
+        self._heartbeat_task = None
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def start(self):
+        """Запускает пульс и сторожевой поток (вызывается из event loop)."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._stop.clear()
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loki-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        logging.info(
+            f"Event loop lag monitor started (interval {self.interval_s * 1000:.0f} ms, "
+            f"threshold {self.threshold_s * 1000:.0f} ms)."
+        )
+
+    async def _heartbeat(self):
+        while True:
+            scheduled = time.perf_counter()
+            await asyncio.sleep(self.interval_s)
+            now = time.perf_counter()
+            self._last_beat = now
+            lag = max(0.0, now - scheduled - self.interval_s)
+            METRICS.observe("loop.lag_ms", lag * 1000)
+            if lag >= self.threshold_s:
+                self._report_stall(lag, scheduled)
+
+    def _report_stall(self, lag: float, since: float):
+        """Пишет предупреждение о блокировке со стеком, снятым во время нее."""
+        self.stalls += 1
+        METRICS.increment("loop.stalls")
+        captured, self._captured = self._captured, None
+        # Стек, снятый до начала этой блокировки, относится к другой
+        stack = captured[1] if captured and captured[0] >= since else None
+        if stack:
+            logging.warning(
+                f"Event loop was blocked for {lag * 1000:.0f} ms. "
+                f"Blocking code:\n{stack}"
+            )
+        else:
+            logging.warning(
+                f"Event loop was blocked for {lag * 1000:.0f} ms "
+                f"(too short to capture the stack)."
+            )
+
+    def _watch(self):
+        """Сторожевой поток: снимает стек, пока event loop заблокирован."""
+        deadline = self.interval_s + self.threshold_s
+        while not self._stop.wait(self.interval_s / 2):
+            stalled_for = time.perf_counter() - self._last_beat
+            if stalled_for < deadline or (
+                self._captured and self._captured[0] > self._last_beat
+            ):
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            where = (
+                f"task {task.get_name()} ({task.get_coro()!r})" if task else "callback"
+            )
+            stack = f"In {where}:\n" + "".join(traceback.format_stack(frame))
+            self._captured = (time.perf_counter(), stack)
+
+    def stop(self):
+        """Останавливает пульс и сторожевой поток."""
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
@@ -0,0 +1,115 @@
+# loki/metrics.py
+"""
+Реестр метрик времени выполнения LOKI.
+
+Единая точка, куда компоненты складывают счетчики (например, число
+сгенерированных токенов), мгновенные значения (gauges) и выборки для
+распределений (задержки). Оркестратор и утилиты читают отсюда сводку
+через `METRICS.snapshot()`.
+
+Наружу метрики выводятся двумя путями: оркестратор раз в
+LOKI_METRICS_LOG_S секунд пишет в лог строку `METRICS.summary()`
+(см. `Metrics.report`), а порт управления профайлером отвечает на команду
+"metrics" полным снимком в JSON (см. loki/turn_profiler.py).
+
+Реестр потокобезопасен: метрики обновляются как из event loop, так и из
+потоков executor'ов.
+"""
+import asyncio
+import collections
+import logging
+import threading
+from typing import Any, Deque, Dict
+
+from .utils import percentile
+
+# Сколько последних наблюдений хранится для расчета перцентилей
+DEFAULT_WINDOW = 1000
+
+
+class Metrics:
+    """Потокобезопасный реестр счетчиков, gauges и распределений."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._counters: Dict[str, float] = collections.defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        """Увеличивает счетчик `name` на `value`."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        """Устанавливает мгновенное значение `name`."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Добавляет наблюдение в скользящее окно распределения `name`."""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = collections.deque(maxlen=self._window)
+            samples.append(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Возвращает копию всех метрик.
+
+        Returns:
+            Dict[str, Any]: Словарь с ключами "counters", "gauges" и
+            "distributions" (count, p50, p90, p99, max по скользящему окну).
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            samples = {name: list(values) for name, values in self._samples.items()}
+        distributions = {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": max(values, default=0.0),
+            }
+            for name, values in samples.items()
+        }
+        return {"counters": counters, "gauges": gauges, "distributions": distributions}
+
+    def summary(self) -> str:
+        """
+        Сводка всех метрик одной строкой для лога.
+
+        Счетчики и gauges выводятся значением, распределения — как
+        `name p50/p90/max (n=count)`. Пустая строка, если метрик нет.
+        """
+        snapshot = self.snapshot()
+        parts = [f"{name}={value:g}" for name, value in snapshot["counters"].items()]
+        parts += [f"{name}={value:g}" for name, value in snapshot["gauges"].items()]
+        parts += [
+            f"{name} {d['p50']:.3g}/{d['p90']:.3g}/{d['max']:.3g} (n={d['count']})"
+            for name, d in snapshot["distributions"].items()
+        ]
+        return "; ".join(sorted(parts))
+
+    async def report(self, interval_s: float):
+        """Раз в `interval_s` секунд пишет `summary()` в лог (до отмены задачи)."""
+        while True:
+            await asyncio.sleep(interval_s)
+            summary = self.summary()
+            if summary:
+                logging.info(f"Metrics: {summary}")
+
+    def reset(self):
+        """Очищает все метрики."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._samples.clear()
+
+
+# Глобальный реестр процесса
+METRICS = Metrics()
@@ -0,0 +1,125 @@
+# loki/prompt_selector.py
+"""
+Динамическая сборка системного промпта под запрос пользователя.
+
+Статический `UNIFIED_PROMPT` содержит все инструменты и исходные примеры и
+отправляется на каждом ходе; время prefill на локальной GPU растет вместе с
+ним линейно. `PromptSelector` собирает промпт из частей `prompts.py`, выбирая
+примеры из всего пула `FEW_SHOT_EXAMPLES`:
+
+- спецификации только тех инструментов, ключевые слова которых нашлись
+  в транскрипте;
+- top-k самых похожих на запрос примеров для этих инструментов;
+- все примеры-ограничители (`guardrail`) — они нужны именно тогда, когда
+  запрос похож на команду, но ей не является.
+
+Сходство считается по символьным триграммам нормализованного текста: это
+устойчиво к падежам и ошибкам распознавания и не требует моделей эмбеддингов.
+Для одного и того же нормализованного транскрипта промпт всегда одинаков,
+поэтому спекулятивный запрос по частичной фразе получает тот же промпт, что
+и финальный.
+"""
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from loki import config
+from loki.prompts import FEW_SHOT_EXAMPLES, TOOL_SPECS, build_prompt
+from loki.utils import normalize_transcript
+
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    """Символьные n-граммы слов нормализованного текста (с границами слов)."""
+    grams = Counter()
+    for word in normalize_transcript(text).split():
+        padded = f" {word} "
+        grams.update(padded[i : i + n] for i in range(max(1, len(padded) - n + 1)))
+    return grams
+
+
+def cosine_similarity(a: Counter, b: Counter) -> float:
+    """Косинусное сходство двух мешков n-грамм."""
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[gram] for gram, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+    return dot / norm
+
+
+def containment(keyword: Counter, text: Counter) -> float:
+    """Доля n-грамм ключевого слова, найденных в тексте."""
+    if not keyword:
+        return 0.0
+    found = sum(min(count, text[gram]) for gram, count in keyword.items())
+    return found / sum(keyword.values())
+
+
+class PromptSelector:
+    """Выбирает инструменты и примеры для промпта по транскрипту."""
+
+    def __init__(
+        self,
+        tools: Optional[Dict[str, Dict[str, Any]]] = None,
+        examples: Optional[Sequence[Dict[str, Any]]] = None,
+        top_k: int = config.PROMPT_TOP_K_EXAMPLES,
+        min_tool_score: float = config.PROMPT_TOOL_MIN_SCORE,
+    ):
+        """
+        Args:
+            tools (dict): Спецификации инструментов (по умолчанию `TOOL_SPECS`).
+            examples (Sequence[dict]): Пул примеров (по умолчанию `FEW_SHOT_EXAMPLES`).
+            top_k (int): Сколько примеров с инструментами оставить в промпте.
+            min_tool_score (float): Порог сходства ключевого слова с транскриптом.
+        """
+        self.tools = TOOL_SPECS if tools is None else tools
+        self.examples = list(FEW_SHOT_EXAMPLES if examples is None else examples)
+        self.top_k = top_k
+        self.min_tool_score = min_tool_score
+        # Индекс строится один раз: пул примеров небольшой и статичный
+        self._keywords = {
+            name: [char_ngrams(keyword) for keyword in spec.get("keywords", ())]
+            for name, spec in self.tools.items()
+        }
+        self._example_grams = [char_ngrams(e["user"]) for e in self.examples]
+
+    def tool_scores(self, transcript: str) -> Dict[str, float]:
+        """Оценка каждого инструмента: лучшее совпадение его ключевых слов."""
+        grams = char_ngrams(transcript)
+        return {
+            name: max((containment(k, grams) for k in keywords), default=0.0)
+            for name, keywords in self._keywords.items()
+        }
+
+    def select(self, transcript: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Выбирает инструменты и примеры для транскрипта.
+
+        Returns:
+            Tuple[List[str], List[dict]]: Имена инструментов и примеры
+            (в порядке пула, чтобы промпт не зависел от порядка оценок).
+        """
+        scores = self.tool_scores(transcript)
+        tools = [name for name in self.tools if scores[name] >= self.min_tool_score]
+
+        grams = char_ngrams(transcript)
+        candidates = sorted(
+            (
+                (cosine_similarity(grams, example_grams), index)
+                for index, (example, example_grams) in enumerate(
+                    zip(self.examples, self._example_grams)
+                )
+                if not example.get("guardrail") and example.get("tool") in tools
+            ),
+            key=lambda item: (-item[0], item[1]),
+        )
+        chosen = {index for _, index in candidates[: self.top_k]}
+        examples = [
+            example
+            for index, example in enumerate(self.examples)
+            if example.get("guardrail") or index in chosen
+        ]
+        return tools, examples
+
+    def build(self, transcript: str) -> str:
+        """Собирает системный промпт для транскрипта."""
+        return build_prompt(*self.select(transcript))
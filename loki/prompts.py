@@ -13,6 +13,7 @@
 Это разделяет логику принятия решений (что делать?) от исполнения
 (как делать?).
 """
+from typing import Any, Dict, Iterable, Sequence
 
 #
 # Системный промпт: UNIFIED_PROMPT
@@ -45,35 +46,153 @@
 #     - **Пример общего вопроса (Zero-Shot)**: Показывает ожидаемое поведение,
 #       когда ни один инструмент не релевантен.
 #
-UNIFIED_PROMPT = """Ты — LOKI, функциональный AI-ассистент. Твоя главная задача — строго следовать инструкциям и использовать инструменты, только когда запрос пользователя является прямой командой для их активации.
+PROMPT_HEADER = """Ты — LOKI, функциональный AI-ассистент. Твоя главная задача — строго следовать инструкциям и использовать инструменты, только когда запрос пользователя является прямой командой для их активации.
 
 Проанализируй запрос. Если он точно соответствует одному из инструментов, ты ДОЛЖЕН вернуть JSON-объект с командой в блоке [CMD]. В остальных случаях — просто отвечай на вопрос кратко и по делу. Не придумывай команды, если не уверен.
+"""
 
-### Доступные инструменты:
-
-1.  **`set_status`**: Управляет твоим внутренним состоянием.
+#
+# Инструменты и примеры хранятся по отдельности, чтобы промпт можно было
+# собирать под конкретный запрос (см. loki/prompt_selector.py).
+#
+# - `keywords` инструмента — основы слов, по которым селектор решает, нужна ли
+#   его спецификация в промпте. Сравнение нечеткое (символьные n-граммы),
+#   поэтому достаточно основы: "погод" совпадет с "погоду" и "погодка".
+# - `guardrail` помечает примеры-ограничители (негативный пример и пример
+#   общего вопроса). Они попадают в каждый промпт независимо от запроса.
+#
+TOOL_SPECS = {
+    "set_status": {
+        "description": """**`set_status`**: Управляет твоим внутренним состоянием.
     -   **Когда использовать**: Только если пользователь прямо говорит "переключись", "установи режим", "включи состояние".
-    -   **Параметры**: `status` (string, обязательный): "idle", "processing", "listening", "speaking".
-
-2.  **`get_weather`**: Получает информацию о погоде.
+    -   **Параметры**: `status` (string, обязательный): "idle", "processing", "listening", "speaking".""",
+        "keywords": ["переключись", "установи", "режим", "состояние", "статус"],
+    },
+    "get_weather": {
+        "description": """**`get_weather`**: Получает информацию о погоде.
     -   **Когда использовать**: Если пользователь спрашивает про погоду.
-    -   **Параметры**: `city` (string, обязательный): Название города. Если не указан, используй "auto".
+    -   **Параметры**: `city` (string, обязательный): Название города. Если не указан, используй "auto".""",
+        "keywords": ["погод", "температур", "градус", "дожд", "снег", "зонт"],
+    },
+}
+
+FEW_SHOT_EXAMPLES = [
+    {
+        "title": "Прямая команда",
+        "user": "Переключись в режим обработки.",
+        "answer": 'Выполнено. [CMD]{"tool_name": "set_status", "parameters": {"status": "processing"}}[/CMD]',
+        "tool": "set_status",
+    },
+    {
+        "title": "Команда с параметром",
+        "user": "Какая погода сейчас в Санкт-Петербурге?",
+        "answer": 'Минуту, уточняю погоду. [CMD]{"tool_name": "get_weather", "parameters": {"city": "Санкт-Петербург"}}[/CMD]',
+        "tool": "get_weather",
+    },
+    {
+        "title": "НЕ команда (важный пример!)",
+        "user": "Как твое состояние?",
+        "answer": "Я в рабочем состоянии, готов к командам.",
+        "guardrail": True,
+    },
+    {
+        "title": "Общий вопрос",
+        "user": "Сколько спутников у Юпитера?",
+        "answer": "У Юпитера известно 95 спутников.",
+        "guardrail": True,
+    },
+    {
+        "title": "Команда без города",
+        "user": "Нужен ли сегодня зонт?",
+        "answer": 'Сейчас проверю прогноз. [CMD]{"tool_name": "get_weather", "parameters": {"city": "auto"}}[/CMD]',
+        "tool": "get_weather",
+    },
+    {
+        "title": "Смена режима",
+        "user": "Установи режим ожидания.",
+        "answer": 'Перехожу в режим ожидания. [CMD]{"tool_name": "set_status", "parameters": {"status": "idle"}}[/CMD]',
+        "tool": "set_status",
+    },
+]
+
+
+def build_prompt(tool_names: Iterable[str], examples: Sequence[Dict[str, Any]]) -> str:
+    """
+    Собирает системный промпт из заголовка, спецификаций и примеров.
 
-### Примеры работы:
+    Args:
+        tool_names (Iterable[str]): Имена инструментов из `TOOL_SPECS`.
+        examples (Sequence[Dict[str, Any]]): Примеры из `FEW_SHOT_EXAMPLES`
+            в том порядке, в котором они попадут в промпт.
+    """
+    parts = [PROMPT_HEADER]
+    tools = [
+        f"{number}.  {TOOL_SPECS[name]['description']}"
+        for number, name in enumerate(tool_names, start=1)
+    ]
+    if tools:
+        parts.append("### Доступные инструменты:\n\n" + "\n\n".join(tools) + "\n")
+    if examples:
+        parts.append(
+            "### Примеры работы:\n\n"
+            + "\n\n".join(
+                f"**Пример {number}: {example['title']}**\n"
+                f"Пользователь: \"{example['user']}\"\n"
+                f"Твой ответ: \"{example['answer']}\""
+                for number, example in enumerate(examples, start=1)
+            )
+            + "\n"
+        )
+    return "\n".join(parts)
 
-**Пример 1: Прямая команда**
-Пользователь: "Переключись в режим обработки."
-Твой ответ: "Выполнено. [CMD]{"tool_name": "set_status", "parameters": {"status": "processing"}}[/CMD]"
 
-**Пример 2: Команда с параметром**
-Пользователь: "Какая погода сейчас в Санкт-Петербурге?"
-Твой ответ: "Минуту, уточняю погоду. [CMD]{"tool_name": "get_weather", "parameters": {"city": "Санкт-Петербург"}}[/CMD]"
+# Статический промпт собирается из первых STATIC_PROMPT_EXAMPLES примеров
+# (исходный набор), остальные только пополняют пул для сборки под запрос
+# и не увеличивают промпт, который отправляется без LOKI_DYNAMIC_PROMPT.
+STATIC_PROMPT_EXAMPLES = 4
+UNIFIED_PROMPT = build_prompt(TOOL_SPECS, FEW_SHOT_EXAMPLES[:STATIC_PROMPT_EXAMPLES])
+
+#
+# Сжатие истории разговора (см. loki/conversation.py)
+#
+# Отдельный короткий промпт для фонового запроса, который сворачивает старые
+# реплики в краткое содержание. Важно сохранить то, на что пользователь может
+# сослаться в уточняющем вопросе: города, имена, числа, незакрытые просьбы.
+#
+CONVERSATION_SUMMARY_PROMPT = """Ты сжимаешь историю диалога голосового ассистента LOKI с пользователем. Перескажи ее в 2-4 коротких предложениях: факты, города, имена, числа, договоренности и незакрытые вопросы, на которые пользователь может сослаться дальше. Объедини с прежним кратким содержанием, если оно есть. Не добавляй ничего от себя и не используй блоки [CMD]."""
+
+#
+# Режим структурированного вывода (JSON-схема)
+#
+# Вместо текста с блоком [CMD] модель возвращает один JSON-объект, а
+# провайдер ограничивает генерацию этой схемой (Ollama `format`, Gemini
+# `response_schema`). Схема намеренно использует только общее подмножество
+# JSON Schema, которое понимают оба провайдера.
+#
+TOOL_CALL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "speech": {"type": "string"},
+        "command": {
+            "type": "object",
+            "properties": {
+                "tool_name": {"type": "string"},
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "status": {"type": "string"},
+                        "city": {"type": "string"},
+                    },
+                },
+            },
+        },
+    },
+    "required": ["speech"],
+}
 
-**Пример 3: НЕ команда (важный пример!)**
-Пользователь: "Как твое состояние?"
-Твой ответ: "Я в рабочем состоянии, готов к командам."
+STRUCTURED_OUTPUT_PROMPT = """
 
-**Пример 4: Общий вопрос**
-Пользователь: "Сколько спутников у Юпитера?"
-Твой ответ: "У Юпитера известно 95 спутников."
+### Формат ответа (JSON):
+Верни ровно один JSON-объект без блока [CMD]: {"speech": "текст для озвучки", "command": {"tool_name": "...", "parameters": {...}}}.
+Если команда не нужна, не добавляй поле "command".
 """
@@ -0,0 +1,166 @@
+# loki/resampler.py
+"""
+Потоковый полифазный ресемплер на NumPy.
+
+Многие USB-микрофоны и микрофонные массивы работают только на 44.1/48 кГц.
+Захват сразу в 16 кГц заставляет драйвер ресемплировать (с лишней
+задержкой и нагрузкой) или вовсе не открывается. LOKI захватывает звук на
+родной частоте устройства и сам приводит его к `config.AUDIO_RATE` для
+Porcupine, webrtcvad и Whisper.
+
+Преобразование in_rate -> out_rate сводится к up/down (после сокращения на
+НОД: 48000 -> 16000 это 1/3, 44100 -> 16000 это 160/441). Фильтр нижних
+частот — sinc с окном Кайзера, разложенный на `up` фаз по
+`config.RESAMPLER_TAPS_PER_PHASE` отсчетов. Каждый выходной отсчет — это
+скалярное произведение окна входа на одну фазу фильтра; все отсчеты блока
+считаются одним векторным вызовом без циклов Python. Между блоками хранится
+только хвост входа длиной в фильтр, поэтому результат не зависит от того,
+какими порциями приходит звук.
+"""
+import math
+from typing import Callable
+
+import numpy as np
+
+from loki import config
+
+
+def design_filter(
+    up: int, down: int, taps_per_phase: int, rolloff: float = 0.9
+) -> np.ndarray:
+    """
+    Рассчитывает фильтр нижних частот для ресемплинга up/down.
+
+    Returns:
+        np.ndarray: Матрица фаз формы (up, taps_per_phase), строки уже
+        развернуты для умножения на окно входа в прямом порядке.
+    """
+    length = up * taps_per_phase
+    # Частота среза относительно частоты после повышения (in_rate * up)
+    cutoff = rolloff * 0.5 / max(up, down)
+    n = np.arange(length) - (length - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, 8.0)
+    # Усиление up компенсирует нули, вставленные при повышении частоты
+    h *= up / h.sum() if h.sum() else 1.0
+    phases = h.reshape(taps_per_phase, up).T
+    return np.ascontiguousarray(phases[:, ::-1], dtype=np.float32)
+
+
+class StreamingResampler:
+    """Ресемплирует поток int16 блоками произвольной длины."""
+
+    def __init__(
+        self,
+        in_rate: int,
+        out_rate: int,
+        taps_per_phase: int = config.RESAMPLER_TAPS_PER_PHASE,
+    ):
+        gcd = math.gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = out_rate // gcd
+        self.down = in_rate // gcd
+        self.taps = taps_per_phase
+        self._phases = design_filter(self.up, self.down, taps_per_phase)
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает состояние (после разрыва в потоке)."""
+        # Буфер начинается с taps-1 нулей истории; индексы входа отсчитываются
+        # так, что первый настоящий отсчет имеет индекс 0.
+        self._buffer = np.zeros(self.taps - 1, dtype=np.float32)
+        self._start = -(self.taps - 1)
+        self._received = 0
+        self._next_out = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Добавляет входные отсчеты и возвращает все готовые выходные.
+
+        Args:
+            samples (np.ndarray): Отсчеты int16 (или float32) на частоте `in_rate`.
+
+        Returns:
+            np.ndarray: Отсчеты int16 на частоте `out_rate`.
+        """
+        self._buffer = np.concatenate((self._buffer, samples.astype(np.float32)))
+        self._received += len(samples)
+        # Выходной отсчет m использует вход с индексом до (m * down) // up включительно
+        last = (self.up * self._received - 1) // self.down
+        if last < self._next_out:
+            return np.zeros(0, dtype=np.int16)
+        positions = np.arange(self._next_out, last + 1, dtype=np.int64) * self.down
+        bases = positions // self.up
+        windows = np.lib.stride_tricks.sliding_window_view(self._buffer, self.taps)
+        out = np.einsum(
+            "ij,ij->i",
+            windows[bases - (self.taps - 1) - self._start],
+            self._phases[positions % self.up],
+        )
+        self._next_out = last + 1
+
+        # Оставляем только историю, нужную следующему выходному отсчету
+        keep_from = (self._next_out * self.down) // self.up - (self.taps - 1)
+        self._buffer = self._buffer[keep_from - self._start :]
+        self._start = keep_from
+        # Схема фаз повторяется каждые up выходных отсчетов: сдвигаем счетчики,
+        # чтобы они не росли бесконечно
+        cycles = self._next_out // self.up
+        if cycles:
+            self._next_out -= cycles * self.up
+            self._received -= cycles * self.down
+            self._start -= cycles * self.down
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+
+class FrameResampler:
+    """
+    Выдает кадры фиксированной длины на целевой частоте.
+
+    Porcupine ждет ровно `frame_length` отсчетов, webrtcvad — чанк в 10/20/30 мс;
+    при ресемплинге из 44.1 кГц число выходных отсчетов на чтение дробное,
+    поэтому остаток копится между вызовами.
+    """
+
+    def __init__(
+        self, read: Callable[[], bytes], in_rate: int, out_rate: int, frames: int
+    ):
+        """
+        Args:
+            read (Callable[[], bytes]): Чтение одной порции int16 с устройства.
+            in_rate (int): Частота устройства.
+            out_rate (int): Требуемая частота.
+            frames (int): Длина выдаваемого кадра в отсчетах `out_rate`.
+        """
+        self._read = read
+        self.frames = frames
+        self.resampler = (
+            StreamingResampler(in_rate, out_rate) if in_rate != out_rate else None
+        )
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    def reset(self):
+        """Отбрасывает накопленное (поток не читался какое-то время)."""
+        self._pending = np.zeros(0, dtype=np.int16)
+        if self.resampler:
+            self.resampler.reset()
+
+    def read(self) -> bytes:
+        """Возвращает один кадр int16 длиной `frames` отсчетов."""
+        if self.resampler is None:
+            return self._read()
+        while len(self._pending) < self.frames:
+            chunk = np.frombuffer(self._read(), dtype=np.int16)
+            self._pending = np.concatenate(
+                (self._pending, self.resampler.process(chunk))
+            )
+        frame, self._pending = (
+            self._pending[: self.frames],
+            self._pending[self.frames :],
+        )
+        return frame.tobytes()
+
+
+def device_frames(frames: int, device_rate: int, rate: int = config.AUDIO_RATE) -> int:
+    """Сколько отсчетов устройства соответствует `frames` отсчетам на `rate`."""
+    return max(1, round(frames * device_rate / rate))
@@ -0,0 +1,298 @@
+# loki/resources.py
+"""
+Менеджер ресурсов: выгрузка простаивающих моделей и контроль памяти.
+
+На небольших постоянно включенных машинах память, занятую моделью Whisper
+и сессией Piper, полезнее отдать Ollama. `ResourceManager` ведет учет
+последнего использования каждого тяжелого движка и выгружает его:
+
+- после заданного времени простоя (`idle_timeout_s`);
+- когда RSS процесса превышает бюджет (`rss_budget_mb`) — начиная с давно
+  неиспользуемых.
+
+Выгруженный движок загружается снова при следующем обращении. Время
+перезагрузки и изменение RSS по каждому компоненту логируются и попадают
+в METRICS, чтобы порог можно было подобрать осознанно.
+
+Детектор wake word в менеджер не регистрируется и всегда остается в памяти.
+"""
+import asyncio
+import contextlib
+import ctypes
+import gc
+import logging
+import sys
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from .metrics import METRICS
+
+try:
+    import psutil
+except ImportError:  # psutil не обязателен: на Linux RSS читается из /proc
+    psutil = None
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    Возвращает резидентную память (RSS) текущего процесса в байтах.
+
+    Returns:
+        Optional[int]: RSS или None, если определить его не удалось.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    import resource
+
+    return resident_pages * resource.getpagesize()
+
+
+def _release_freed_memory():
+    """
+    Возвращает освобожденную память операционной системе.
+
+    После удаления тензоров glibc держит освобожденные страницы у себя,
+    и RSS не уменьшается; `malloc_trim` отдает их обратно.
+    """
+    gc.collect()
+    if "torch" in sys.modules:
+        torch = sys.modules["torch"]
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+def _format_mb(value: Optional[int]) -> str:
+    return "n/a" if value is None else f"{value / 2**20:.0f} MB"
+
+
+class _Resource:
+    """Состояние одного управляемого движка."""
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.instance = None
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.loads = 0
+        self.lock = threading.Lock()
+
+
+class ResourceManager:
+    """
+    Реестр тяжелых движков с загрузкой по требованию и выгрузкой при простое.
+
+    Движок, взятый через `use()`, считается занятым и не выгружается, пока
+    блок `with` не завершится.
+    """
+
+    def __init__(
+        self,
+        idle_timeout_s: float = 0,
+        rss_budget_mb: float = 0,
+        rss_reader: Callable[[], Optional[int]] = current_rss_bytes,
+    ):
+        """
+        Args:
+            idle_timeout_s (float): Время простоя до выгрузки (0 — не выгружать).
+            rss_budget_mb (float): Бюджет RSS процесса в МБ (0 — без бюджета).
+            rss_reader (Callable): Функция, возвращающая текущий RSS в байтах.
+        """
+        self.idle_timeout_s = idle_timeout_s
+        self.rss_budget_mb = rss_budget_mb
+        self._rss_reader = rss_reader
+        self._resources: Dict[str, _Resource] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], preload: bool = True):
+        """
+        Регистрирует движок.
+
+        Args:
+            name (str): Имя компонента (используется в логах и метриках).
+            loader (Callable[[], Any]): Фабрика, создающая экземпляр движка.
+            preload (bool): Загрузить движок сразу.
+        """
+        self._resources[name] = _Resource(name, loader)
+        if preload:
+            self.get(name)
+
+    def _load(self, resource: _Resource):
+        """Загружает движок, если он выгружен (вызывается под `resource.lock`)."""
+        if resource.instance is not None:
+            return
+        rss_before = self._rss_reader()
+        start = time.perf_counter()
+        resource.instance = resource.loader()
+        elapsed = time.perf_counter() - start
+        rss_after = self._rss_reader()
+        resource.loads += 1
+        delta = None if None in (rss_before, rss_after) else rss_after - rss_before
+        METRICS.increment(f"resources.{resource.name}.loads")
+        METRICS.observe(f"resources.{resource.name}.load_s", elapsed)
+        if delta is not None:
+            METRICS.set_gauge(f"resources.{resource.name}.rss_mb", delta / 2**20)
+        action = "Loaded" if resource.loads == 1 else "Reloaded"
+        logging.info(
+            f"{action} '{resource.name}' in {elapsed:.2f} s "
+            f"(resident memory +{_format_mb(delta)}, process RSS {_format_mb(rss_after)})."
+        )
+
+    def get(self, name: str) -> Any:
+        """Возвращает экземпляр движка, при необходимости загружая его."""
+        resource = self._resources[name]
+        with resource.lock:
+            self._load(resource)
+            resource.last_used = time.monotonic()
+            return resource.instance
+
+    def peek(self, name: str) -> Any:
+        """Возвращает экземпляр движка, только если он уже загружен."""
+        return self._resources[name].instance
+
+    def _acquire(self, name: str) -> Any:
+        resource = self._resources[name]
+        with resource.lock:
+            self._load(resource)
+            resource.in_use += 1
+            return resource.instance
+
+    def _release(self, name: str):
+        resource = self._resources[name]
+        with resource.lock:
+            resource.in_use -= 1
+            resource.last_used = time.monotonic()
+
+    @contextlib.contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """
+        Берет движок на время блока `with`; в это время он не выгружается.
+
+        Yields:
+            Any: Экземпляр движка.
+        """
+        instance = self._acquire(name)
+        try:
+            yield instance
+        finally:
+            self._release(name)
+
+    @contextlib.asynccontextmanager
+    async def use_async(self, name: str) -> AsyncIterator[Any]:
+        """То же, что `use()`, но загрузка выполняется вне event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self._acquire, name)
+        try:
+            instance = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Загрузка в потоке все равно завершится: освобождаем движок после нее
+            future.add_done_callback(
+                lambda f: None if f.exception() else self._release(name)
+            )
+            raise
+        try:
+            yield instance
+        finally:
+            self._release(name)
+
+    async def prefetch(self, name: str):
+        """Загружает движок в фоне (например, пока пользователь говорит)."""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.get, name)
+        except Exception as e:
+            logging.warning(f"Failed to prefetch '{name}': {e}")
+
+    def unload(self, name: str, reason: str = "requested") -> bool:
+        """
+        Выгружает движок, если он загружен и не занят.
+
+        Returns:
+            bool: True, если движок был выгружен.
+        """
+        resource = self._resources[name]
+        with resource.lock:
+            if resource.instance is None or resource.in_use:
+                return False
+            instance, resource.instance = resource.instance, None
+        idle_s = time.monotonic() - resource.last_used
+        rss_before = self._rss_reader()
+        if hasattr(instance, "close"):
+            try:
+                instance.close()
+            except Exception as e:
+                logging.warning(f"Error while closing '{name}': {e}")
+        del instance
+        _release_freed_memory()
+        rss_after = self._rss_reader()
+        freed = None if None in (rss_before, rss_after) else rss_before - rss_after
+        METRICS.increment(f"resources.{name}.unloads")
+        logging.info(
+            f"Unloaded '{name}' ({reason}, idle {idle_s:.0f} s): "
+            f"freed {_format_mb(freed)}, process RSS {_format_mb(rss_after)}."
+        )
+        return True
+
+    def _idle_candidates(self):
+        """Загруженные и свободные движки, от давно неиспользуемых к недавним."""
+        loaded = [
+            r
+            for r in self._resources.values()
+            if r.instance is not None and not r.in_use
+        ]
+        return sorted(loaded, key=lambda r: r.last_used)
+
+    def collect(self) -> int:
+        """
+        Выгружает движки по времени простоя и бюджету памяти.
+
+        Returns:
+            int: Количество выгруженных движков.
+        """
+        unloaded = 0
+        with self._lock:
+            if self.idle_timeout_s > 0:
+                now = time.monotonic()
+                for resource in self._idle_candidates():
+                    if now - resource.last_used < self.idle_timeout_s:
+                        continue
+                    if self.unload(resource.name, reason="idle timeout"):
+                        unloaded += 1
+
+            rss = self._rss_reader()
+            if rss is not None:
+                METRICS.set_gauge("resources.rss_mb", rss / 2**20)
+            if self.rss_budget_mb > 0 and rss is not None:
+                for resource in self._idle_candidates():
+                    if rss <= self.rss_budget_mb * 2**20:
+                        break
+                    if self.unload(resource.name, reason="over RSS budget"):
+                        unloaded += 1
+                        rss = self._rss_reader() or 0
+        return unloaded
+
+    async def watch(self, interval_s: float):
+        """Периодически вызывает `collect()` в фоне, не блокируя event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                await loop.run_in_executor(None, self.collect)
+            except Exception as e:
+                logging.warning(f"Resource collection failed: {e}")
+
+    def close(self):
+        """Выгружает все движки при завершении работы."""
+        for name in self._resources:
+            self.unload(name, reason="shutdown")
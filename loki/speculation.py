@@ -0,0 +1,220 @@
+# loki/speculation.py
+"""
+Спекулятивные запросы к LLM по частичным транскриптам.
+
+Пока пользователь еще не закончил фразу (VAD ждет финальную тишину),
+оркестратор может распознать уже записанную часть и заранее отправить ее
+в LLM. Если финальный транскрипт после нормализации совпадает с частичным,
+используется уже идущий поток ответа; иначе спекулятивный запрос
+отменяется и отправляется обычный.
+
+Модуль также ведет статистику попаданий и сэкономленного времени, чтобы
+можно было оценить, окупается ли потраченное впустую время GPU.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+import numpy as np
+
+from loki.llm_providers import GenerationOptions, LLMProvider
+from loki.metrics import METRICS
+from loki.utils import normalize_transcript
+
+
+class SpeculativeRequest:
+    """
+    Запрос к LLM, запущенный по частичному транскрипту.
+
+    Токены накапливаются в буфере с момента старта, поэтому поток ответа
+    можно подключить позже: `stream()` сначала отдает уже полученные токены,
+    а затем продолжает выдавать новые по мере генерации.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        transcript: str,
+        system_prompt: str,
+        options: Optional[GenerationOptions] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+    ):
+        self.transcript = transcript
+        self.normalized = normalize_transcript(transcript)
+        self.started_at = time.perf_counter()
+        # Момент, когда генерация закончилась (или была отменена)
+        self.finished_at: Optional[float] = None
+        # Статистика запроса (см. `LLMProvider.stream_response`), когда он завершится
+        self.usage: Dict[str, Any] = {}
+        self._tokens: List[str] = []
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(
+            self._run(provider, transcript, system_prompt, options, history)
+        )
+
+    async def _run(self, provider, transcript, system_prompt, options, history):
+        try:
+            async for token in provider.stream_response(
+                transcript,
+                system_prompt=system_prompt,
+                options=options,
+                history=history,
+                on_usage=self.usage.update,
+            ):
+                self._tokens.append(token)
+                self._changed.set()
+        finally:
+            self.finished_at = time.perf_counter()
+            self._changed.set()
+
+    @property
+    def generation_s(self) -> float:
+        """
+        Время, которое заняла генерация к текущему моменту.
+
+        После завершения генерации не растет: ожидание финального транскрипта
+        уже не входит ни в выигрыш, ни в потери.
+        """
+        now = time.perf_counter()
+        return min(now, self.finished_at or now) - self.started_at
+
+    @property
+    def token_count(self) -> int:
+        """Количество фрагментов ответа, полученных к текущему моменту."""
+        return len(self._tokens)
+
+    def matches(self, transcript: str) -> bool:
+        """Проверяет, совпадает ли транскрипт с частичным после нормализации."""
+        return bool(self.normalized) and self.normalized == normalize_transcript(
+            transcript
+        )
+
+    async def stream(self) -> AsyncGenerator[str, None]:
+        """
+        Отдает уже полученные токены, затем продолжает поток ответа.
+
+        Если потребитель прекращает чтение раньше (например, по wake word),
+        генерация отменяется.
+        """
+        index = 0
+        try:
+            while True:
+                while index < len(self._tokens):
+                    yield self._tokens[index]
+                    index += 1
+                if self._task.done():
+                    break
+                self._changed.clear()
+                await self._changed.wait()
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        """Отменяет генерацию спекулятивного ответа."""
+        self._task.cancel()
+
+
+class SpeculationStats:
+    """Статистика спекулятивных запросов: попадания, промахи и экономия времени."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.time_saved_s = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def record_hit(self, request: SpeculativeRequest):
+        """
+        Учитывает попадание: выигрыш — часть генерации, выполненная заранее.
+
+        Если ответ был готов до финального транскрипта, выигрыш равен всей
+        генерации, а не времени с момента старта запроса.
+        """
+        saved = request.generation_s
+        self.hits += 1
+        self.time_saved_s += saved
+        METRICS.increment("speculation.hits")
+        METRICS.observe("speculation.time_saved_s", saved)
+        logging.info(
+            f"Speculation hit: {saved:.2f} s of generation done in advance "
+            f"(hit rate {self.hit_rate:.0%}, total saved {self.time_saved_s:.1f} s)."
+        )
+
+    def record_miss(self, request: SpeculativeRequest, final_transcript: str):
+        """Учитывает промах: спекулятивная генерация была потрачена впустую."""
+        wasted = request.generation_s
+        self.misses += 1
+        METRICS.increment("speculation.misses")
+        METRICS.increment("speculation.wasted_tokens", request.token_count)
+        logging.info(
+            f"Speculation miss: '{request.transcript}' != '{final_transcript}', "
+            f"{request.token_count} tokens and {wasted:.2f} s of generation wasted "
+            f"(hit rate {self.hit_rate:.0%})."
+        )
+
+
+class PartialTranscriber:
+    """
+    Распознавание частичных фраз в том же пуле, что и финальное.
+
+    Пул "stt" однопоточный: Whisper нельзя вызывать параллельно, поэтому
+    финальное распознавание встает в очередь за частичными. Чтобы оно ждало
+    не больше одного уже идущего задания, в очереди держится только последнее
+    частичное задание, а после `stop()` (запись закончилась) еще не начатые
+    задания пропускаются.
+    """
+
+    def __init__(self, executor: Executor):
+        self.executor = executor
+        self._active = threading.Event()
+        self._pending: Optional[Future] = None
+
+    def start(self):
+        """Разрешает частичное распознавание (началась запись команды)."""
+        self._active.set()
+
+    def stop(self):
+        """Запрещает частичное распознавание и снимает задание из очереди."""
+        self._active.clear()
+        if self._pending:
+            self._pending.cancel()
+            self._pending = None
+
+    async def transcribe(
+        self, transcribe: Callable[[np.ndarray], Optional[str]], audio: np.ndarray
+    ) -> Optional[str]:
+        """
+        Распознает частичную фразу в пуле.
+
+        Returns:
+            Транскрипт или None, если запись уже закончилась или задание
+            вытеснено более новой частичной фразой.
+        """
+        if not self._active.is_set():
+            return None
+        if self._pending:
+            # Еще не начатое задание по более короткой фразе уже не нужно
+            self._pending.cancel()
+
+        def job():
+            # Проверка в потоке пула: запись могла закончиться, пока задание ждало
+            return transcribe(audio) if self._active.is_set() else None
+
+        self._pending = future = self.executor.submit(job)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Снято само задание, а не ожидающая его задача
+            if future.cancelled() and not asyncio.current_task().cancelling():
+                return None
+            raise
+        finally:
+            if self._pending is future:
+                self._pending = None
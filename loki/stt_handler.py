@@ -7,9 +7,175 @@
 """
 import whisper
 import logging
+import math
 import os
-from typing import Optional
-from .utils import time_it
+import threading
+import time
+import types
+import dataclasses
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch import nn
+from typing import Any, Dict, Optional
+from whisper.audio import N_SAMPLES_PER_TOKEN, SAMPLE_RATE
+
+from loki import config
+from .utils import env_flag, time_it
+
+
+def _encoder_forward_variable_ctx(self, x):
+    """
+    Замена `AudioEncoder.forward`, допускающая укороченный аудиоконтекст.
+
+    Оригинальный метод требует ровно 1500 позиций (30 секунд аудио). Здесь
+    позиционные эмбеддинги обрезаются до фактической длины входа, поэтому
+    энкодер можно запускать на окне, соразмерном длине фразы. Для полного
+    окна поведение полностью совпадает с оригиналом.
+    """
+    x = F.gelu(self.conv1(x))
+    x = F.gelu(self.conv2(x))
+    x = x.permute(0, 2, 1)
+
+    n_audio_ctx = x.shape[1]
+    assert n_audio_ctx <= self.positional_embedding.shape[0], "audio is too long"
+    x = (x + self.positional_embedding[:n_audio_ctx]).to(x.dtype)
+
+    for block in self.blocks:
+        x = block(x)
+
+    x = self.ln_post(x)
+    return x
+
+
+def _replace_linear_layers(module: nn.Module):
+    """
+    Заменяет `whisper.model.Linear` на обычные `nn.Linear` с теми же весами.
+
+    `quantize_dynamic` сопоставляет модули по точному типу, поэтому подкласс
+    Whisper (он лишь приводит веса к dtype входа) иначе остался бы в fp32.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, whisper.model.Linear):
+            linear = nn.Linear(
+                child.in_features, child.out_features, bias=child.bias is not None
+            )
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            _replace_linear_layers(child)
+
+
+def quantize_model(model: whisper.Whisper) -> whisper.Whisper:
+    """
+    Применяет динамическое int8-квантование к линейным слоям модели.
+
+    Веса линейных слоев энкодера и декодера хранятся в int8, активации
+    квантуются на лету. Свертки энкодера и проекция на словарь (через матрицу
+    эмбеддингов токенов) остаются в fp32.
+    """
+    _replace_linear_layers(model)
+    return torch.ao.quantization.quantize_dynamic(
+        model, {nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def _quantized_cache_path(model_name: str) -> str:
+    """Путь к кэшу квантованной модели; версии библиотек входят в имя файла."""
+    cache_dir = os.path.expanduser(
+        os.getenv("LOKI_STT_QUANTIZED_CACHE_DIR", config.WHISPER_QUANTIZED_CACHE_DIR)
+    )
+    return os.path.join(
+        cache_dir,
+        f"{model_name}-int8-torch{torch.__version__}-whisper{whisper.__version__}.pt",
+    )
+
+
+def load_quantized_model(model_name: str) -> whisper.Whisper:
+    """
+    Загружает int8-квантованную модель Whisper из кэша или создает ее.
+
+    При первом запуске модель загружается в fp32, квантуется и сохраняется
+    на диск; последующие запуски читают готовую модель. Поврежденный или
+    несовместимый кэш пересоздается.
+    """
+    cache_path = _quantized_cache_path(model_name)
+    if os.path.exists(cache_path):
+        try:
+            model = torch.load(cache_path, map_location="cpu", weights_only=False)
+            logging.info(f"Loaded quantized Whisper model from cache: {cache_path}")
+            return model
+        except Exception as e:
+            logging.warning(f"Quantized model cache is unusable, rebuilding: {e}")
+
+    model = whisper.load_model(model_name, device="cpu")
+    start = time.perf_counter()
+    quantize_model(model)
+    logging.info(
+        f"Quantized Whisper '{model_name}' to int8 in {time.perf_counter() - start:.2f} s."
+    )
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Пишем во временный файл, чтобы прерванная запись не испортила кэш
+        tmp_path = f"{cache_path}.tmp"
+        torch.save(model, tmp_path)
+        os.replace(tmp_path, cache_path)
+        logging.info(f"Quantized model cached at {cache_path}")
+    except OSError as e:
+        logging.warning(f"Failed to cache quantized model: {e}")
+    return model
+
+
+def _shared_model_path(model_name: str) -> str:
+    """Путь к общему файлу модели fp32; версии библиотек входят в имя файла."""
+    cache_dir = os.path.expanduser(
+        os.getenv("LOKI_SHARED_WEIGHTS_DIR", config.SHARED_WEIGHTS_DIR)
+    )
+    return os.path.join(
+        cache_dir,
+        f"{os.path.basename(model_name)}-fp32-torch{torch.__version__}"
+        f"-whisper{whisper.__version__}.pt",
+    )
+
+
+def prepare_shared_model(model_name: str) -> str:
+    """
+    Создает общий файл модели Whisper для отображения в память, если его нет.
+
+    Чекпойнты Whisper хранятся в fp16 и при загрузке приводятся к fp32, поэтому
+    каждый процесс держит собственную копию весов. Здесь модель один раз
+    сохраняется уже в fp32. Вызывается родительским процессом до запуска
+    воркеров, чтобы они не создавали файл одновременно.
+
+    Returns:
+        str: Путь к файлу модели.
+    """
+    path = _shared_model_path(model_name)
+    if os.path.exists(path):
+        return path
+    model = whisper.load_model(model_name, device="cpu")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Пишем во временный файл, чтобы прерванная запись не испортила модель
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, path)
+    logging.info(f"Shared Whisper model written to {path}")
+    return path
+
+
+def load_shared_model(model_name: str) -> whisper.Whisper:
+    """
+    Загружает Whisper с весами, отображенными в память из общего файла.
+
+    Тензоры модели ссылаются на страницы файла в page cache (`torch.load` с
+    mmap=True) и не копируются, поэтому все процессы, загрузившие одну модель,
+    делят одну физическую копию весов, а загрузка сводится к разбору структуры.
+    """
+    path = prepare_shared_model(model_name)
+    model = torch.load(path, map_location="cpu", mmap=True, weights_only=False)
+    logging.info(f"Attached shared Whisper model: {path}")
+    return model
 
 
 class WhisperSTT:
@@ -17,21 +183,166 @@ class WhisperSTT:
     Класс для транскрибации аудио с использованием модели Whisper.
     """
 
-    def __init__(self, model_name: str = "base"):
+    def __init__(
+        self,
+        model_name: str = "base",
+        command_mode: bool = False,
+        profile: str = config.DEFAULT_WHISPER_PROFILE,
+        quantize: Optional[bool] = None,
+        shared_weights: Optional[bool] = None,
+    ):
         """
         Инициализирует и загружает указанную модель Whisper.
 
         Args:
             model_name (str): Название модели Whisper для загрузки (e.g., "base", "small").
+            command_mode (bool): Включает быстрый путь для коротких фраз, при котором
+                энкодер обрабатывает только часть 30-секундного окна.
+            profile (str): Имя профиля декодирования из `WHISPER_DECODING_PROFILES`.
+            quantize (Optional[bool]): Загрузить int8-квантованную модель.
+                По умолчанию берется из переменной окружения LOKI_STT_QUANTIZE.
+            shared_weights (Optional[bool]): Отобразить веса в память из общего
+                файла (см. `load_shared_model`). Не сочетается с int8. По умолчанию
+                берется из переменной окружения LOKI_SHARED_WEIGHTS.
+
+        Raises:
+            ValueError: Если профиль декодирования не найден.
         """
+        self.profile = profile
+        self.decode_options(profile)  # Ошибка в имени профиля видна сразу при старте
         logging.info(f"Loading Whisper STT model '{model_name}'...")
         # Принудительно используем CPU. На Windows с AMD GPU запуск на GPU
         # требует сложной настройки ROCm, которая часто нестабильна.
         # CPU-вариант надежнее для данного проекта.
         device = "cpu"
         logging.info(f"Whisper will use CPU for stability.")
-        self.model = whisper.load_model(model_name, device=device)
-        logging.info("Whisper STT model loaded successfully.")
+        if quantize is None:
+            quantize = env_flag("LOKI_STT_QUANTIZE")
+        self.quantized = quantize
+        if shared_weights is None:
+            shared_weights = env_flag("LOKI_SHARED_WEIGHTS")
+        if quantize:
+            if shared_weights:
+                logging.info("Shared weights are not used with the int8 model.")
+            self.model = load_quantized_model(model_name)
+        elif shared_weights:
+            self.model = load_shared_model(model_name)
+        else:
+            self.model = whisper.load_model(model_name, device=device)
+        # Декодер Whisper навешивает KV-cache хуки на общие модули модели,
+        # поэтому параллельные вызовы из разных потоков нужно сериализовать.
+        self._lock = threading.Lock()
+        self.command_mode = command_mode
+        if command_mode:
+            # Патчим только экземпляр энкодера: остальные модели в процессе не затрагиваются
+            self.model.encoder.forward = types.MethodType(
+                _encoder_forward_variable_ctx, self.model.encoder
+            )
+            logging.info("Whisper command mode enabled (short-utterance fast path).")
+        logging.info(
+            f"Whisper STT model loaded successfully. Decoding profile: '{profile}', "
+            f"int8: {quantize}."
+        )
+
+    @staticmethod
+    def decode_options(profile: str) -> Dict[str, Any]:
+        """
+        Возвращает параметры декодирования для указанного профиля.
+
+        Raises:
+            ValueError: Если профиль не найден в `WHISPER_DECODING_PROFILES`.
+        """
+        try:
+            return dict(config.WHISPER_DECODING_PROFILES[profile])
+        except KeyError:
+            raise ValueError(
+                f"Неизвестный профиль декодирования Whisper '{profile}'. "
+                f"Доступные: {', '.join(config.WHISPER_DECODING_PROFILES)}."
+            ) from None
+
+    def audio_ctx_for(self, n_samples: int) -> int:
+        """
+        Вычисляет размер аудиоконтекста энкодера для фразы заданной длины.
+
+        Один шаг контекста соответствует 20 мс аудио. К длине фразы добавляется
+        запас `WHISPER_AUDIO_CTX_MARGIN_S`, результат ограничен полным окном модели.
+
+        Args:
+            n_samples (int): Длина аудио в семплах (16 кГц).
+
+        Returns:
+            int: Количество позиций аудиоконтекста.
+        """
+        margin = int(config.WHISPER_AUDIO_CTX_MARGIN_S * SAMPLE_RATE)
+        n_audio_ctx = math.ceil((n_samples + margin) / N_SAMPLES_PER_TOKEN)
+        return min(n_audio_ctx, self.model.dims.n_audio_ctx)
+
+    def _transcribe_short(self, audio: np.ndarray, options: Dict[str, Any]) -> str:
+        """
+        Транскрибирует короткую фразу, кодируя только соразмерный ей контекст.
+
+        Аудио дополняется тишиной до размера контекста (а не до 30 секунд),
+        после чего выполняется одиночное декодирование без таймстемпов. Из профиля
+        берутся только параметры `DecodingOptions`; каскад температур сводится
+        к первой температуре. Язык задается явно: автоопределение в Whisper
+        работает только с полным окном.
+        """
+        n_audio_ctx = self.audio_ctx_for(len(audio))
+        # Дополняем именно аудио, а не мел-спектрограмму: так дополненная часть
+        # нормализуется как тишина, ровно как в штатном `transcribe`.
+        audio = whisper.pad_or_trim(audio, n_audio_ctx * N_SAMPLES_PER_TOKEN)
+        mel = whisper.log_mel_spectrogram(audio, n_mels=self.model.dims.n_mels)
+        mel = mel[:, : n_audio_ctx * 2]
+        fields = {f.name for f in dataclasses.fields(whisper.DecodingOptions)}
+        decoding = {k: v for k, v in options.items() if k in fields}
+        if isinstance(decoding.get("temperature"), (tuple, list)):
+            decoding["temperature"] = decoding["temperature"][0]
+        # Как и в `whisper.transcribe`: best_of имеет смысл только для сэмплирования,
+        # а beam search — только для жадного декодирования.
+        if decoding.get("temperature", 0.0) == 0.0:
+            decoding.pop("best_of", None)
+        else:
+            decoding.pop("beam_size", None)
+            decoding.pop("patience", None)
+        decoding["language"] = decoding.get("language") or config.WHISPER_LANGUAGE
+        decoding.update(fp16=False, without_timestamps=True)
+        result = whisper.decode(self.model, mel, whisper.DecodingOptions(**decoding))
+        return result.text
+
+    def transcribe_audio(
+        self,
+        audio: np.ndarray,
+        short: Optional[bool] = None,
+        profile: Optional[str] = None,
+    ) -> str:
+        """
+        Транскрибирует аудио, уже загруженное в память.
+
+        Args:
+            audio (np.ndarray): Моно-сигнал float32 с частотой 16 кГц.
+            short (Optional[bool]): Принудительно выбрать быстрый (True) или полный
+                (False) путь. По умолчанию быстрый путь используется в command mode
+                для фраз не длиннее `WHISPER_SHORT_AUDIO_MAX_S`.
+            profile (Optional[str]): Профиль декодирования для этого вызова.
+                По умолчанию используется профиль, заданный при создании.
+
+        Returns:
+            str: Распознанный текст.
+        """
+        if short is None:
+            short = (
+                self.command_mode
+                and len(audio) <= config.WHISPER_SHORT_AUDIO_MAX_S * SAMPLE_RATE
+            )
+        options = self.decode_options(profile or self.profile)
+        with self._lock:
+            if short:
+                text = self._transcribe_short(audio, options)
+            else:
+                # fp16=False необходимо для работы на CPU.
+                options["fp16"] = False
+                text = self.model.transcribe(audio, **options).get("text", "")
+        return text.strip()
 
     @time_it
     def transcribe(self, audio_path: str) -> Optional[str]:
@@ -51,9 +362,7 @@ class WhisperSTT:
             return None
         try:
             logging.info(f"Transcribing audio file: {audio_path}")
-            # fp16=False необходимо для работы на CPU.
-            result = self.model.transcribe(audio_path, fp16=False)
-            text = result.get("text", "").strip()
+            text = self.transcribe_audio(whisper.load_audio(audio_path))
             logging.info(f"Transcription result: '{text}'")
             return text
         except Exception as e:
@@ -69,3 +378,23 @@ class WhisperSTT:
                     logging.error(
                         f"Failed to remove temporary audio file {audio_path}: {e}"
                     )
+
+
+def get_stt_engine(
+    model_name: str = "base",
+    command_mode: bool = False,
+    profile: str = config.DEFAULT_WHISPER_PROFILE,
+):
+    """
+    Фабричная функция, которая создает STT-движок.
+
+    Если задана переменная окружения LOKI_STT_WORKER_PROCESS, модель
+    загружается в отдельном процессе (`WhisperSTTProcess`), иначе — в текущем.
+    Оба варианта имеют одинаковый API.
+    """
+    if env_flag("LOKI_STT_WORKER_PROCESS"):
+        from loki.stt_worker import WhisperSTTProcess
+
+        logging.info("STT runs in a dedicated worker process.")
+        return WhisperSTTProcess(model_name, command_mode=command_mode, profile=profile)
+    return WhisperSTT(model_name, command_mode=command_mode, profile=profile)
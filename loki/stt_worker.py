@@ -0,0 +1,326 @@
+# loki/stt_worker.py
+"""
+Выделенный процесс для Speech-to-Text (STT).
+
+Whisper выполняет тяжелые вычисления torch на CPU. В основном процессе они
+конкурируют с потоком чтения микрофона и event loop, из-за чего возникают
+переполнения аудиобуфера. Этот модуль выносит модель в отдельный процесс,
+который держит ее загруженной между запросами.
+
+Аудио передается через разделяемую память (`multiprocessing.shared_memory`):
+по каналу отправляются только имя сегмента и длина сигнала, а не копия массива.
+Класс `WhisperSTTProcess` повторяет API `WhisperSTT`, поэтому оркестратор
+работает с ним так же, как с обычным движком.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, Type
+
+import numpy as np
+
+from loki import config
+from loki.wav import load_wav
+from .utils import env_flag, time_it
+
+# Интервал (в секундах), с которым ожидающий поток проверяет отмену и состояние воркера
+_POLL_INTERVAL_S = 0.05
+# Минимальный размер сегмента разделяемой памяти: 30 секунд аудио float32
+_MIN_SHM_BYTES = 30 * config.AUDIO_RATE * 4
+
+
+class TranscriptionCancelled(Exception):
+    """Транскрибация была отменена вызовом `WhisperSTTProcess.cancel()`."""
+
+
+def _worker_main(
+    conn, engine_cls: Optional[Type], model_name: str, command_mode: bool, profile: str
+):
+    """
+    Точка входа процесса-воркера.
+
+    Загружает модель один раз и обрабатывает задания из канала до получения
+    команды остановки или закрытия канала родительским процессом.
+    """
+    from loki.cpu_budget import CpuBudget, pin_current_thread
+
+    if engine_cls is None:
+        from loki.stt_handler import WhisperSTT as engine_cls
+
+    # Бюджет STT применяется к процессу-воркеру: потоки torch создаются из
+    # главного потока и наследуют его привязку к ядрам
+    budget = CpuBudget()
+    pin_current_thread(budget.get("stt").cpus)
+    budget.configure_torch("stt")
+    stt = engine_cls(model_name=model_name, command_mode=command_mode, profile=profile)
+    conn.send(("ready", os.getpid()))
+
+    shm = None
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        kind = message[0]
+        if kind == "stop":
+            break
+
+        _, job_id, source, n_samples, short, job_profile = message
+        try:
+            if kind == "audio":
+                # Подключаемся к сегменту родителя; сегмент переиспользуется между
+                # заданиями, пока родитель не пересоздаст его большего размера.
+                if shm is None or shm.name != source:
+                    if shm is not None:
+                        shm.close()
+                    shm = SharedMemory(name=source)
+                audio = np.ndarray((n_samples,), dtype=np.float32, buffer=shm.buf)
+                try:
+                    text = stt.transcribe_audio(audio, short=short, profile=job_profile)
+                finally:
+                    del audio  # Освобождаем view, иначе shm.close() упадет
+            else:
+                import whisper
+
+                audio = whisper.load_audio(source)
+                text = stt.transcribe_audio(audio, short=short, profile=job_profile)
+            conn.send(("result", job_id, text))
+        except Exception as e:
+            conn.send(("error", job_id, f"{type(e).__name__}: {e}"))
+
+    if shm is not None:
+        shm.close()
+
+
+class WhisperSTTProcess:
+    """
+    Транскрибация Whisper в отдельном процессе с тем же API, что у `WhisperSTT`.
+
+    Одновременно выполняется одно задание. Если воркер падает, он
+    автоматически перезапускается. Задание можно отменить из другого потока
+    через `cancel()`: воркер при этом завершается и перезапускается, так как
+    прервать вычисления torch изнутри невозможно.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "base",
+        command_mode: bool = False,
+        profile: str = config.DEFAULT_WHISPER_PROFILE,
+        engine_cls: Optional[Type] = None,
+    ):
+        """
+        Запускает процесс-воркер и дожидается загрузки модели.
+
+        Args:
+            model_name (str): Название модели Whisper для загрузки.
+            command_mode (bool): Включает быстрый путь для коротких фраз.
+            profile (str): Имя профиля декодирования из `WHISPER_DECODING_PROFILES`.
+            engine_cls (Optional[Type]): Класс движка в воркере с API `WhisperSTT`
+                (по умолчанию `WhisperSTT`); должен импортироваться по имени
+                в новом процессе.
+        """
+        if engine_cls is None:
+            from loki.stt_handler import WhisperSTT, prepare_shared_model
+
+            WhisperSTT.decode_options(profile)  # Проверяем профиль до запуска процесса
+            if env_flag("LOKI_SHARED_WEIGHTS") and not env_flag("LOKI_STT_QUANTIZE"):
+                # Общий файл создается один раз здесь, воркеры только отображают его
+                prepare_shared_model(model_name)
+        self.engine_cls = engine_cls
+        self.model_name = model_name
+        self.command_mode = command_mode
+        self.profile = profile
+        # spawn одинаково работает на Windows и Linux и не копирует состояние torch
+        self._ctx = multiprocessing.get_context("spawn")
+        self._job_lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._job_id = 0
+        self._shm: Optional[SharedMemory] = None
+        self._process = None
+        self._conn = None
+        self._start_worker()
+
+    def _start_worker(self):
+        """Запускает процесс-воркер и ждет сообщения о готовности."""
+        logging.info(f"Starting STT worker process for Whisper '{self.model_name}'...")
+        parent_conn, child_conn = self._ctx.Pipe()
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                self.engine_cls,
+                self.model_name,
+                self.command_mode,
+                self.profile,
+            ),
+            name="loki-stt-worker",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        try:
+            _, pid = self._conn.recv()
+        except EOFError:
+            raise RuntimeError("STT worker process exited during model loading.")
+        logging.info(f"STT worker process is ready (pid {pid}).")
+
+    def _stop_worker(self, graceful: bool = True):
+        """Останавливает процесс-воркер: сначала штатно, затем принудительно."""
+        if self._process is None:
+            return
+        if graceful and self._process.is_alive():
+            try:
+                self._conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout=5)
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def _restart_worker(self, reason: str):
+        """Перезапускает воркер после падения или отмены задания."""
+        logging.warning(f"Restarting STT worker process: {reason}.")
+        self._stop_worker(graceful=False)
+        self._start_worker()
+
+    def _shared_buffer(self, n_bytes: int) -> SharedMemory:
+        """Возвращает сегмент разделяемой памяти не меньше `n_bytes`."""
+        if self._shm is None or self._shm.size < n_bytes:
+            self._release_shared_buffer()
+            size = max(_MIN_SHM_BYTES, 1 << (n_bytes - 1).bit_length())
+            self._shm = SharedMemory(create=True, size=size)
+        return self._shm
+
+    def _release_shared_buffer(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _run_job(self, message: tuple) -> str:
+        """Отправляет задание воркеру и ждет результат, проверяя отмену и падение."""
+        if self._process is None or not self._process.is_alive():
+            self._restart_worker("worker is not running")
+        self._job_id += 1
+        job_id = self._job_id
+        self._conn.send((message[0], job_id) + message[1:])
+
+        while True:
+            if self._cancel_event.is_set():
+                self._restart_worker("transcription cancelled")
+                raise TranscriptionCancelled()
+            try:
+                if not self._conn.poll(_POLL_INTERVAL_S):
+                    if not self._process.is_alive():
+                        raise EOFError
+                    continue
+                kind, reply_id, payload = self._conn.recv()
+            except (EOFError, OSError):
+                exitcode = self._process.exitcode
+                self._restart_worker(f"worker crashed (exit code {exitcode})")
+                raise RuntimeError("STT worker process crashed during transcription.")
+            if reply_id != job_id:
+                continue  # Ответ на давно отмененное задание
+            if kind == "error":
+                raise RuntimeError(f"STT worker error: {payload}")
+            return payload
+
+    def transcribe_audio(
+        self,
+        audio: np.ndarray,
+        short: Optional[bool] = None,
+        profile: Optional[str] = None,
+    ) -> str:
+        """
+        Транскрибирует аудио, передавая его воркеру через разделяемую память.
+
+        Args:
+            audio (np.ndarray): Моно-сигнал с частотой 16 кГц.
+            short (Optional[bool]): См. `WhisperSTT.transcribe_audio`.
+            profile (Optional[str]): См. `WhisperSTT.transcribe_audio`.
+
+        Returns:
+            str: Распознанный текст.
+
+        Raises:
+            TranscriptionCancelled: Если задание было отменено.
+            RuntimeError: Если воркер упал или вернул ошибку.
+        """
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        with self._job_lock:
+            self._cancel_event.clear()
+            shm = self._shared_buffer(max(audio.nbytes, 1))
+            np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+            return self._run_job(("audio", shm.name, len(audio), short, profile))
+
+    def _transcribe_path(self, audio_path: str) -> str:
+        """Транскрибирует файл: WAV читается здесь, прочие форматы — в воркере."""
+        try:
+            audio = load_wav(audio_path)
+        except (ValueError, EOFError) as e:
+            logging.debug(f"Passing {audio_path} to the STT worker as a path: {e}")
+            with self._job_lock:
+                self._cancel_event.clear()
+                return self._run_job(("path", audio_path, 0, None, None))
+        return self.transcribe_audio(audio)
+
+    @time_it
+    def transcribe(self, audio_path: str) -> Optional[str]:
+        """
+        Транскрибирует аудиофайл в текст.
+
+        После транскрибации временный аудиофайл автоматически удаляется.
+
+        Args:
+            audio_path (str): Путь к аудиофайлу для транскрибации.
+
+        Returns:
+            Optional[str]: Распознанный текст или None в случае ошибки или отмены.
+        """
+        if not os.path.exists(audio_path):
+            logging.error(f"Audio file not found at: {audio_path}")
+            return None
+        try:
+            logging.info(f"Transcribing audio file in STT worker: {audio_path}")
+            text = self._transcribe_path(audio_path)
+            logging.info(f"Transcription result: '{text}'")
+            return text
+        except TranscriptionCancelled:
+            logging.info("Transcription was cancelled.")
+            return None
+        except Exception as e:
+            logging.error(f"An error occurred during transcription: {e}")
+            return None
+        finally:
+            if os.path.exists(audio_path):
+                try:
+                    os.remove(audio_path)
+                except Exception as e:
+                    logging.error(
+                        f"Failed to remove temporary audio file {audio_path}: {e}"
+                    )
+
+    def cancel(self):
+        """
+        Отменяет текущую транскрибацию (если она выполняется).
+
+        Безопасно вызывать из любого потока. Ожидающий вызов `transcribe`
+        вернет None, а воркер будет перезапущен с уже загруженной заново моделью.
+        """
+        if self._job_lock.locked():
+            self._cancel_event.set()
+
+    def close(self):
+        """Останавливает процесс-воркер и освобождает разделяемую память."""
+        self.cancel()
+        with self._job_lock:
+            self._stop_worker()
+            self._release_shared_buffer()
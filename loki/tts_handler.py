@@ -6,12 +6,162 @@
 Поддерживает как блокирующее, так и потоковое воспроизведение для максимальной
 гибкости и отзывчивости.
 """
+import asyncio
+import collections
+import json
 import logging
-import sounddevice as sd
+import re
 import numpy as np
+import onnxruntime
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from piper.config import PiperConfig
 from piper.voice import PiperVoice
 import os
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List, Optional
+
+from loki import config
+from loki.turn_profiler import PROFILER
+from loki.utils import env_flag
+
+# Кандидат на границу предложения: знак конца предложения, пробел и начало
+# нового предложения (заглавная буква, цифра, кавычка), либо перевод строки.
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?…])\s+(?=[A-ZА-ЯЁ0-9«\"(])|\n+")
+# Сокращения, после точки которых предложение не заканчивается ("ул. Ленина").
+# Однобуквенные сокращения, инициалы и сокращения с точкой внутри ("г.",
+# "А. С.", "т.е.") распознаются без списка.
+ABBREVIATIONS = frozenset(
+    {"ул", "пр", "пл", "стр", "им", "обл", "пос", "св", "проф", "акад", "др"}
+    | {"тыс", "млн", "млрд", "руб", "коп", "мин", "сек", "напр", "см", "гг", "вв"}
+)
+# Однобуквенные слова, которые могут закончить предложение ("Это я.")
+ONE_LETTER_WORDS = frozenset("аиявсоук")
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def _ends_with_abbreviation(text: str) -> bool:
+    """Заканчивается ли текст сокращением с точкой ("г.", "т.е.", "ул.")."""
+    if not text.endswith("."):
+        return False
+    words = text[:-1].split()
+    word = words[-1].lstrip('(«"') if words else ""
+    if len(word) == 1 and word.isalpha():
+        # Заглавная буква — инициал, строчная — сокращение вроде "г."
+        return word.isupper() or word not in ONE_LETTER_WORDS
+    return "." in word or word.lower() in ABBREVIATIONS
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Делит текст на предложения для конвейерного синтеза.
+
+    Точка после сокращения не считается концом предложения, поэтому
+    "Погода в г. Москва" остается одним предложением. Перевод строки
+    всегда завершает предложение.
+
+    Returns:
+        List[str]: Непустые предложения в исходном порядке.
+    """
+    parts, start = [], 0
+    for match in SENTENCE_BOUNDARY_PATTERN.finditer(text):
+        head = text[start : match.start()]
+        if "\n" not in match.group() and _ends_with_abbreviation(head):
+            continue
+        parts.append(head)
+        start = match.end()
+    parts.append(text[start:])
+    return [s.strip() for s in parts if s.strip()]
+
+
+def create_session_options(
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+    graph_optimization: str = "all",
+) -> onnxruntime.SessionOptions:
+    """
+    Собирает параметры сессии onnxruntime для голосовой модели.
+
+    Args:
+        intra_op_threads (int): Потоки внутри одного оператора (0 — по умолчанию).
+        inter_op_threads (int): Потоки между операторами (0 — по умолчанию).
+        graph_optimization (str): "disable", "basic", "extended" или "all".
+
+    Raises:
+        ValueError: Если указан неизвестный уровень оптимизации графа.
+    """
+    if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(
+            f"Неизвестный уровень оптимизации графа '{graph_optimization}'. "
+            f"Допустимые значения: {', '.join(GRAPH_OPTIMIZATION_LEVELS)}."
+        )
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    return options
+
+
+def _shared_voice_path(model_path: str, graph_optimization: str) -> str:
+    """Путь к общей копии голоса; время изменения и версия onnxruntime входят в имя."""
+    cache_dir = os.path.expanduser(
+        os.getenv("LOKI_SHARED_WEIGHTS_DIR", config.SHARED_WEIGHTS_DIR)
+    )
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    stamp = int(os.path.getmtime(model_path))
+    return os.path.join(
+        cache_dir,
+        f"{name}-{graph_optimization}-{stamp}-ort{onnxruntime.__version__}",
+        "model.onnx",
+    )
+
+
+def prepare_shared_voice(model_path: str, graph_optimization: str = "all") -> str:
+    """
+    Сохраняет оптимизированный граф голоса Piper с весами во внешнем файле.
+
+    Веса, встроенные в `.onnx`, onnxruntime читает в память каждого процесса, а
+    веса во внешнем файле отображает в память (mmap), и процессы делят одну их
+    копию в page cache. Граф сохраняется уже оптимизированным, поэтому процессы
+    загружают его без повторной оптимизации. Копия годится только для этой
+    машины: оптимизации уровня "all" зависят от процессора.
+
+    Returns:
+        str: Путь к `.onnx` общей копии.
+    """
+    path = _shared_voice_path(model_path, graph_optimization)
+    if os.path.exists(path):
+        return path
+    # Граф и веса пишутся во временный каталог, который затем переименовывается
+    # целиком: внешний файл указан в графе по относительному имени
+    target_dir = os.path.dirname(path)
+    tmp_dir = f"{target_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    options = create_session_options(graph_optimization=graph_optimization)
+    options.optimized_model_filepath = os.path.join(tmp_dir, "model.onnx")
+    options.add_session_config_entry(
+        "session.optimized_model_external_initializers_file_name", "model.onnx.data"
+    )
+    options.add_session_config_entry(
+        "session.optimized_model_external_initializers_min_size_in_bytes", "1024"
+    )
+    onnxruntime.InferenceSession(
+        str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+    try:
+        os.replace(tmp_dir, target_dir)
+    except OSError:
+        # Другой процесс успел подготовить ту же копию
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(path):
+            raise
+    logging.info(f"Shared Piper voice written to {target_dir}")
+    return path
 
 
 class Piper_Engine:
@@ -19,12 +169,36 @@ class Piper_Engine:
     Класс для синтеза речи с использованием движка Piper TTS.
     """
 
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        intra_op_threads: Optional[int] = None,
+        inter_op_threads: Optional[int] = None,
+        graph_optimization: Optional[str] = None,
+        synthesis_workers: Optional[int] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+        shared_weights: Optional[bool] = None,
+    ):
         """
         Инициализирует и загружает голосовую модель Piper.
 
+        Параметры, не переданные явно, берутся из переменных окружения
+        (LOKI_PIPER_INTRA_OP_THREADS, LOKI_PIPER_INTER_OP_THREADS,
+        LOKI_PIPER_GRAPH_OPTIMIZATION, LOKI_PIPER_SYNTHESIS_WORKERS), а затем
+        из `config`.
+
         Args:
             model_path (str): Путь к файлу голосовой модели `.onnx`.
+            intra_op_threads (Optional[int]): Потоки onnxruntime внутри оператора.
+            inter_op_threads (Optional[int]): Потоки onnxruntime между операторами.
+            graph_optimization (Optional[str]): Уровень оптимизации графа.
+            synthesis_workers (Optional[int]): Сколько предложений синтезируется
+                параллельно с воспроизведением.
+            executor (Optional[ThreadPoolExecutor]): Внешний пул для синтеза
+                (например, из `CpuBudget`). Движок его не закрывает.
+            shared_weights (Optional[bool]): Загрузить общую копию голоса с весами,
+                отображенными в память (см. `prepare_shared_voice`). По умолчанию
+                берется из переменной окружения LOKI_SHARED_WEIGHTS.
 
         Raises:
             FileNotFoundError: Если файл модели по указанному пути не найден.
@@ -33,11 +207,90 @@ class Piper_Engine:
         if not model_path or not os.path.exists(model_path):
             raise FileNotFoundError(f"Piper model file not found at: {model_path}")
 
-        self.voice = PiperVoice.load(model_path)
+        if intra_op_threads is None:
+            intra_op_threads = int(
+                os.getenv("LOKI_PIPER_INTRA_OP_THREADS", config.PIPER_INTRA_OP_THREADS)
+            )
+        if inter_op_threads is None:
+            inter_op_threads = int(
+                os.getenv("LOKI_PIPER_INTER_OP_THREADS", config.PIPER_INTER_OP_THREADS)
+            )
+        if graph_optimization is None:
+            graph_optimization = os.getenv(
+                "LOKI_PIPER_GRAPH_OPTIMIZATION", config.PIPER_GRAPH_OPTIMIZATION
+            )
+        if synthesis_workers is None:
+            synthesis_workers = int(
+                os.getenv(
+                    "LOKI_PIPER_SYNTHESIS_WORKERS", config.PIPER_SYNTHESIS_WORKERS
+                )
+            )
+        if shared_weights is None:
+            shared_weights = env_flag("LOKI_SHARED_WEIGHTS")
+        session_path = model_path
+        if shared_weights:
+            session_path = prepare_shared_voice(model_path, graph_optimization)
+            # Граф уже оптимизирован; предварительная упаковка весов скопировала
+            # бы их в память процесса
+            session_options = create_session_options(
+                intra_op_threads, inter_op_threads, "disable"
+            )
+            session_options.add_session_config_entry("session.disable_prepacking", "1")
+        else:
+            session_options = create_session_options(
+                intra_op_threads, inter_op_threads, graph_optimization
+            )
+        self.voice = self._load_voice(model_path, session_options, session_path)
         self.sample_rate = self.voice.config.sample_rate
+        self.synthesis_workers = max(1, synthesis_workers)
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=self.synthesis_workers, thread_name_prefix="loki-tts"
+        )
         logging.info(
             f"Piper TTS model loaded successfully. Sample rate: {self.sample_rate} Hz"
         )
+        logging.info(
+            f"Piper session: intra_op={intra_op_threads}, inter_op={inter_op_threads}, "
+            f"graph_optimization={graph_optimization}, "
+            f"synthesis_workers={self.synthesis_workers}"
+        )
+
+    @staticmethod
+    def _load_voice(
+        model_path: str,
+        session_options: onnxruntime.SessionOptions,
+        session_path: Optional[str] = None,
+    ) -> PiperVoice:
+        """
+        Загружает голос Piper с заданными параметрами сессии onnxruntime.
+
+        `PiperVoice.load` всегда создает сессию с настройками по умолчанию,
+        поэтому сессия и конфигурация голоса собираются здесь вручную.
+        Граф берется из `session_path` (общая копия), если он задан.
+        """
+        with open(f"{model_path}.json", "r", encoding="utf-8") as config_file:
+            voice_config = PiperConfig.from_dict(json.load(config_file))
+        session = onnxruntime.InferenceSession(
+            str(session_path or model_path),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+        return PiperVoice(session=session, config=voice_config)
+
+    def synthesize(self, text: str) -> bytes:
+        """
+        Синтезирует речь целиком и возвращает ее без воспроизведения.
+
+        Args:
+            text (str): Текст для синтеза.
+
+        Returns:
+            bytes: Сырые аудиоданные в формате int16 с частотой `sample_rate`.
+        """
+        return b"".join(
+            chunk.audio_int16_bytes for chunk in self.voice.synthesize(text)
+        )
 
     def speak(self, text: str):
         """
@@ -52,9 +305,8 @@ class Piper_Engine:
         """
         try:
             logging.info(f"Synthesizing speech for: '{text}'")
-            audio_generator = self.voice.synthesize(text)
             # Собираем все аудио-чанки в один байтовый массив
-            audio_bytes = b"".join(chunk.audio_int16_bytes for chunk in audio_generator)
+            audio_bytes = self.synthesize(text)
 
             if not audio_bytes:
                 logging.warning("Synthesis resulted in empty audio. Nothing to play.")
@@ -63,6 +315,9 @@ class Piper_Engine:
             # Преобразуем байты в массив numpy для воспроизведения
             audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
             logging.info("Playing synthesized audio...")
+            # Импорт здесь: синтез в файл (пакетный режим) работает без PortAudio
+            import sounddevice as sd
+
             sd.play(audio_array, samplerate=self.sample_rate)
             sd.wait()  # Блокируем выполнение до окончания воспроизведения
             logging.info("Playback finished.")
@@ -76,10 +331,11 @@ class Piper_Engine:
         """
         Асинхронно синтезирует речь и отдает аудиоданные по частям (чанками).
 
-        Этот метод является асинхронным генератором, который позволяет начать
-        воспроизведение аудио до того, как вся фраза будет синтезирована.
-        Идеально для длинных ответов LLM, чтобы минимизировать задержку
-        и улучшить воспринимаемую отзывчивость ассистента.
+        Текст делится на предложения. Пока потребитель воспроизводит
+        предложение N, следующие предложения синтезируются в пуле потоков
+        (не более `synthesis_workers` наперед). Аудио отдается строго в
+        порядке предложений, порциями по `PIPER_PLAYBACK_CHUNK_MS`, чтобы
+        озвучку можно было быстро прервать.
 
         Args:
             text (str): Текст для синтеза.
@@ -87,13 +343,43 @@ class Piper_Engine:
         Yields:
             bytes: Сырые аудиоданные (чанки) в формате int16.
         """
+        loop = asyncio.get_running_loop()
+        sentences = iter(split_sentences(text))
+        pending = collections.deque()
+
+        def submit_next():
+            sentence = next(sentences, None)
+            if sentence is not None:
+                synthesize = PROFILER.wrap("tts.synthesize", self.synthesize)
+                pending.append(
+                    loop.run_in_executor(self._executor, synthesize, sentence)
+                )
+
+        for _ in range(self.synthesis_workers):
+            submit_next()
+
+        chunk_bytes = 2 * int(self.sample_rate * config.PIPER_PLAYBACK_CHUNK_MS / 1000)
         try:
-            audio_generator = self.voice.synthesize(text)
-            for chunk in audio_generator:
-                if chunk.audio_int16_bytes:
-                    yield chunk.audio_int16_bytes
-        except Exception as e:
-            logging.error(
-                f"An error occurred during Piper TTS synthesis stream: {e}",
-                exc_info=True,
-            )
+            while pending:
+                try:
+                    audio = await pending.popleft()
+                except Exception as e:
+                    logging.error(
+                        f"An error occurred during Piper TTS synthesis stream: {e}",
+                        exc_info=True,
+                    )
+                    continue
+                finally:
+                    # Освободившийся слот сразу занимаем следующим предложением
+                    submit_next()
+                for offset in range(0, len(audio), chunk_bytes):
+                    yield audio[offset : offset + chunk_bytes]
+        finally:
+            # При прерывании озвучки отменяем еще не начатый синтез
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        """Останавливает пул синтеза (вызывается при выгрузке движка)."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
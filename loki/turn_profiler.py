@@ -0,0 +1,214 @@
+# loki/turn_profiler.py
+"""
+Профилирование отдельных ходов по запросу.
+
+Когда ход в работе оказывается медленным, одной строки лога мало.
+`TurnProfiler` по команде профилирует следующие N вызовов
+`handle_command_async` целиком и пишет для каждого хода два файла:
+
+- `turn-<время>.prof` — профиль cProfile потока event loop (pstats;
+  открывается snakeviz, gprof2dot, `python -m pstats`);
+- `turn-<время>.trace.json` — Chrome Trace Event: отрезки времени работы
+  в executor'ах (STT, синтез Piper, запись в аудиоустройство) и этапов хода
+  по потокам; открывается в chrome://tracing или https://ui.perfetto.dev.
+
+Включение:
+- LOKI_PROFILE_TURNS=N — профилировать первые N ходов после старта;
+- сигнал SIGUSR1 (POSIX) — профилировать `config.PROFILE_SIGNAL_TURNS` ходов;
+- LOKI_PROFILE_PORT=<порт> — локальный TCP-порт управления на 127.0.0.1:
+  строка "profile N" включает профилирование N ходов (удобно на Windows,
+  где нет SIGUSR1), например `echo profile 3 | nc 127.0.0.1 <порт>`;
+  строка "metrics" возвращает снимок `METRICS` в JSON.
+
+Пока профилирование не включено, `turn()`, `span()` и `wrap()` сводятся к
+проверке одного атрибута и возвращают общий пустой контекст или исходную
+функцию, так что в обычной работе профайлер ничего не стоит.
+"""
+import asyncio
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Callable, List, Optional
+
+from loki import config
+from loki.metrics import METRICS
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class TurnProfiler:
+    """Профилирует ближайшие N ходов оркестратора по запросу."""
+
+    def __init__(self, output_dir: Optional[str] = None):
+        self.output_dir = output_dir or os.getenv(
+            "LOKI_PROFILE_DIR", config.PROFILE_OUTPUT_DIR
+        )
+        self._remaining = 0
+        # События трассировки текущего хода; None, пока ход не профилируется.
+        # list.append атомарен, поэтому потоки executor'ов пишут сюда без блокировки.
+        self._events: Optional[List[dict]] = None
+        self._origin = 0.0
+        self._server = None
+
+    @property
+    def armed(self) -> bool:
+        """Будет ли профилироваться следующий ход."""
+        return self._remaining > 0
+
+    def arm(self, turns: int = 1):
+        """Включает профилирование следующих `turns` ходов."""
+        self._remaining = max(0, int(turns))
+        logging.info(
+            f"Turn profiling armed for {self._remaining} turn(s), "
+            f"output: {os.path.abspath(self.output_dir)}"
+        )
+
+    def turn(self, name: str = "turn"):
+        """
+        Контекст одного хода.
+
+        Если профилирование включено, профилирует код хода cProfile и собирает
+        трассировку, а по выходе пишет файлы. Иначе возвращает пустой контекст.
+        """
+        if self._remaining <= 0:
+            return _NULL_CONTEXT
+        self._remaining -= 1
+        return self._capture(name)
+
+    @contextlib.contextmanager
+    def _capture(self, name: str):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Уже работает другой профайлер (например, ходы перекрылись)
+            logging.warning(f"Turn profiling skipped: {e}")
+            profile = None
+        self._events = []
+        self._origin = time.perf_counter()
+        try:
+            with self.span(name):
+                yield
+        finally:
+            if profile:
+                profile.disable()
+            events, self._events = self._events, None
+            self._write(profile, events)
+
+    def span(self, name: str, **args):
+        """
+        Контекст отрезка работы `name` в текущем потоке.
+
+        Пишется в трассировку, только пока профилируется ход.
+        """
+        if self._events is None:
+            return _NULL_CONTEXT
+        return self._span(name, args)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, args: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            events = self._events
+            if events is not None:
+                events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": (start - self._origin) * 1e6,
+                        "dur": (time.perf_counter() - start) * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                        "args": args,
+                    }
+                )
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """
+        Оборачивает функцию для executor'а так, чтобы ее работа попала в трассировку.
+
+        Вне профилируемого хода возвращает саму функцию.
+        """
+        if self._events is None:
+            return func
+
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            with self.span(name):
+                return func(*args, **kwargs)
+
+        return traced
+
+    def _write(self, profile: Optional[cProfile.Profile], events: List[dict]):
+        """Сохраняет профиль и трассировку хода в файлы с отметкой времени."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(self.output_dir, f"turn-{stamp}-{time.time_ns() % 10**6}")
+        # Имена потоков, чтобы в просмотрщике было видно loki-stt, loki-tts и т.д.
+        names = {t.ident: t.name for t in threading.enumerate()}
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {"name": names.get(tid, str(tid))},
+            }
+            for tid in {event["tid"] for event in events}
+        ]
+        with open(base + ".trace.json", "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events}, f)
+        if profile:
+            profile.dump_stats(base + ".prof")
+        logging.info(f"Turn profile written to {base}.*")
+
+    def install_signal_handler(self, loop: asyncio.AbstractEventLoop):
+        """Включает профилирование по SIGUSR1 (только POSIX)."""
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        try:
+            loop.add_signal_handler(
+                signal.SIGUSR1, self.arm, config.PROFILE_SIGNAL_TURNS
+            )
+        except (NotImplementedError, RuntimeError) as e:
+            logging.warning(f"Failed to install SIGUSR1 profiling handler: {e}")
+
+    async def start_control_server(self, port: int):
+        """Запускает локальный порт управления (только 127.0.0.1)."""
+
+        async def handle(reader, writer):
+            try:
+                line = (await reader.readline()).decode(errors="replace").split()
+                if line[:1] == ["profile"]:
+                    self.arm(int(line[1]) if len(line) > 1 else 1)
+                    writer.write(f"armed {self._remaining}\n".encode())
+                elif line[:1] == ["metrics"]:
+                    writer.write(json.dumps(METRICS.snapshot()).encode() + b"\n")
+                else:
+                    writer.write(b"usage: profile [turns] | metrics\n")
+                await writer.drain()
+            except (ValueError, ConnectionError) as e:
+                logging.warning(f"Profiling control request failed: {e}")
+            finally:
+                writer.close()
+
+        self._server = await asyncio.start_server(handle, "127.0.0.1", port)
+        logging.info(f"Profiling control listening on 127.0.0.1:{port}")
+
+    def close(self):
+        """Останавливает порт управления."""
+        if self._server:
+            self._server.close()
+            self._server = None
+
+
+# Глобальный профайлер: его используют оркестратор и движки
+PROFILER = TurnProfiler()
@@ -2,9 +2,13 @@
 """
 Модуль со вспомогательными утилитами и декораторами.
 """
+import math
+import os
+import re
 import time
 import logging
 from functools import wraps
+from typing import Sequence
 
 
 def time_it(func):
@@ -26,3 +30,70 @@ def time_it(func):
         return result
 
     return wrapper
+
+
+def normalize_transcript(text: str) -> str:
+    """
+    Приводит транскрипт к каноническому виду для сравнения.
+
+    Переводит текст в нижний регистр, заменяет "ё" на "е", удаляет пунктуацию
+    и схлопывает пробелы. Используется при оценке точности распознавания.
+    """
+    text = (text or "").lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Вычисляет WER (word error rate) между эталоном и гипотезой.
+
+    Оба текста предварительно нормализуются `normalize_transcript`.
+    WER = (замены + удаления + вставки) / количество слов в эталоне.
+
+    Returns:
+        float: WER; для пустого эталона 0.0, если гипотеза тоже пуста, иначе 1.0.
+    """
+    ref = normalize_transcript(reference).split()
+    hyp = normalize_transcript(hypothesis).split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    # Классическое расстояние Левенштейна по словам с одной строкой DP
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, start=1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """
+    Читает булев флаг из переменной окружения.
+
+    Истинными считаются значения "1", "true", "yes", "on" (без учета регистра).
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Вычисляет перцентиль q (0..100) методом ближайшего ранга.
+
+    Returns:
+        float: Значение перцентиля или 0.0 для пустой выборки.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
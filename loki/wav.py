@@ -0,0 +1,45 @@
+# loki/wav.py
+"""
+Чтение WAV-файлов без зависимостей от аудиоустройств.
+
+Модуль не импортирует pyaudio и webrtcvad, поэтому его можно использовать в
+процессе-воркере STT и в пакетном режиме на машинах без PortAudio.
+"""
+import wave
+
+import numpy as np
+
+from loki import config
+
+
+def load_wav(path: str) -> np.ndarray:
+    """
+    Читает WAV-файл в массив float32 в диапазоне [-1, 1] без вызова ffmpeg.
+
+    Поддерживается только формат, который пишет `record_command_vad`:
+    моно, 16 бит, частота `config.AUDIO_RATE`.
+
+    Args:
+        path (str): Путь к WAV-файлу.
+
+    Returns:
+        np.ndarray: Аудиосигнал float32.
+
+    Raises:
+        ValueError: Если файл не WAV или его формат отличается от ожидаемого.
+    """
+    try:
+        with wave.open(path, "rb") as wf:
+            if (
+                wf.getnchannels() != config.AUDIO_CHANNELS
+                or wf.getsampwidth() != 2
+                or wf.getframerate() != config.AUDIO_RATE
+            ):
+                raise ValueError(
+                    f"Unsupported WAV format in {path}: {wf.getnchannels()} ch, "
+                    f"{wf.getsampwidth() * 8} bit, {wf.getframerate()} Hz."
+                )
+            frames = wf.readframes(wf.getnframes())
+    except wave.Error as e:
+        raise ValueError(f"Not a WAV file: {path}: {e}") from None
+    return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
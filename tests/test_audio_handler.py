@@ -0,0 +1,52 @@
+# tests/test_audio_handler.py
+
+import pytest
+
+pytest.importorskip("pyaudio")
+pytest.importorskip("webrtcvad")
+
+from loki.audio_handler import detect_capture_rate
+
+
+class FakePyAudio:
+    """Устройство ввода с заданной родной частотой и набором поддерживаемых частот."""
+
+    def __init__(self, native, supported):
+        self.native = native
+        self.supported = supported
+
+    def get_default_input_device_info(self):
+        return {"index": 0, "name": "USB Mic", "defaultSampleRate": float(self.native)}
+
+    def is_format_supported(self, rate, **kwargs):
+        if rate not in self.supported:
+            raise ValueError("Invalid sample rate")
+        return True
+
+
+def test_native_rate_is_preferred(monkeypatch):
+    """
+    Тест: Микрофон с родной частотой 48 кГц.
+    Ожидание: Захват идет на 48 кГц, без ресемплинга в драйвере.
+    """
+    monkeypatch.delenv("LOKI_CAPTURE_RATE", raising=False)
+    assert detect_capture_rate(FakePyAudio(48000, {48000, 16000})) == 48000
+
+
+def test_unsupported_rate_falls_back_to_16k(monkeypatch):
+    """
+    Тест: Явно запрошена частота, которую устройство не поддерживает.
+    Ожидание: Используется 16 кГц.
+    """
+    monkeypatch.setenv("LOKI_CAPTURE_RATE", "96000")
+    assert detect_capture_rate(FakePyAudio(48000, {48000, 16000})) == 16000
+
+
+def test_no_supported_rate_raises(monkeypatch):
+    """
+    Тест: Устройство не поддерживает ни родную частоту, ни 16 кГц.
+    Ожидание: ValueError при старте, а не ошибка открытия потока позже.
+    """
+    monkeypatch.delenv("LOKI_CAPTURE_RATE", raising=False)
+    with pytest.raises(ValueError, match="USB Mic"):
+        detect_capture_rate(FakePyAudio(44100, set()))
@@ -0,0 +1,58 @@
+# tests/test_capture_monitor.py
+
+import logging
+
+from loki.capture_monitor import CaptureMonitor
+from loki.metrics import METRICS
+
+RATE = 16000
+FRAMES = 512  # 32 мс на чтение
+
+
+def run_reads(monitor, start, count, available=0):
+    """Имитирует `count` чтений, идущих строго в реальном времени."""
+    t = start
+    for _ in range(count):
+        started, t = t, t + FRAMES / RATE
+        monitor.record(started, t, available)
+    return t
+
+
+def test_realtime_reads_have_no_losses():
+    """
+    Тест: Чтения идут вровень с реальным временем, в буфере небольшой запас.
+    Ожидание: Потерь и переполнений нет.
+    """
+    monitor = CaptureMonitor("test_realtime", RATE, FRAMES)
+    run_reads(monitor, 0.0, 100, available=FRAMES)
+    assert monitor.dropped_frames == 0
+    assert monitor.overflows == 0
+
+
+def test_stall_is_counted_as_dropped_frames(caplog):
+    """
+    Тест: Читатель завис на 1 секунду, буфер при этом не вырос (аудио отброшено).
+    Ожидание: Потеряна примерно секунда кадров, выдано предупреждение.
+    """
+    monitor = CaptureMonitor("test_stall", RATE, FRAMES)
+    t = run_reads(monitor, 0.0, 10)
+    with caplog.at_level(logging.WARNING):
+        t = run_reads(monitor, t + 1.0, 10)
+
+    assert monitor.overflows == 1
+    assert abs(monitor.dropped_frames - RATE) <= FRAMES
+    counters = METRICS.snapshot()["counters"]
+    assert counters["audio.test_stall.dropped_frames"] == monitor.dropped_frames
+    assert "Sustained audio loss on 'test_stall'" in caplog.text
+
+
+def test_reset_ignores_intentional_pause():
+    """
+    Тест: Поток намеренно не читался 5 секунд, перед возобновлением вызван reset().
+    Ожидание: Пауза не засчитана как потери.
+    """
+    monitor = CaptureMonitor("test_reset", RATE, FRAMES)
+    t = run_reads(monitor, 0.0, 10)
+    monitor.reset()
+    run_reads(monitor, t + 5.0, 10)
+    assert monitor.dropped_frames == 0
@@ -1,7 +1,11 @@
 # tests/test_command_parser.py
 
 import pytest
-from loki.command_parser import parse_llm_response
+from loki.command_parser import (
+    CommandEndDetector,
+    parse_llm_response,
+    parse_structured_response,
+)
 
 
 def test_parse_with_valid_command():
@@ -81,3 +85,54 @@ def test_text_with_multiple_cmd_blocks():
     clean_text, command = parse_llm_response(text)
     assert clean_text == "Первая команда.  И вторая."
     assert command == {"key": "val1"}  # re.search находит первое вхождение
+
+
+def test_command_end_detector_split_marker():
+    """
+    Тест: Маркер [/CMD] приходит разбитым на несколько токенов, за ним идет лишний текст.
+    Ожидание: Поток обрезается сразу после маркера, дальнейшие токены отбрасываются.
+    """
+    tokens = [
+        "Выполнено. [CMD]",
+        '{"tool_name": "set_status"}',
+        "[/C",
+        "MD] И еще",
+        " текст",
+    ]
+    detector = CommandEndDetector()
+    emitted = "".join(detector.feed(token) for token in tokens)
+    assert emitted == 'Выполнено. [CMD]{"tool_name": "set_status"}[/CMD]'
+    assert detector.done
+
+
+def test_command_end_detector_without_command():
+    """
+    Тест: Обычный ответ без блока [CMD].
+    Ожидание: Все токены проходят без изменений, конец не обнаружен.
+    """
+    detector = CommandEndDetector()
+    emitted = "".join(detector.feed(token) for token in ["У Юпитера ", "95 спутников."])
+    assert emitted == "У Юпитера 95 спутников."
+    assert not detector.done
+
+
+def test_parse_structured_response_with_command():
+    """
+    Тест: Структурированный ответ с командой.
+    Ожидание: Текст и команда извлечены из JSON.
+    """
+    text = '{"speech": " Выполнено. ", "command": {"tool_name": "set_status", "parameters": {"status": "idle"}}}'
+    clean_text, command = parse_structured_response(text)
+    assert clean_text == "Выполнено."
+    assert command == {"tool_name": "set_status", "parameters": {"status": "idle"}}
+
+
+def test_parse_structured_response_without_command():
+    """
+    Тест: Структурированный ответ с пустым именем инструмента и невалидный JSON.
+    Ожидание: Команда отсутствует (None); для невалидного JSON и текст пуст.
+    """
+    assert parse_structured_response(
+        '{"speech": "Привет", "command": {"tool_name": ""}}'
+    ) == ("Привет", None)
+    assert parse_structured_response('{"speech": "Привет"') == ("", None)
@@ -0,0 +1,122 @@
+# tests/test_conversation.py
+
+import asyncio
+
+from loki.conversation import ConversationMemory, estimate_tokens
+from loki.llm_providers import GenerationOptions, OllamaProvider
+from loki.prompts import CONVERSATION_SUMMARY_PROMPT
+
+
+class FakeProvider:
+    """Провайдер, который возвращает заданный ответ и запоминает запросы."""
+
+    def __init__(self, reply="Пользователь спрашивал о погоде в Казани.", error=None):
+        self.reply = reply
+        self.error = error
+        self.requests = []
+
+    async def stream_response(
+        self, user_prompt, system_prompt, options=None, history=None, on_usage=None
+    ):
+        self.requests.append((user_prompt, system_prompt))
+        yield self.reply
+        on_usage({"error": self.error} if self.error else {"prompt_tokens": 1})
+
+
+def fill(memory, turns):
+    for i in range(turns):
+        memory.add_turn(f"Вопрос номер {i}", f"Ответ номер {i}")
+
+
+def test_history_stays_within_budget_keeping_latest_turns():
+    """
+    Тест: Ходов больше, чем помещается в бюджет, сжатия еще не было.
+    Ожидание: Оценка истории не превышает бюджет, последние ходы сохранены
+    дословно, самые старые отброшены.
+    """
+    memory = ConversationMemory(token_budget=40, keep_turns=10)
+    fill(memory, 10)
+
+    messages = memory.messages()
+
+    assert sum(estimate_tokens(m["content"]) for m in messages) <= 40
+    assert messages[-1] == {"role": "assistant", "content": "Ответ номер 9"}
+    assert all("номер 0" not in m["content"] for m in messages)
+
+
+def test_compaction_replaces_old_turns_with_summary():
+    """
+    Тест: Пять ходов при keep_turns=2, затем сжатие.
+    Ожидание: Три старых хода свернуты в краткое содержание отдельным промптом,
+    история начинается с него, дальше два последних хода.
+    """
+    memory = ConversationMemory(token_budget=500, keep_turns=2)
+    fill(memory, 5)
+    provider = FakeProvider()
+
+    asyncio.run(memory.compact(provider))
+
+    ((request, system_prompt),) = provider.requests
+    assert system_prompt == CONVERSATION_SUMMARY_PROMPT
+    assert "Вопрос номер 2" in request and "Вопрос номер 3" not in request
+    messages = memory.messages()
+    assert "погоде в Казани" in messages[0]["content"]
+    assert [m["content"] for m in messages[2:] if m["role"] == "user"] == [
+        "Вопрос номер 3",
+        "Вопрос номер 4",
+    ]
+    assert not memory.needs_compaction
+
+
+def test_failed_compaction_keeps_turns():
+    """
+    Тест: Запрос сжатия завершился ошибкой провайдера.
+    Ожидание: Ходы и краткое содержание не изменились.
+    """
+    memory = ConversationMemory(token_budget=500, keep_turns=1)
+    fill(memory, 3)
+
+    asyncio.run(memory.compact(FakeProvider("Ошибка", error="connection refused")))
+
+    assert len(memory.turns) == 3
+    assert memory.summary == ""
+
+
+def test_session_expires_after_idle_time():
+    """
+    Тест: Пауза дольше idle_expiry_s после хода.
+    Ожидание: История пуста, новая реплика начинает новую сессию.
+    """
+    now = [0.0]
+    memory = ConversationMemory(idle_expiry_s=60, clock=lambda: now[0])
+    fill(memory, 2)
+    now[0] = 61.0
+
+    assert memory.messages() == []
+    memory.add_turn("Привет", "Здравствуйте")
+    assert len(memory.turns) == 1
+
+
+def test_ollama_uses_chat_endpoint_with_history():
+    """
+    Тест: Тело запроса Ollama с историей и без нее.
+    Ожидание: С историей — сообщения system, история, user; без — /api/generate.
+    """
+    history = [
+        {"role": "user", "content": "Какая погода в Казани?"},
+        {"role": "assistant", "content": "Плюс десять."},
+    ]
+
+    payload = OllamaProvider._build_payload(
+        "А завтра?", "SYSTEM", GenerationOptions(max_tokens=8), history
+    )
+
+    assert payload["messages"] == [
+        {"role": "system", "content": "SYSTEM"},
+        *history,
+        {"role": "user", "content": "А завтра?"},
+    ]
+    assert payload["options"] == {"num_predict": 8}
+    assert "prompt" in OllamaProvider._build_payload(
+        "Привет", "SYSTEM", GenerationOptions()
+    )
@@ -0,0 +1,50 @@
+# tests/test_cpu_budget.py
+
+import threading
+
+import pytest
+
+from loki.cpu_budget import CpuBudget, EngineBudget, load_budget
+
+
+def test_env_override_merges_with_config(monkeypatch):
+    """
+    Тест: LOKI_CPU_BUDGET задает потоки STT и новый движок.
+    Ожидание: Заданные поля заменены, остальные взяты из конфига.
+    """
+    monkeypatch.setenv(
+        "LOKI_CPU_BUDGET", '{"stt": {"threads": 3}, "vad": {"workers": 2}}'
+    )
+    budget = load_budget()
+
+    assert budget["stt"].threads == 3
+    assert budget["stt"].workers == 1
+    assert budget["vad"] == EngineBudget(workers=2)
+    assert "audio" in budget
+
+
+def test_invalid_env_override_raises(monkeypatch):
+    """
+    Тест: LOKI_CPU_BUDGET содержит некорректный JSON.
+    Ожидание: ValueError с понятным сообщением.
+    """
+    monkeypatch.setenv("LOKI_CPU_BUDGET", "{stt: 3")
+    with pytest.raises(ValueError, match="LOKI_CPU_BUDGET"):
+        load_budget()
+
+
+def test_named_executors_are_separate_and_reused():
+    """
+    Тест: Пулы "audio" и "stt" из одного бюджета.
+    Ожидание: Потоки названы по движку, повторный вызов отдает тот же пул.
+    """
+    cpu = CpuBudget({"audio": EngineBudget(workers=1), "stt": EngineBudget()})
+    try:
+        audio = cpu.executor("audio")
+        assert cpu.executor("audio") is audio
+        assert cpu.executor("stt") is not audio
+
+        name = audio.submit(lambda: threading.current_thread().name).result()
+        assert name.startswith("loki-audio")
+    finally:
+        cpu.shutdown()
@@ -0,0 +1,199 @@
+# tests/test_earcons.py
+
+import asyncio
+import wave
+
+import numpy as np
+import pytest
+
+from loki.earcons import EarconPlayer, load_sound, render_tones
+
+RATE = 1000
+
+
+class FakeTTS:
+    """Движок Piper, который "синтезирует" фразу постоянным сигналом."""
+
+    sample_rate = RATE
+
+    def __init__(self):
+        self.phrases = []
+
+    def synthesize(self, text):
+        self.phrases.append(text)
+        return np.full(100, 16384, dtype=np.int16).tobytes()
+
+
+def write_wav(path, samples, rate, channels=1):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
+
+
+def play(player, frames):
+    """Забирает `frames` отсчетов так же, как поток вывода sounddevice."""
+    out = np.empty((frames, 1), dtype=np.float32)
+    player._callback(out, frames, None, None)
+    return out[:, 0]
+
+
+def test_tones_have_expected_length_and_soft_edges():
+    """
+    Тест: Генерация двухнотного сигнала.
+    Ожидание: Длина равна сумме нот, амплитуда не превышает громкость,
+    каждая нота начинается и заканчивается тишиной (без щелчков).
+    """
+    sound = render_tones((440, 880), duration_ms=50, sample_rate=8000, volume=0.5)
+
+    assert sound.dtype == np.float32
+    assert len(sound) == 2 * 400
+    assert np.abs(sound).max() <= 0.5
+    for note in (sound[:400], sound[400:]):
+        assert note[0] == 0.0 and abs(note[-1]) < 1e-6
+        assert np.abs(note).max() > 0.4
+
+
+def test_file_loader_resamples_and_rejects_stereo(tmp_path):
+    """
+    Тест: Загрузка WAV с другой частотой и стереофайла.
+    Ожидание: Моно-файл приводится к нужной частоте, стерео отклоняется.
+    """
+    path = tmp_path / "beep.wav"
+    write_wav(path, np.full(200, 16384), rate=2000)
+    sound = load_sound(str(path), RATE)
+    assert len(sound) == 100
+    assert np.allclose(sound, 0.5)
+
+    stereo = tmp_path / "stereo.wav"
+    write_wav(stereo, np.zeros(200), rate=RATE, channels=2)
+    with pytest.raises(ValueError):
+        load_sound(str(stereo), RATE)
+
+
+def test_from_config_prepares_phrases_files_and_tones(tmp_path):
+    """
+    Тест: Конфигурация со звуками всех трех видов и недоступным файлом.
+    Ожидание: Фраза синтезируется заранее, файл и тоны загружены с учетом
+    громкости, звук с отсутствующим файлом пропускается.
+    """
+    path = tmp_path / "beep.wav"
+    write_wav(path, np.full(50, 16384), rate=RATE)
+    tts = FakeTTS()
+    player = EarconPlayer.from_config(
+        tts,
+        {
+            "thinking": {"phrase": "Секунду.", "on": "endpoint", "delay_ms": 1500},
+            "file": {"file": str(path), "on": "wake", "volume": 0.5},
+            "tone": {"tones": (100,), "duration_ms": 20, "on": "wake"},
+            "missing": {"file": str(tmp_path / "none.wav"), "on": "wake"},
+        },
+    )
+
+    assert tts.phrases == ["Секунду."]
+    assert set(player.earcons) == {"thinking", "file", "tone"}
+    assert player.earcons["thinking"]["delay_ms"] == 1500
+    assert np.allclose(player.earcons["thinking"]["sound"], 0.5)
+    assert np.allclose(player.earcons["file"]["sound"], 0.25)
+    assert len(player.earcons["tone"]["sound"]) == 20
+
+
+def test_tone_volume_from_config_is_peak_amplitude():
+    """
+    Тест: Тональный звук из конфигурации с громкостью 0.6.
+    Ожидание: Пиковая амплитуда равна 0.6 (громкость применяется один раз).
+    """
+    player = EarconPlayer.from_config(
+        FakeTTS(),
+        {"wake": {"tones": (250,), "duration_ms": 100, "on": "wake", "volume": 0.6}},
+    )
+
+    assert np.abs(player.earcons["wake"]["sound"]).max() == pytest.approx(0.6, abs=0.01)
+
+
+def make_player(delay_ms):
+    sound = np.ones(50, dtype=np.float32)
+    return EarconPlayer(
+        {"beep": {"sound": sound, "on": "endpoint", "delay_ms": delay_ms}}, RATE
+    )
+
+
+def test_earcon_plays_after_its_delay():
+    """
+    Тест: Ответ не начался до истечения задержки звука.
+    Ожидание: Звук начинается после задержки и проигрывается целиком;
+    вызывается on_start.
+    """
+    player = make_player(delay_ms=20)
+    started = []
+
+    async def run():
+        player.trigger("endpoint", on_start=lambda: started.append(True))
+        assert not play(player, 10).any()  # Задержка еще не истекла
+        await asyncio.sleep(0.1)
+        return np.concatenate([play(player, 30), play(player, 30)])
+
+    out = asyncio.run(run())
+
+    assert started == [True]
+    assert out[:50].tolist() == [1.0] * 50
+    assert not out[50:].any()
+
+
+def test_response_before_delay_suppresses_earcon():
+    """
+    Тест: Ответ начинается раньше, чем истекла задержка звука.
+    Ожидание: Звук не проигрывается и on_start не вызывается.
+    """
+    player = make_player(delay_ms=50)
+    started = []
+
+    async def run():
+        player.trigger("endpoint", on_start=lambda: started.append(True))
+        await asyncio.sleep(0.01)
+        player.cancel()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+
+    assert started == []
+    assert not play(player, 50).any()
+
+
+def test_cancel_fades_out_playing_earcon():
+    """
+    Тест: Ответ начинается, пока звук уже звучит.
+    Ожидание: Звук затухает за время затухания, а не обрывается и не
+    доигрывается до конца.
+    """
+    player = make_player(delay_ms=0)
+
+    async def run():
+        player.trigger("endpoint")
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert play(player, 10).tolist() == [1.0] * 10
+    player.cancel()
+    out = play(player, 40)
+
+    fade = out[: player._fade_len]
+    assert np.all(np.diff(fade) < 0) and fade[0] <= 1.0
+    assert not out[player._fade_len :].any()
+    assert player._buffer is None
+
+
+def test_other_transition_does_not_trigger():
+    """
+    Тест: Срабатывает переход, для которого звук не настроен.
+    Ожидание: Ничего не планируется.
+    """
+    player = make_player(delay_ms=0)
+
+    async def run():
+        player.trigger("wake")
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert not play(player, 50).any()
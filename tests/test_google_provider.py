@@ -0,0 +1,283 @@
+# tests/test_google_provider.py
+
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from loki import llm_providers
+from loki.llm_providers import GenerationOptions, GoogleAIProvider
+
+
+class FakeModel:
+    """Заглушка `genai.GenerativeModel`, запоминающая запросы."""
+
+    def __init__(self, model_name, system_instruction=None, cached_content=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+        self.requests = []
+
+    @classmethod
+    def from_cached_content(cls, cached_content):
+        return cls(cached_content.model, cached_content=cached_content)
+
+    async def generate_content_async(self, contents, stream, generation_config):
+        self.requests.append(contents)
+        usage = types.SimpleNamespace(
+            # Разное число токенов у разных запросов: видно, чья статистика чья
+            prompt_token_count=len(contents) if isinstance(contents, str) else 12,
+            candidates_token_count=2,
+            cached_content_token_count=10 if self.cached_content else None,
+        )
+
+        async def chunks():
+            for text in ("При", "вет"):
+                await asyncio.sleep(0)  # Параллельные потоки чередуются
+                yield types.SimpleNamespace(text=text, usage_metadata=usage)
+
+        return chunks()
+
+
+class FakeCachedContent:
+    created = []
+    attempts = 0
+    fail = False
+
+    def __init__(self, model, system_instruction, ttl):
+        self.model = model
+        self.system_instruction = system_instruction
+        self.name = f"cachedContents/{len(self.created)}"
+        self.deleted = False
+
+    @classmethod
+    def create(cls, model, system_instruction, ttl):
+        cls.attempts += 1
+        if cls.fail:
+            raise RuntimeError("Cached content is too small")
+        cls.created.append(cls(model, system_instruction, ttl))
+        return cls.created[-1]
+
+    def delete(self):
+        self.deleted = True
+
+
+@pytest.fixture
+def fake_genai(monkeypatch):
+    FakeCachedContent.created = []
+    FakeCachedContent.attempts = 0
+    FakeCachedContent.fail = False
+    genai = types.SimpleNamespace(
+        configure=lambda api_key: None,
+        GenerativeModel=FakeModel,
+        caching=types.SimpleNamespace(CachedContent=FakeCachedContent),
+    )
+    monkeypatch.setattr(llm_providers, "genai", genai)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    return genai
+
+
+async def stream_text(provider, user_prompt, system_prompt, history, usage):
+    return "".join(
+        [
+            token
+            async for token in provider.stream_response(
+                user_prompt,
+                system_prompt=system_prompt,
+                options=GenerationOptions(),
+                history=history,
+                on_usage=None if usage is None else usage.update,
+            )
+        ]
+    )
+
+
+def collect(provider, user_prompt, system_prompt="SYSTEM", history=None, usage=None):
+    return asyncio.run(
+        stream_text(provider, user_prompt, system_prompt, history, usage)
+    )
+
+
+def test_system_prompt_is_set_once_on_model(fake_genai, monkeypatch):
+    """
+    Тест: Два запроса с одним системным промптом без кэширования контекста.
+    Ожидание: Промпт задан как system_instruction одной модели, в запрос
+    уходит только текст пользователя, задержка первого токена учтена.
+    """
+    monkeypatch.delenv("GOOGLE_CONTEXT_CACHE", raising=False)
+    provider = GoogleAIProvider()
+
+    usage = {}
+    assert collect(provider, "Привет", usage=usage) == "Привет"
+    collect(provider, "Как дела?")
+
+    (model,) = provider._models.values()
+    assert model.system_instruction == "SYSTEM"
+    assert model.requests == ["Привет", "Как дела?"]
+    assert usage["prompt_tokens"] == len("Привет")
+    assert usage["first_token_s"] is not None
+
+
+def test_context_cache_is_reused_and_deleted_on_close(fake_genai, monkeypatch):
+    """
+    Тест: Кэширование контекста включено, два запроса, затем close().
+    Ожидание: Кэш создан один раз, запросы идут через модель поверх кэша,
+    число кэшированных токенов учтено, при закрытии кэш удален.
+    """
+    monkeypatch.setenv("GOOGLE_CONTEXT_CACHE", "1")
+    provider = GoogleAIProvider()
+
+    usage = {}
+    collect(provider, "Привет")
+    collect(provider, "Как дела?", usage=usage)
+
+    assert len(FakeCachedContent.created) == 1
+    assert FakeCachedContent.created[0].system_instruction == "SYSTEM"
+    assert usage["cached_tokens"] == 10
+    provider.close()
+    assert FakeCachedContent.created[0].deleted
+
+
+def test_context_cache_failure_falls_back_to_system_instruction(
+    fake_genai, monkeypatch
+):
+    """
+    Тест: API отказывает в создании кэша, затем снова начинает работать.
+    Ожидание: Ответы идут через модель с system_instruction; до истечения
+    паузы кэш не запрашивается повторно, после нее создается.
+    """
+    monkeypatch.setenv("GOOGLE_CONTEXT_CACHE", "1")
+    FakeCachedContent.fail = True
+    provider = GoogleAIProvider()
+
+    assert collect(provider, "Привет") == "Привет"
+    assert collect(provider, "Как дела?") == "Привет"
+    assert FakeCachedContent.attempts == 1
+    assert provider._models["SYSTEM"].system_instruction == "SYSTEM"
+
+    FakeCachedContent.fail = False
+    provider._cache_retry_at -= provider.context_cache_retry_s  # Пауза прошла
+    usage = {}
+    collect(provider, "Привет", usage=usage)
+    assert FakeCachedContent.attempts == 2
+    assert usage["cached_tokens"] == 10
+
+
+def test_refreshed_context_cache_deletes_the_old_one(fake_genai, monkeypatch):
+    """
+    Тест: Срок кэша истек, следующий запрос создает новый.
+    Ожидание: Замененный кэш удален на стороне API, новый — нет.
+    """
+    monkeypatch.setenv("GOOGLE_CONTEXT_CACHE", "1")
+    monkeypatch.setenv("GOOGLE_CONTEXT_CACHE_TTL_S", "0")  # Обновлять каждый раз
+    provider = GoogleAIProvider()
+
+    collect(provider, "Привет")
+    collect(provider, "Как дела?")
+
+    old, new = FakeCachedContent.created
+    assert old.deleted and not new.deleted
+
+
+def test_models_and_caches_are_bounded(fake_genai, monkeypatch):
+    """
+    Тест: Запросы с тремя разными системными промптами при лимите в два.
+    Ожидание: Хранятся модели и кэши двух последних использованных промптов,
+    кэш вытесненного промпта удален.
+    """
+    monkeypatch.setenv("GOOGLE_MODEL_CACHE_SIZE", "2")
+    monkeypatch.setenv("GOOGLE_CONTEXT_CACHE", "1")
+    provider = GoogleAIProvider()
+
+    for prompt in ("A", "B", "A", "C"):
+        collect(provider, "Привет", system_prompt=prompt)
+    provider.use_context_cache = False
+    for prompt in ("A", "B", "A", "C"):
+        collect(provider, "Привет", system_prompt=prompt)
+
+    assert list(provider._caches) == ["A", "C"]
+    assert [c.deleted for c in FakeCachedContent.created] == [False, True, False]
+    assert list(provider._models) == ["A", "C"]
+
+
+def test_history_is_sent_as_multi_turn_contents(fake_genai, monkeypatch):
+    """
+    Тест: Запрос с историей разговора.
+    Ожидание: История передана сообщениями с ролями user/model перед запросом.
+    """
+    monkeypatch.delenv("GOOGLE_CONTEXT_CACHE", raising=False)
+    provider = GoogleAIProvider()
+    history = [
+        {"role": "user", "content": "Какая погода в Казани?"},
+        {"role": "assistant", "content": "Плюс десять."},
+    ]
+
+    collect(provider, "А завтра?", history=history)
+
+    (model,) = provider._models.values()
+    assert model.requests == [
+        [
+            {"role": "user", "parts": ["Какая погода в Казани?"]},
+            {"role": "model", "parts": ["Плюс десять."]},
+            {"role": "user", "parts": ["А завтра?"]},
+        ]
+    ]
+
+
+def test_concurrent_requests_report_their_own_usage(fake_genai, monkeypatch):
+    """
+    Тест: Два запроса одновременно идут через один провайдер.
+    Ожидание: Каждый получатель статистики получает данные своего запроса.
+    """
+    monkeypatch.delenv("GOOGLE_CONTEXT_CACHE", raising=False)
+    provider = GoogleAIProvider()
+    short, long = {}, {}
+
+    async def run():
+        await asyncio.gather(
+            stream_text(provider, "Да", "SYSTEM", None, short),
+            stream_text(provider, "Какая погода?", "SYSTEM", None, long),
+        )
+
+    asyncio.run(run())
+
+    assert short["prompt_tokens"] == len("Да")
+    assert long["prompt_tokens"] == len("Какая погода?")
+
+
+def test_error_is_reported_to_the_request(fake_genai, monkeypatch):
+    """
+    Тест: Запрос к API завершается ошибкой.
+    Ожидание: Пользователь слышит сообщение об ошибке, получатель
+    статистики запроса получает текст ошибки.
+    """
+    monkeypatch.delenv("GOOGLE_CONTEXT_CACHE", raising=False)
+
+    async def fail(self, contents, stream, generation_config):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(FakeModel, "generate_content_async", fail)
+    provider = GoogleAIProvider()
+    usage = {}
+
+    assert "ошибка" in collect(provider, "Привет", usage=usage)
+    assert usage == {"error": "quota exceeded"}
+
+
+def test_default_options_keep_provider_token_limit(fake_genai, monkeypatch):
+    """
+    Тест: LOKI_LLM_MAX_TOKENS не задана, у провайдера настроен GOOGLE_MAX_TOKENS.
+    Ожидание: Параметры по умолчанию не ограничивают ответ, действует лимит
+    провайдера; явная переменная окружения задает лимит.
+    """
+    monkeypatch.delenv("LOKI_LLM_MAX_TOKENS", raising=False)
+    monkeypatch.setenv("GOOGLE_MAX_TOKENS", "1024")
+    provider = GoogleAIProvider()
+
+    assert llm_providers.default_generation_options().max_tokens is None
+    assert provider.generation_config["max_output_tokens"] == 1024
+
+    monkeypatch.setenv("LOKI_LLM_MAX_TOKENS", "64")
+    assert llm_providers.default_generation_options().max_tokens == 64
@@ -0,0 +1,103 @@
+# tests/test_journal.py
+
+import time
+
+import pytest
+
+from loki.journal import (
+    JournalReader,
+    TurnJournal,
+    aggregate_by_hour,
+    list_segments,
+)
+
+
+def entry(ts, total, **extra):
+    return {
+        "ts": ts,
+        "stages": {"stt_s": total / 2, "total_s": total},
+        "transcript": "какая погода",
+        "prompt_tokens": 120,
+        **extra,
+    }
+
+
+def test_records_round_trip(tmp_path):
+    """
+    Тест: Несколько записей пишутся и читаются обратно.
+    Ожидание: Заголовки и JSON-тело совпадают с записанным, пропущенные
+    этапы и токены читаются как отсутствующие.
+    """
+    journal = TurnJournal(str(tmp_path), flush_interval_s=0.01)
+    journal.record(entry(1000.0, 1.5, response="Солнечно"))
+    journal.record(entry(1001.0, 2.5))
+    journal.close()
+
+    entries = list(JournalReader(str(tmp_path)).scan(payload=True))
+
+    assert [e.timestamp for e in entries] == [1000.0, 1001.0]
+    assert entries[0].stages == {"stt_s": 0.75, "total_s": 1.5}
+    assert entries[0].prompt_tokens == 120
+    assert entries[0].completion_tokens is None
+    assert entries[0].data["response"] == "Солнечно"
+    assert [e.timestamp for e in JournalReader(str(tmp_path)).scan(since=1000.5)] == [
+        1001.0
+    ]
+
+
+def test_segments_rotate_and_old_ones_are_pruned(tmp_path):
+    """
+    Тест: Сегменты меньше одной записи, хранить можно только два.
+    Ожидание: Каждая порция уходит в новый сегмент, на диске остаются два
+    последних, и читаются только их записи.
+    """
+    journal = TurnJournal(
+        str(tmp_path), segment_bytes=64, max_segments=2, flush_interval_s=0
+    )
+    for i in range(4):
+        journal.record(entry(1000.0 + i, 1.0))
+        # Разные имена сегментов (метка в миллисекундах)
+        time.sleep(0.005)
+    journal.close()
+
+    assert len(list_segments(str(tmp_path))) == 2
+    timestamps = [e.timestamp for e in JournalReader(str(tmp_path)).scan()]
+    assert timestamps == [1002.0, 1003.0]
+
+
+def test_truncated_tail_record_is_ignored(tmp_path):
+    """
+    Тест: Последняя запись сегмента обрезана (аварийное завершение).
+    Ожидание: Целые записи читаются, обрезанная пропускается без ошибки.
+    """
+    journal = TurnJournal(str(tmp_path), flush_interval_s=0.01)
+    journal.record(entry(1000.0, 1.0))
+    journal.record(entry(1001.0, 1.0))
+    journal.close()
+    (segment,) = list_segments(str(tmp_path))
+    with open(segment, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5)
+
+    entries = list(JournalReader(str(tmp_path)).scan(payload=True))
+
+    assert [e.timestamp for e in entries] == [1000.0]
+
+
+def test_aggregate_by_hour_reports_percentiles(tmp_path):
+    """
+    Тест: Ходы за два разных часа.
+    Ожидание: По каждому часу свое число ходов и перцентили.
+    """
+    journal = TurnJournal(str(tmp_path), flush_interval_s=0.01)
+    base = time.mktime((2024, 5, 1, 10, 0, 0, 0, 0, -1))
+    for i, total in enumerate([1.0, 2.0, 3.0]):
+        journal.record(entry(base + i * 60, total))
+    journal.record(entry(base + 3600, 5.0))
+    journal.close()
+
+    rows = aggregate_by_hour(JournalReader(str(tmp_path)).scan())
+
+    assert list(rows) == ["2024-05-01 10:00", "2024-05-01 11:00"]
+    assert rows["2024-05-01 10:00"]["count"] == 3
+    assert rows["2024-05-01 10:00"]["p50"] == pytest.approx(2.0)
+    assert rows["2024-05-01 11:00"]["p99"] == pytest.approx(5.0)
@@ -0,0 +1,38 @@
+# tests/test_loop_monitor.py
+
+import asyncio
+import logging
+import time
+
+from loki.loop_monitor import LoopLagMonitor
+from loki.metrics import METRICS
+
+
+async def blocking_handler():
+    """Корутина, по ошибке вызывающая блокирующий код."""
+    time.sleep(0.3)
+
+
+def test_blocking_call_is_reported_with_stack(caplog):
+    """
+    Тест: Корутина блокирует event loop на 300 мс.
+    Ожидание: Зафиксирована блокировка, в логе есть стек с виновной корутиной,
+    распределение задержки доступно в METRICS.
+    """
+
+    async def main():
+        monitor = LoopLagMonitor(interval_s=0.02, threshold_ms=100)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await blocking_handler()
+        await asyncio.sleep(0.05)
+        monitor.stop()
+        return monitor
+
+    with caplog.at_level(logging.WARNING):
+        monitor = asyncio.run(main())
+
+    assert monitor.stalls == 1
+    assert "Event loop was blocked" in caplog.text
+    assert "blocking_handler" in caplog.text
+    assert METRICS.snapshot()["distributions"]["loop.lag_ms"]["max"] >= 250
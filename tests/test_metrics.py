@@ -0,0 +1,47 @@
+# tests/test_metrics.py
+
+import asyncio
+import logging
+
+from loki.metrics import Metrics
+
+
+def test_summary_lists_counters_gauges_and_distributions():
+    """
+    Тест: В реестре есть счетчик, gauge и распределение.
+    Ожидание: Сводка одной строкой содержит все три в отсортированном виде;
+    у пустого реестра сводка пустая.
+    """
+    metrics = Metrics()
+    assert metrics.summary() == ""
+
+    metrics.increment("capture.overflows", 2)
+    metrics.set_gauge("resources.rss_mb", 512.5)
+    for value in (10, 20, 30):
+        metrics.observe("loop.lag_ms", value)
+
+    assert metrics.summary() == (
+        "capture.overflows=2; loop.lag_ms 20/30/30 (n=3); resources.rss_mb=512.5"
+    )
+
+
+def test_report_logs_summary_periodically(caplog):
+    """
+    Тест: Периодическая запись сводки с коротким интервалом.
+    Ожидание: В лог попадают строки "Metrics: ..." с текущими значениями,
+    задача останавливается отменой.
+    """
+    metrics = Metrics()
+    metrics.increment("llm.errors")
+
+    async def run():
+        task = asyncio.create_task(metrics.report(0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    with caplog.at_level(logging.INFO):
+        asyncio.run(run())
+
+    lines = [r.message for r in caplog.records if r.message.startswith("Metrics:")]
+    assert len(lines) >= 2
+    assert lines[-1] == "Metrics: llm.errors=1"
@@ -0,0 +1,66 @@
+# tests/test_prompt_selector.py
+
+from loki.prompt_selector import PromptSelector
+from loki.prompts import (
+    FEW_SHOT_EXAMPLES,
+    STATIC_PROMPT_EXAMPLES,
+    TOOL_SPECS,
+    UNIFIED_PROMPT,
+    build_prompt,
+)
+
+
+def test_weather_request_gets_only_weather_tool():
+    """
+    Тест: Запрос о погоде в падеже, которого нет среди ключевых слов.
+    Ожидание: В промпте только get_weather, примеры-ограничители сохранены,
+    промпт короче статического.
+    """
+    selector = PromptSelector()
+    tools, examples = selector.select("Какая погодка завтра в Казани?")
+
+    assert tools == ["get_weather"]
+    assert all(e.get("guardrail") for e in examples if e.get("tool") != "get_weather")
+    assert sum(1 for e in examples if e.get("guardrail")) == sum(
+        1 for e in FEW_SHOT_EXAMPLES if e.get("guardrail")
+    )
+    assert len(selector.build("Какая погодка завтра в Казани?")) < len(UNIFIED_PROMPT)
+
+
+def test_general_question_keeps_guardrails_without_tools():
+    """
+    Тест: Общий вопрос без признаков команды.
+    Ожидание: Ни одного инструмента, в промпте только ограничители.
+    """
+    prompt = PromptSelector().build("Сколько спутников у Юпитера?")
+
+    assert "Доступные инструменты" not in prompt
+    assert "Как твое состояние?" in prompt
+    for spec in TOOL_SPECS.values():
+        assert spec["description"] not in prompt
+
+
+def test_top_k_limits_tool_examples():
+    """
+    Тест: top_k=1 для запроса о смене режима.
+    Ожидание: Из примеров с инструментами остается один — самый похожий.
+    """
+    _, examples = PromptSelector(top_k=1).select("Установи режим прослушивания")
+
+    tool_examples = [e for e in examples if not e.get("guardrail")]
+    assert [e["user"] for e in tool_examples] == ["Установи режим ожидания."]
+
+
+def test_static_prompt_keeps_original_examples():
+    """
+    Тест: Статический промпт при пуле примеров больше исходного набора.
+    Ожидание: В нем все инструменты и только исходные примеры; примеры,
+    добавленные для динамической сборки, его не увеличивают.
+    """
+    original = FEW_SHOT_EXAMPLES[:STATIC_PROMPT_EXAMPLES]
+    extra = FEW_SHOT_EXAMPLES[STATIC_PROMPT_EXAMPLES:]
+
+    assert UNIFIED_PROMPT == build_prompt(TOOL_SPECS, original)
+    assert all(spec["description"] in UNIFIED_PROMPT for spec in TOOL_SPECS.values())
+    assert all(e["user"] in UNIFIED_PROMPT for e in original)
+    assert not any(e["user"] in UNIFIED_PROMPT for e in extra)
@@ -0,0 +1,80 @@
+# tests/test_resampler.py
+
+import numpy as np
+import pytest
+
+from loki.resampler import FrameResampler, StreamingResampler
+
+
+def tone(frequency, rate, seconds=1.0, amplitude=8000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def fitted_amplitude(signal, frequency, rate):
+    """Амплитуда синусоиды частоты `frequency` в сигнале (МНК) и остаток."""
+    t = np.arange(len(signal)) / rate
+    basis = np.stack(
+        [np.sin(2 * np.pi * frequency * t), np.cos(2 * np.pi * frequency * t)], 1
+    )
+    coef, *_ = np.linalg.lstsq(basis, signal.astype(float), rcond=None)
+    residual = np.sqrt(np.mean((basis @ coef - signal) ** 2))
+    return np.hypot(*coef), residual
+
+
+@pytest.mark.parametrize("rate", [48000, 44100])
+def test_tone_is_preserved_at_16k(rate):
+    """
+    Тест: Тон 1 кГц на 48 и 44.1 кГц приводится к 16 кГц.
+    Ожидание: Число отсчетов соответствует длительности, амплитуда сохранена,
+    искажения в пределах пары единиц младшего разряда.
+    """
+    out = StreamingResampler(rate, 16000).process(tone(1000, rate))
+
+    assert len(out) == 16000
+    amplitude, residual = fitted_amplitude(out[100:-100], 1000, 16000)
+    assert amplitude == pytest.approx(8000, rel=0.01)
+    assert residual < 2
+
+
+def test_frequencies_above_nyquist_are_suppressed():
+    """
+    Тест: Тон 10 кГц на 48 кГц (выше Найквиста для 16 кГц).
+    Ожидание: После ресемплинга он подавлен минимум на 30 дБ, а не отражен.
+    """
+    out = StreamingResampler(48000, 16000).process(tone(10000, 48000))
+
+    assert np.abs(out[100:]).max() < 8000 / 10 ** (30 / 20)
+
+
+def test_streaming_matches_single_block():
+    """
+    Тест: Один и тот же сигнал целиком и порциями случайной длины.
+    Ожидание: Результаты совпадают отсчет в отсчет.
+    """
+    signal = tone(440, 44100, seconds=0.5) + tone(3000, 44100, seconds=0.5)
+    whole = StreamingResampler(44100, 16000).process(signal)
+
+    resampler = StreamingResampler(44100, 16000)
+    rng = np.random.default_rng(0)
+    parts, start = [], 0
+    while start < len(signal):
+        size = int(rng.integers(1, 1500))
+        parts.append(resampler.process(signal[start : start + size]))
+        start += size
+
+    np.testing.assert_array_equal(np.concatenate(parts), whole)
+
+
+def test_frame_resampler_returns_fixed_frames():
+    """
+    Тест: Кадры Porcupine (512 отсчетов 16 кГц) из чтений по 1411 отсчетов 44.1 кГц.
+    Ожидание: Каждый кадр ровно 512 отсчетов, после сброса остаток отброшен.
+    """
+    signal = tone(1000, 44100, seconds=2)
+    reads = iter(np.array_split(signal, len(signal) // 1411))
+    frames = FrameResampler(lambda: next(reads).tobytes(), 44100, 16000, 512)
+
+    assert all(len(frames.read()) == 2 * 512 for _ in range(20))
+    frames.reset()
+    assert len(frames._pending) == 0
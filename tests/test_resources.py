@@ -0,0 +1,76 @@
+# tests/test_resources.py
+
+import time
+
+from loki.resources import ResourceManager
+
+
+class FakeEngine:
+    """Заглушка движка, отмечающая вызов close()."""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_manager(**kwargs):
+    created = []
+
+    def loader():
+        created.append(FakeEngine())
+        return created[-1]
+
+    manager = ResourceManager(rss_reader=lambda: None, **kwargs)
+    manager.register("stt", loader)
+    return manager, created
+
+
+def test_idle_engine_is_unloaded_and_reloaded():
+    """
+    Тест: Движок простаивает дольше таймаута, затем снова запрашивается.
+    Ожидание: Движок закрыт и выгружен, при обращении загружен заново.
+    """
+    manager, created = make_manager(idle_timeout_s=10)
+    manager._resources["stt"].last_used = time.monotonic() - 11
+
+    assert manager.collect() == 1
+    assert created[0].closed
+    assert manager.peek("stt") is None
+
+    assert manager.get("stt") is created[1]
+    assert len(created) == 2
+
+
+def test_engine_in_use_is_not_unloaded():
+    """
+    Тест: Простаивающий по времени движок взят через use().
+    Ожидание: Пока блок with не завершен, движок не выгружается.
+    """
+    manager, created = make_manager(idle_timeout_s=10)
+    with manager.use("stt") as engine:
+        manager._resources["stt"].last_used = time.monotonic() - 11
+        assert manager.collect() == 0
+        assert not engine.closed
+
+
+def test_rss_budget_unloads_least_recently_used_first():
+    """
+    Тест: RSS превышает бюджет, загружены два движка.
+    Ожидание: Выгружается только давно неиспользуемый, после чего RSS в бюджете.
+    """
+    rss = [300 * 2**20]
+    manager = ResourceManager(rss_budget_mb=200, rss_reader=lambda: rss[0])
+    engines = {"stt": FakeEngine(), "tts": FakeEngine()}
+
+    def load_tts():
+        engines["tts"].close = lambda: rss.__setitem__(0, 150 * 2**20)
+        return engines["tts"]
+
+    manager.register("tts", load_tts)
+    manager.register("stt", lambda: engines["stt"])
+
+    assert manager.collect() == 1
+    assert manager.peek("tts") is None
+    assert manager.peek("stt") is engines["stt"]
@@ -0,0 +1,94 @@
+# tests/test_shared_weights.py
+
+import dataclasses
+import os
+
+import pytest
+
+whisper = pytest.importorskip("whisper")
+torch = pytest.importorskip("torch")
+onnxruntime = pytest.importorskip("onnxruntime")
+
+from whisper.model import ModelDimensions, Whisper
+
+from loki.stt_handler import load_shared_model, prepare_shared_model
+
+try:
+    from loki import tts_handler
+except OSError:  # sounddevice без библиотеки PortAudio
+    tts_handler = None
+
+TINY_DIMS = ModelDimensions(
+    n_mels=80,
+    n_audio_ctx=16,
+    n_audio_state=64,
+    n_audio_head=2,
+    n_audio_layer=1,
+    n_vocab=100,
+    n_text_ctx=8,
+    n_text_state=64,
+    n_text_head=2,
+    n_text_layer=1,
+)
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "shared"
+    monkeypatch.setenv("LOKI_SHARED_WEIGHTS_DIR", str(directory))
+    return directory
+
+
+def test_shared_whisper_model_matches_regular_loading(tmp_path, shared_dir):
+    """
+    Тест: Чекпойнт в формате Whisper (fp16) загружается через общий файл.
+    Ожидание: Файл создается один раз, веса fp32, выход совпадает с
+    `whisper.load_model`.
+    """
+    torch.manual_seed(0)
+    model = Whisper(TINY_DIMS)
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    checkpoint = tmp_path / "tiny.pt"
+    torch.save(
+        {
+            "dims": dataclasses.asdict(model.dims),
+            "model_state_dict": {k: v.half() for k, v in model.state_dict().items()},
+        },
+        checkpoint,
+    )
+    path = prepare_shared_model(str(checkpoint))
+    mtime = os.path.getmtime(path)
+
+    shared = load_shared_model(str(checkpoint))
+    regular = whisper.load_model(str(checkpoint), device="cpu")
+
+    assert os.path.getmtime(prepare_shared_model(str(checkpoint))) == mtime
+    assert all(p.dtype == torch.float32 for p in shared.parameters())
+    mel = torch.randn(1, 80, 32)
+    tokens = torch.tensor([[1, 2, 3]])
+    with torch.no_grad():
+        assert torch.equal(shared(mel, tokens), regular(mel, tokens))
+
+
+@pytest.mark.skipif(tts_handler is None, reason="PortAudio is not available")
+def test_shared_voice_keeps_weights_in_external_file(shared_dir):
+    """
+    Тест: Общая копия ONNX-модели (любая модель из пакета piper).
+    Ожидание: Веса вынесены во внешний файл рядом с графом, копия
+    загружается без оптимизации графа и предварительной упаковки.
+    """
+    import piper
+
+    source = os.path.join(os.path.dirname(piper.__file__), "tashkeel", "model.onnx")
+    if not os.path.exists(source):
+        pytest.skip("no ONNX model bundled with piper")
+
+    path = tts_handler.prepare_shared_voice(source, "basic")
+
+    data = path + ".data"
+    assert os.path.getsize(data) > os.path.getsize(path)
+    assert tts_handler.prepare_shared_voice(source, "basic") == path
+    options = tts_handler.create_session_options(graph_optimization="disable")
+    options.add_session_config_entry("session.disable_prepacking", "1")
+    session = onnxruntime.InferenceSession(path, sess_options=options)
+    assert session.get_inputs()
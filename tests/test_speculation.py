@@ -0,0 +1,133 @@
+# tests/test_speculation.py
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from loki.speculation import PartialTranscriber, SpeculationStats, SpeculativeRequest
+
+
+class FakeProvider:
+    """Провайдер, который выдает токены с задержкой и отмечает закрытие потока."""
+
+    def __init__(self, tokens, delay_s=0.01):
+        self.tokens = tokens
+        self.delay_s = delay_s
+        self.closed = False
+
+    async def stream_response(
+        self, user_prompt, system_prompt, options=None, history=None, on_usage=None
+    ):
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(self.delay_s)
+                yield token
+            on_usage({"prompt_tokens": len(user_prompt)})
+        finally:
+            self.closed = True
+
+
+def test_hit_counts_only_generation_time():
+    """
+    Тест: Спекулятивный ответ готов задолго до финального транскрипта,
+    транскрипт совпадает с частичным.
+    Ожидание: Поток отдает весь ответ и статистику запроса; выигрыш равен
+    времени генерации, а не всему времени с момента старта запроса.
+    """
+    stats = SpeculationStats()
+
+    async def run():
+        request = SpeculativeRequest(FakeProvider(["Сейчас ", "включу."]), "Свет", "S")
+        await asyncio.sleep(0.3)  # Пользователь еще договаривает
+        assert request.matches("свет!")
+        stats.record_hit(request)
+        return "".join([token async for token in request.stream()]), request
+
+    text, request = asyncio.run(run())
+
+    assert text == "Сейчас включу."
+    assert request.usage == {"prompt_tokens": len("Свет")}
+    assert stats.hits == 1 and stats.hit_rate == 1.0
+    assert 0 < stats.time_saved_s < 0.2
+
+
+def test_miss_cancels_generation():
+    """
+    Тест: Финальный транскрипт отличается от частичного, генерация еще идет.
+    Ожидание: Спекулятивная генерация отменяется, поток провайдера закрыт,
+    промах учтен вместе с потраченным временем.
+    """
+    stats = SpeculationStats()
+    provider = FakeProvider(["слово "] * 1000)
+
+    async def run():
+        request = SpeculativeRequest(provider, "Включи", "S")
+        await asyncio.sleep(0.05)
+        assert not request.matches("Включи свет")
+        request.cancel()
+        stats.record_miss(request, "Включи свет")
+        await asyncio.sleep(0.05)
+        return request
+
+    request = asyncio.run(run())
+
+    assert provider.closed
+    assert 0 < request.token_count < 1000
+    assert request.finished_at is not None
+    assert stats.misses == 1 and stats.hit_rate == 0.0
+
+
+def test_final_transcription_skips_queued_partials():
+    """
+    Тест: В однопоточном пуле "stt" идет частичное распознавание, за ним в
+    очереди ждет следующее; запись заканчивается.
+    Ожидание: Ожидающее частичное задание не выполняется, финальное
+    распознавание идет сразу после уже начатого частичного.
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    partial = PartialTranscriber(executor)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def transcribe(audio):
+        calls.append(len(audio))
+        if len(audio) == 1:
+            started.set()
+            release.wait(5)
+        return f"{len(audio)} samples"
+
+    async def run():
+        partial.start()
+        running = asyncio.ensure_future(partial.transcribe(transcribe, np.zeros(1)))
+        await asyncio.to_thread(started.wait, 5)
+        queued = asyncio.ensure_future(partial.transcribe(transcribe, np.zeros(2)))
+        await asyncio.sleep(0)
+        partial.stop()  # Запись закончилась
+        final = asyncio.get_running_loop().run_in_executor(
+            executor, transcribe, np.zeros(3)
+        )
+        release.set()
+        return await asyncio.gather(running, queued, final)
+
+    try:
+        assert asyncio.run(run()) == ["1 samples", None, "3 samples"]
+    finally:
+        executor.shutdown()
+    assert calls == [1, 3]
+
+
+def test_partials_are_ignored_after_recording_ends():
+    """
+    Тест: Частичная фраза приходит после окончания записи.
+    Ожидание: Распознавание не запускается, возвращается None.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        partial = PartialTranscriber(executor)
+
+        def transcribe(audio):
+            pytest.fail("partial transcription after recording ended")
+
+        assert asyncio.run(partial.transcribe(transcribe, np.zeros(1))) is None
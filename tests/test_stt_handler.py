@@ -0,0 +1,249 @@
+# tests/test_stt_handler.py
+
+import types
+
+import numpy as np
+import pytest
+
+whisper = pytest.importorskip("whisper")
+torch = pytest.importorskip("torch")
+
+from whisper.model import AudioEncoder, ModelDimensions, Whisper
+
+from loki import config, stt_handler
+from loki.stt_handler import WhisperSTT, _encoder_forward_variable_ctx
+
+# Полное окно Whisper: 30 секунд, 1500 позиций энкодера
+FULL_CTX = 1500
+
+
+def make_tiny_model() -> Whisper:
+    dims = ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=FULL_CTX,
+        n_audio_state=64,
+        n_audio_head=2,
+        n_audio_layer=1,
+        n_vocab=100,
+        n_text_ctx=8,
+        n_text_state=64,
+        n_text_head=2,
+        n_text_layer=1,
+    )
+    torch.manual_seed(0)
+    model = Whisper(dims).eval()
+    # Позиционные эмбеддинги декодера создаются через torch.empty и не инициализированы
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    return model
+
+
+@pytest.fixture
+def make_stt(monkeypatch):
+    """Создает WhisperSTT поверх маленькой модели со случайными весами."""
+    monkeypatch.setattr(
+        stt_handler.whisper, "load_model", lambda name, device: make_tiny_model()
+    )
+
+    def make(**kwargs):
+        return WhisperSTT(quantize=False, shared_weights=False, **kwargs)
+
+    return make
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    """Подменяет whisper.decode и запоминает переданные mel и параметры."""
+    calls = []
+
+    def decode(model, mel, options):
+        calls.append((mel, options))
+        return types.SimpleNamespace(text=" Привет.")
+
+    monkeypatch.setattr(stt_handler.whisper, "decode", decode)
+    return calls
+
+
+@pytest.mark.parametrize(
+    "seconds, expected",
+    [
+        (0, 50),  # Только запас WHISPER_AUDIO_CTX_MARGIN_S
+        (1, 100),
+        (1 + 1 / 16000, 101),  # Неполный шаг в 20 мс округляется вверх
+        (29, FULL_CTX),
+        (60, FULL_CTX),  # Не больше полного окна модели
+    ],
+)
+def test_audio_ctx_covers_utterance_with_margin(make_stt, seconds, expected):
+    """
+    Тест: Размер аудиоконтекста для фраз разной длины.
+    Ожидание: Длина фразы плюс запас в шагах по 20 мс с округлением вверх,
+    но не больше полного окна модели.
+    """
+    assert config.WHISPER_AUDIO_CTX_MARGIN_S == 1.0
+    stt = make_stt(command_mode=True)
+
+    assert stt.audio_ctx_for(round(seconds * 16000)) == expected
+
+
+def test_patched_encoder_matches_original_on_full_window():
+    """
+    Тест: Энкодер с заменой forward на полном 30-секундном окне и на коротком.
+    Ожидание: На полном окне результат совпадает с оригиналом; короткое окно,
+    которое оригинал отвергает, кодируется в соразмерное число позиций.
+    """
+    encoder = make_tiny_model().encoder
+    mel = torch.randn(1, 80, 2 * FULL_CTX)
+    short_mel = mel[:, :, :200]
+
+    with torch.no_grad():
+        expected = AudioEncoder.forward(encoder, mel)
+        with pytest.raises(AssertionError):
+            AudioEncoder.forward(encoder, short_mel)
+        encoder.forward = types.MethodType(_encoder_forward_variable_ctx, encoder)
+        actual = encoder(mel)
+        short = encoder(short_mel)
+
+    assert torch.equal(actual, expected)
+    assert short.shape == (1, 100, 64)
+
+
+def test_command_mode_patches_only_its_own_encoder(make_stt):
+    """
+    Тест: Два движка в одном процессе, command mode включен у одного.
+    Ожидание: Замена forward касается только энкодера этого движка.
+    """
+    fast, regular = make_stt(command_mode=True), make_stt()
+
+    assert fast.model.encoder.forward.__func__ is _encoder_forward_variable_ctx
+    assert "forward" not in vars(regular.model.encoder)
+
+
+def test_short_path_collapses_temperature_and_drops_best_of(make_stt, decoded):
+    """
+    Тест: Быстрый путь с профилем "accurate" (каскад температур, beam search).
+    Ожидание: Декодирование с первой температурой и beam search, без best_of,
+    с языком из конфигурации, без таймстемпов и fp16; mel обрезан до контекста.
+    """
+    stt = make_stt(command_mode=True, profile="accurate")
+
+    text = stt.transcribe_audio(np.zeros(16000, dtype=np.float32))
+
+    ((mel, options),) = decoded
+    assert text == "Привет."
+    assert mel.shape == (80, 2 * stt.audio_ctx_for(16000))
+    assert options.temperature == 0.0
+    assert options.beam_size == 5
+    assert options.best_of is None
+    assert options.language == config.WHISPER_LANGUAGE
+    assert options.without_timestamps and not options.fp16
+
+
+def test_short_path_sampling_drops_beam_search(make_stt, decoded, monkeypatch):
+    """
+    Тест: Профиль с ненулевой первой температурой, beam search и параметрами,
+    которых нет в DecodingOptions.
+    Ожидание: Сэмплирование с best_of; beam_size и patience отброшены, как в
+    whisper.transcribe; лишние параметры не передаются.
+    """
+    monkeypatch.setitem(
+        config.WHISPER_DECODING_PROFILES,
+        "sampling",
+        {
+            "temperature": (0.5, 1.0),
+            "best_of": 3,
+            "beam_size": 5,
+            "patience": 1.0,
+            "condition_on_previous_text": False,
+        },
+    )
+    stt = make_stt(profile="sampling")
+
+    stt.transcribe_audio(np.zeros(8000, dtype=np.float32), short=True)
+
+    ((_, options),) = decoded
+    assert options.temperature == 0.5
+    assert options.best_of == 3
+    assert options.beam_size is None and options.patience is None
+
+
+def test_short_path_forces_language(make_stt, decoded):
+    """
+    Тест: Быстрый путь с профилем "default", где язык не задан.
+    Ожидание: Язык берется из WHISPER_LANGUAGE (автоопределение работает
+    только на полном окне).
+    """
+    stt = make_stt(command_mode=True)
+
+    stt.transcribe_audio(np.zeros(8000, dtype=np.float32))
+
+    ((_, options),) = decoded
+    assert options.language == config.WHISPER_LANGUAGE
+
+
+def test_long_audio_uses_full_window(make_stt, decoded, monkeypatch):
+    """
+    Тест: В command mode приходит фраза длиннее WHISPER_SHORT_AUDIO_MAX_S.
+    Ожидание: Используется штатный transcribe с полным окном.
+    """
+    stt = make_stt(command_mode=True)
+    calls = []
+    monkeypatch.setattr(
+        stt.model,
+        "transcribe",
+        lambda audio, **options: calls.append(options) or {"text": " Длинно. "},
+    )
+    n_samples = int(config.WHISPER_SHORT_AUDIO_MAX_S * 16000) + 1
+
+    assert stt.transcribe_audio(np.zeros(n_samples, dtype=np.float32)) == "Длинно."
+    assert decoded == []
+    assert calls == [{"fp16": False}]
+
+
+def test_unknown_profile_is_rejected(make_stt):
+    """
+    Тест: Имя профиля декодирования с опечаткой.
+    Ожидание: ValueError со списком доступных профилей — и при запросе
+    параметров, и при создании движка.
+    """
+    with pytest.raises(ValueError, match="accurate"):
+        WhisperSTT.decode_options("acurate")
+    with pytest.raises(ValueError):
+        make_stt(profile="acurate")
+
+
+def test_decode_options_are_a_copy():
+    """
+    Тест: Вызывающий код меняет полученные параметры (как fp16 в transcribe_audio).
+    Ожидание: Профиль в config.WHISPER_DECODING_PROFILES не меняется.
+    """
+    expected = dict(config.WHISPER_DECODING_PROFILES["command"])
+
+    options = WhisperSTT.decode_options("command")
+    options["fp16"] = False
+    options["language"] = "en"
+
+    assert config.WHISPER_DECODING_PROFILES["command"] == expected
+
+
+def test_profile_can_be_overridden_per_call(make_stt, monkeypatch):
+    """
+    Тест: Движок с профилем "command", один вызов с profile="accurate".
+    Ожидание: Этот вызов декодируется с параметрами "accurate", следующий —
+    снова с "command"; профили в конфигурации не меняются.
+    """
+    stt = make_stt(profile="command")
+    calls = []
+    monkeypatch.setattr(
+        stt.model,
+        "transcribe",
+        lambda audio, **options: calls.append(options) or {"text": ""},
+    )
+    audio = np.zeros(16000, dtype=np.float32)
+
+    stt.transcribe_audio(audio, profile="accurate")
+    stt.transcribe_audio(audio)
+
+    accurate, command = calls
+    assert accurate == {**config.WHISPER_DECODING_PROFILES["accurate"], "fp16": False}
+    assert command == {**config.WHISPER_DECODING_PROFILES["command"], "fp16": False}
+    assert "fp16" not in config.WHISPER_DECODING_PROFILES["command"]
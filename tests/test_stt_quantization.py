@@ -0,0 +1,50 @@
+# tests/test_stt_quantization.py
+
+import pytest
+
+whisper = pytest.importorskip("whisper")
+torch = pytest.importorskip("torch")
+
+from whisper.model import ModelDimensions, Whisper
+
+from loki.stt_handler import quantize_model
+
+
+def make_tiny_model() -> Whisper:
+    dims = ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=16,
+        n_audio_state=64,
+        n_audio_head=2,
+        n_audio_layer=1,
+        n_vocab=100,
+        n_text_ctx=8,
+        n_text_state=64,
+        n_text_head=2,
+        n_text_layer=1,
+    )
+    torch.manual_seed(0)
+    model = Whisper(dims).eval()
+    # Позиционные эмбеддинги декодера создаются через torch.empty и не инициализированы
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    return model
+
+
+def test_quantize_model_replaces_all_linear_layers():
+    """
+    Тест: Квантование маленькой модели Whisper со случайными весами.
+    Ожидание: Не осталось fp32 линейных слоев, логиты близки к исходным.
+    """
+    model = make_tiny_model()
+    mel = torch.randn(1, 80, 32)
+    tokens = torch.tensor([[1, 2, 3]])
+    with torch.no_grad():
+        expected = model(mel, tokens)
+
+    quantize_model(model)
+
+    linear_types = (whisper.model.Linear, torch.nn.Linear)
+    assert not any(isinstance(m, linear_types) for m in model.modules())
+    with torch.no_grad():
+        actual = model(mel, tokens)
+    assert torch.allclose(actual, expected, atol=0.1 * expected.abs().max())
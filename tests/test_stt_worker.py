@@ -0,0 +1,88 @@
+# tests/test_stt_worker.py
+
+import threading
+import time
+import wave
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from loki import config
+from loki.stt_worker import TranscriptionCancelled, WhisperSTTProcess
+
+# Длина сигнала, на которой заглушка "зависает", пока задание не отменят
+SLOW_SAMPLES = 7
+
+
+class StubSTT:
+    """Заглушка Whisper для воркера: описывает полученный сигнал."""
+
+    def __init__(self, model_name, command_mode, profile):
+        self.model_name = model_name
+
+    def transcribe_audio(self, audio, short=None, profile=None):
+        if len(audio) == SLOW_SAMPLES:
+            time.sleep(60)
+        return f"{self.model_name}: {len(audio)} samples, sum {audio.sum():.1f}"
+
+
+@pytest.fixture
+def engine():
+    engine = WhisperSTTProcess("stub", engine_cls=StubSTT)
+    yield engine
+    engine.close()
+
+
+def test_round_trip_through_shared_memory(engine):
+    """
+    Тест: Два сигнала разной длины транскрибируются в процессе-воркере.
+    Ожидание: Воркер видит ровно переданные отсчеты; сегмент разделяемой
+    памяти переиспользуется между заданиями.
+    """
+    assert engine.transcribe_audio(np.full(4, 0.5)) == "stub: 4 samples, sum 2.0"
+    shm_name = engine._shm.name
+    assert engine.transcribe_audio(np.ones(3)) == "stub: 3 samples, sum 3.0"
+    assert engine._shm.name == shm_name
+
+
+def test_cancel_during_job_restarts_worker(engine, tmp_path):
+    """
+    Тест: Во время транскрибации из другого потока вызывается cancel().
+    Ожидание: Ожидающий вызов прерывается (transcribe возвращает None),
+    воркер перезапускается и обрабатывает следующее задание.
+    """
+    old_pid = engine._process.pid
+    threading.Timer(0.5, engine.cancel).start()
+    with pytest.raises(TranscriptionCancelled):
+        engine.transcribe_audio(np.zeros(SLOW_SAMPLES))
+
+    assert engine._process.pid != old_pid
+    assert engine.transcribe_audio(np.zeros(2)) == "stub: 2 samples, sum 0.0"
+
+    path = tmp_path / "command.wav"
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(config.AUDIO_CHANNELS)
+        wf.setsampwidth(2)
+        wf.setframerate(config.AUDIO_RATE)
+        wf.writeframes(np.zeros(SLOW_SAMPLES, dtype=np.int16).tobytes())
+    threading.Timer(0.5, engine.cancel).start()
+    assert engine.transcribe(str(path)) is None
+    assert not path.exists()
+
+
+def test_close_releases_shared_memory():
+    """
+    Тест: Движок закрывается после транскрибации.
+    Ожидание: Воркер остановлен, сегмент разделяемой памяти удален из системы.
+    """
+    engine = WhisperSTTProcess("stub", engine_cls=StubSTT)
+    engine.transcribe_audio(np.zeros(1))
+    process, shm_name = engine._process, engine._shm.name
+
+    engine.close()
+
+    assert not process.is_alive()
+    assert engine._shm is None
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=shm_name)
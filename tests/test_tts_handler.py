@@ -0,0 +1,104 @@
+# tests/test_tts_handler.py
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+tts_handler = pytest.importorskip("loki.tts_handler")
+
+from loki.tts_handler import Piper_Engine, split_sentences
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (
+            "Погода в г. Москва хорошая. Т.е. 5 градусов.",
+            ["Погода в г. Москва хорошая.", "Т.е. 5 градусов."],
+        ),
+        (
+            "Живу на ул. Ленина, д. 5. Заходите!",
+            ["Живу на ул. Ленина, д. 5.", "Заходите!"],
+        ),
+        ("Стихи написал А. С. Пушкин.", ["Стихи написал А. С. Пушкин."]),
+        (
+            "Было в 2024. Кто там? Это я. Ну…",
+            ["Было в 2024.", "Кто там?", "Это я.", "Ну…"],
+        ),
+        ("Первая строка\nвторая строка", ["Первая строка", "вторая строка"]),
+        ("Сейчас 5.5 градусов. Ясно.", ["Сейчас 5.5 градусов.", "Ясно."]),
+        ("  ", []),
+    ],
+)
+def test_split_sentences(text, expected):
+    """
+    Тест: Разбиение ответа на предложения для конвейерного синтеза.
+    Ожидание: Границы после сокращений и инициалов не ставятся, после
+    обычных предложений и переводов строки — ставятся.
+    """
+    assert split_sentences(text) == expected
+
+
+def make_engine(synthesize, workers):
+    """Piper_Engine без модели: синтез подменяется функцией."""
+    engine = object.__new__(Piper_Engine)
+    engine.sample_rate = 1000  # Порция воспроизведения — 200 отсчетов, 400 байт
+    engine.synthesis_workers = workers
+    engine._owns_executor = True
+    engine._executor = ThreadPoolExecutor(max_workers=workers)
+    engine.synthesize = synthesize
+    return engine
+
+
+def test_stream_keeps_sentence_order_with_parallel_synthesis():
+    """
+    Тест: Три воркера синтеза; первое предложение синтезируется дольше всех.
+    Ожидание: Аудио отдается строго в порядке предложений, порциями не
+    длиннее порции воспроизведения, а следующие предложения начинают
+    синтезироваться, не дожидаясь первого.
+    """
+    delays = {"Раз.": 0.15, "Два.": 0.1, "Три.": 0.05, "Четыре.": 0.0}
+    started = []
+
+    def synthesize(sentence):
+        started.append(sentence)
+        time.sleep(delays[sentence])
+        return sentence.encode() * 100
+
+    engine = make_engine(synthesize, workers=3)
+
+    async def collect():
+        return [chunk async for chunk in engine.stream(" ".join(delays))]
+
+    try:
+        chunks = asyncio.run(collect())
+    finally:
+        engine.close()
+
+    assert b"".join(chunks) == b"".join(s.encode() * 100 for s in delays)
+    assert max(len(chunk) for chunk in chunks) == 400
+    assert set(started[:3]) == {"Раз.", "Два.", "Три."}
+
+
+def test_stream_skips_failed_sentence():
+    """
+    Тест: Синтез одного из предложений падает.
+    Ожидание: Остальные предложения озвучиваются по порядку.
+    """
+
+    def synthesize(sentence):
+        if sentence == "Два.":
+            raise RuntimeError("boom")
+        return sentence.encode()
+
+    engine = make_engine(synthesize, workers=2)
+
+    async def collect():
+        return b"".join([c async for c in engine.stream("Раз. Два. Три.")])
+
+    try:
+        assert asyncio.run(collect()) == "Раз.Три.".encode()
+    finally:
+        engine.close()
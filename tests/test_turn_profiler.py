@@ -0,0 +1,102 @@
+# tests/test_turn_profiler.py
+
+import asyncio
+import json
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from loki.metrics import METRICS
+from loki.turn_profiler import TurnProfiler
+
+
+def work(n):
+    return sum(range(n))
+
+
+def test_disarmed_profiler_is_a_no_op(tmp_path):
+    """
+    Тест: Профайлер не включен.
+    Ожидание: wrap возвращает исходную функцию, файлы не пишутся.
+    """
+    profiler = TurnProfiler(str(tmp_path))
+
+    with profiler.turn():
+        with profiler.span("stage"):
+            assert profiler.wrap("work", work) is work
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_armed_turn_writes_profile_and_trace(tmp_path):
+    """
+    Тест: Профилирование одного хода с работой в executor'е.
+    Ожидание: Записаны .prof и .trace.json с отрезками хода и executor'а
+    (с именем потока); следующий ход уже не профилируется.
+    """
+    profiler = TurnProfiler(str(tmp_path))
+    profiler.arm(1)
+
+    async def turn():
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(thread_name_prefix="loki-stt") as executor:
+            with profiler.turn("handle_command"):
+                await loop.run_in_executor(
+                    executor, profiler.wrap("stt.transcribe", work), 1000
+                )
+
+    asyncio.run(turn())
+    asyncio.run(turn())
+
+    (trace_path,) = tmp_path.glob("*.trace.json")
+    (prof_path,) = tmp_path.glob("*.prof")
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    spans = {e["name"]: e for e in events if e["ph"] == "X"}
+    assert set(spans) == {"handle_command", "stt.transcribe"}
+    threads = {e["tid"]: e["args"]["name"] for e in events if e["ph"] == "M"}
+    assert threads[spans["stt.transcribe"]["tid"]].startswith("loki-stt")
+    assert pstats.Stats(str(prof_path)).total_calls > 0
+    assert not profiler.armed
+
+
+def test_control_server_arms_profiler(tmp_path):
+    """
+    Тест: Команда "profile 2" на порт управления.
+    Ожидание: Профайлер включен на два хода.
+    """
+    profiler = TurnProfiler(str(tmp_path))
+
+    async def run():
+        await profiler.start_control_server(0)
+        port = profiler._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"profile 2\n")
+        reply = await reader.readline()
+        writer.close()
+        profiler.close()
+        return reply
+
+    assert asyncio.run(run()) == b"armed 2\n"
+    assert profiler.armed
+
+
+def test_control_server_returns_metrics(tmp_path):
+    """
+    Тест: Команда "metrics" на порт управления.
+    Ожидание: В ответ приходит снимок METRICS в JSON.
+    """
+    profiler = TurnProfiler(str(tmp_path))
+    METRICS.increment("test.control_requests")
+
+    async def run():
+        await profiler.start_control_server(0)
+        port = profiler._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"metrics\n")
+        reply = await reader.readline()
+        writer.close()
+        profiler.close()
+        return json.loads(reply)
+
+    snapshot = asyncio.run(run())
+    assert snapshot["counters"]["test.control_requests"] >= 1
+    assert set(snapshot) == {"counters", "gauges", "distributions"}
@@ -0,0 +1,55 @@
+# tests/test_utils.py
+
+import pytest
+from loki.utils import normalize_transcript, percentile, word_error_rate
+
+
+def test_normalize_transcript():
+    """
+    Тест: Транскрипт с пунктуацией, регистром и буквой "ё".
+    Ожидание: Текст приведен к нижнему регистру без пунктуации, "ё" заменена.
+    """
+    assert (
+        normalize_transcript("  Включи, пожалуйста, ЁЛКУ!  ")
+        == "включи пожалуйста елку"
+    )
+
+
+def test_wer_identical():
+    """
+    Тест: Гипотеза совпадает с эталоном с точностью до нормализации.
+    Ожидание: WER равен 0.
+    """
+    assert word_error_rate("Какая погода в Москве?", "какая погода в москве") == 0.0
+
+
+def test_wer_substitution_and_deletion():
+    """
+    Тест: Одна замена и одно удаление на четыре слова эталона.
+    Ожидание: WER равен 0.5.
+    """
+    assert word_error_rate(
+        "переключись в режим обработки", "переключись режим отработки"
+    ) == pytest.approx(0.5)
+
+
+def test_wer_empty_reference():
+    """
+    Тест: Пустой эталон.
+    Ожидание: 0.0 для пустой гипотезы и 1.0 для непустой.
+    """
+    assert word_error_rate("", "") == 0.0
+    assert word_error_rate("", "шум") == 1.0
+
+
+def test_percentile_nearest_rank():
+    """
+    Тест: Перцентили по выборке из десяти значений и по пустой выборке.
+    Ожидание: Метод ближайшего ранга, 0.0 для пустой выборки.
+    """
+    values = [float(v) for v in range(10, 0, -1)]
+    assert percentile(values, 50) == 5.0
+    assert percentile(values, 90) == 9.0
+    assert percentile(values, 100) == 10.0
+    assert percentile(values, 0) == 1.0
+    assert percentile([], 50) == 0.0
@@ -0,0 +1,65 @@
+# tests/test_wav.py
+
+import subprocess
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+from loki import config
+from loki.wav import load_wav
+
+
+def write_wav(path, samples, rate=config.AUDIO_RATE, channels=1):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples.astype(np.int16).tobytes())
+
+
+def test_load_wav_returns_normalized_float32(tmp_path):
+    """
+    Тест: WAV моно 16 бит 16 кГц.
+    Ожидание: Отсчеты float32 в диапазоне [-1, 1].
+    """
+    path = tmp_path / "command.wav"
+    write_wav(path, np.array([0, 16384, -32768]))
+
+    audio = load_wav(str(path))
+
+    assert audio.dtype == np.float32
+    assert audio.tolist() == [0.0, 0.5, -1.0]
+
+
+@pytest.mark.parametrize("rate", [44100, None])
+def test_load_wav_rejects_other_formats(tmp_path, rate):
+    """
+    Тест: WAV с другой частотой или файл, который вообще не WAV.
+    Ожидание: ValueError (вызывающий код переходит на ffmpeg).
+    """
+    path = tmp_path / "audio.wav"
+    if rate:
+        write_wav(path, np.zeros(10), rate=rate)
+    else:
+        path.write_bytes(b"ID3 not a wav file")
+
+    with pytest.raises(ValueError):
+        load_wav(str(path))
+
+
+@pytest.mark.parametrize("module", ["loki.wav", "loki.stt_worker", "loki.batch"])
+def test_headless_modules_do_not_import_audio_devices(module):
+    """
+    Тест: Импорт модулей, которые работают без микрофона.
+    Ожидание: pyaudio и webrtcvad не загружаются.
+    """
+    code = (
+        f"import sys, {module}; "
+        "print(sorted({'pyaudio', 'webrtcvad'} & set(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"